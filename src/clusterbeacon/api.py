@@ -0,0 +1,110 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Union
+
+import pandas as pd
+
+from src.clusterbeacon.classes.Detector import Detector
+
+
+@dataclass
+class DetectionResult:
+    """
+    Tables produced by one in-memory detection run.
+
+    ``duplicates`` has one row per sample in a duplicate group; ``memberships``
+    has one row per (outbreak_code, sample_id); ``cluster_status`` has the
+    gating outcome of every denovo cluster; ``enrichment_conflicts`` has one
+    row per line list value that disagreed with a ``metadata_tables`` entry.
+    """
+    status: bool
+    messages: List[str]
+    outbreaks: pd.DataFrame
+    memberships: pd.DataFrame
+    line_list: pd.DataFrame
+    duplicates: pd.DataFrame
+    date_report: Dict[str, Any] = field(default_factory=dict)
+    cluster_status: pd.DataFrame = field(default_factory=pd.DataFrame)
+    enrichment_report: Dict[str, Any] = field(default_factory=dict)
+    enrichment_conflicts: pd.DataFrame = field(default_factory=pd.DataFrame)
+
+
+def default_config() -> Dict[str, Any]:
+    """Config keys ``detect`` needs when no config file is involved."""
+    return {
+        "column_map": {},
+        "filters": {},
+        "outdir": None,
+        "force": False,
+        "duplicate_max_pairwise_distance": 0,
+        "duplicate_detection_columns": [],
+        "rule_key_columns": [],
+        "gas_denovo_delimiter": ".",
+        "gas_denovo_thresholds": [],
+        "stream_outputs": False,
+    }
+
+
+def detect(
+    line_list: Any,
+    rules: Union[pd.DataFrame, Dict[str, Dict[str, Any]], Any],
+    config: Optional[Dict[str, Any]] = None,
+) -> DetectionResult:
+    """
+    Run outbreak detection on in-memory tables.
+
+    Nothing is read from or written to disk unless `config` points at an
+    allele profile store or an outbreak registry. Each call builds its own
+    ``Detector``, so calls are independent and safe to run concurrently.
+
+    Parameters
+    ----------
+    line_list : pd.DataFrame or pyarrow.Table
+        Line list with the same columns as ``line_list_path`` would have.
+    rules : pd.DataFrame, pyarrow.Table or dict
+        Rule rows as in ``outbreak_rules_path``, or an already parsed rule dict.
+    config : dict, optional
+        Detector settings; missing keys are taken from ``default_config()``.
+
+    Returns
+    -------
+    DetectionResult
+    """
+    run_config = default_config()
+    run_config.update(config or {})
+    obj = Detector(config=run_config, line_list=line_list, rules=rules)
+    if not obj.status:
+        empty = pd.DataFrame()
+        return DetectionResult(False, list(obj.messages), empty, empty, empty, empty,
+                               dict(obj.date_report))
+
+    columns = ['outbreak_code'] + Detector.get_outbreak_columns(run_config)
+    if len(obj.outbreak_df) > 0:
+        outbreaks = obj.outbreak_df.reindex(columns=columns)
+    else:
+        outbreaks = pd.DataFrame(columns=columns)
+    return DetectionResult(
+        status=True,
+        messages=list(obj.messages),
+        outbreaks=outbreaks,
+        memberships=memberships_table(outbreaks),
+        line_list=obj.ll_df.reset_index(drop=True),
+        duplicates=duplicates_table(obj.duplicate_candidates, obj.duplicate_match_columns),
+        date_report=dict(obj.date_report),
+        cluster_status=obj.cluster_status.reset_index(drop=True),
+        enrichment_report=dict(obj.enrichment_report),
+        enrichment_conflicts=obj.enrichment_conflicts,
+    )
+
+
+def memberships_table(outbreaks: pd.DataFrame) -> pd.DataFrame:
+    if len(outbreaks) == 0:
+        return pd.DataFrame(columns=['outbreak_code', 'sample_id'])
+    df = outbreaks[['outbreak_code']].assign(sample_id=outbreaks['sample_ids'].str.split(','))
+    df = df.explode('sample_id')
+    return df[df['sample_id'].fillna('') != ''].reset_index(drop=True)
+
+
+def duplicates_table(candidates: Dict[str, List[list]], match_columns: List[str]) -> pd.DataFrame:
+    columns = ['group_hash', 'duplicate_group_code'] + list(match_columns) + ['sample_id']
+    rows = [[md5] + list(record) for md5, records in candidates.items() for record in records]
+    return pd.DataFrame(rows, columns=columns)
@@ -0,0 +1,56 @@
+import sys
+from typing import BinaryIO, Dict, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+
+def table_to_frame(table: pa.Table) -> pd.DataFrame:
+    """Arrow table as a DataFrame, with date columns as datetime64 rather than objects."""
+    return table.to_pandas(date_as_object=False)
+
+
+def read_ipc_stream(source: Optional[BinaryIO] = None) -> pa.Table:
+    """
+    Read one Arrow IPC stream (e.g. a line list piped from an upstream tool)
+    from `source`, stdin by default.
+    """
+    if source is None:
+        source = sys.stdin.buffer
+    with pa.ipc.open_stream(source) as reader:
+        return reader.read_all()
+
+
+def write_ipc_tables(tables: Dict[str, pd.DataFrame], sink: Optional[BinaryIO] = None) -> None:
+    """
+    Write each table as its own Arrow IPC stream, one after another, to
+    `sink` (stdout by default).
+
+    The table name is stored in the schema metadata under ``b"table"``, so a
+    reader can tell the streams apart; ``read_ipc_tables`` reads them back.
+    """
+    if sink is None:
+        sink = sys.stdout.buffer
+    for name, df in tables.items():
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata(dict(table.schema.metadata or {}, table=name))
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    sink.flush()
+
+
+def read_ipc_tables(source: Optional[BinaryIO] = None) -> Dict[str, pa.Table]:
+    """Read consecutive Arrow IPC streams written by ``write_ipc_tables``."""
+    if source is None:
+        source = sys.stdin.buffer
+    tables = {}
+    while True:
+        try:
+            reader = pa.ipc.open_stream(source)
+        except pa.ArrowInvalid:
+            break
+        with reader:
+            table = reader.read_all()
+        name = (table.schema.metadata or {}).get(b"table", str(len(tables)).encode()).decode()
+        tables[name] = table
+    return tables
@@ -0,0 +1,212 @@
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from src.clusterbeacon.ingest import delimiter_of, expand_line_list_paths
+
+
+class AddressIndex:
+    """
+    Memory-mapped prefix index over ``gas_denovo_cluster_address`` levels.
+
+    Rows are stored sorted by address level by level, so the members of any
+    prefix at any level are one contiguous row range. Each level keeps its
+    prefixes sorted for binary search, next to their row ranges; sample ids
+    have their own sorted permutation. Lookups touch only the pages they
+    search, never the whole table.
+
+    Usage
+    -----
+    AddressIndex.build("line_list.tsv", "ll.index")
+    index = AddressIndex("ll.index")
+    index.members("Sal|1.2")
+    index.clusters_of("S0001")
+    """
+
+    meta_file = "meta.json"
+    samples_file = "samples.npy"
+    addresses_file = "addresses.npy"
+    sample_order_file = "sample_order.npy"
+
+    def __init__(self, index_dir: Union[str, Path]) -> None:
+        self.index_dir = Path(index_dir)
+        with open(self.index_dir / self.meta_file) as fh:
+            self.meta = json.load(fh)
+        self.delim = self.meta["delimiter"]
+        self.thresholds = self.meta["thresholds"]
+        self.num_levels = self.meta["num_levels"]
+        self.samples = self.load(self.samples_file)
+        self.addresses = self.load(self.addresses_file)
+        self.sample_order = self.load(self.sample_order_file)
+        levels = range(1, self.num_levels + 1)
+        self.level_codes = [self.load(f"level_{level}_codes.npy") for level in levels]
+        self.level_ranges = [self.load(f"level_{level}_ranges.npy") for level in levels]
+
+    def load(self, name: str) -> np.ndarray:
+        return np.load(self.index_dir / name, mmap_mode="r")
+
+    @classmethod
+    def build(
+        cls,
+        line_list_path: Union[str, Path],
+        index_dir: Union[str, Path],
+        column_map: Optional[Dict[str, str]] = None,
+        delim: str = ".",
+        thresholds: Optional[List[int]] = None,
+    ) -> Dict[str, int]:
+        """
+        Read the sample ids and addresses of a line list once and write the index.
+
+        Returns
+        -------
+        dict
+            Number of rows and of prefixes per level.
+        """
+        paths = expand_line_list_paths(line_list_path)
+        if len(paths) == 0:
+            raise FileNotFoundError(f"line list {line_list_path} does not exist or is empty")
+        column_map = column_map or {}
+        needed = {"sample_id", "gas_denovo_cluster_address"}
+        usecols = lambda c: column_map.get(c, c) in needed
+        frames = []
+        for path in paths:
+            # decompressed by extension, like ingest.read_partition
+            with pa.input_stream(path, compression="detect") as stream:
+                frames.append(pd.read_csv(stream, sep=delimiter_of(path), header=0, dtype=str,
+                                          keep_default_na=False, usecols=usecols))
+        df = pd.concat(frames, ignore_index=True).fillna("") if len(frames) > 1 else frames[0]
+        df = df.rename(columns=column_map)
+        if not needed.issubset(df.columns):
+            raise ValueError(f"line list {line_list_path} needs sample_id and "
+                             "gas_denovo_cluster_address columns")
+        df = df[df["gas_denovo_cluster_address"] != ""]
+
+        parts = df["gas_denovo_cluster_address"].str.split("|", n=1, expand=True)
+        if parts.shape[1] < 2:
+            parts[1] = ""
+        tokens = parts[1].fillna("").str.split(delim, expand=True).fillna("")
+        num_levels = tokens.shape[1]
+        keys = [parts[0].to_numpy(dtype=object)]
+        keys += [tokens[i].to_numpy(dtype=object) for i in range(num_levels)]
+        order = np.lexsort(keys[::-1])
+        keys = [k[order] for k in keys]
+        samples = df["sample_id"].to_numpy(dtype=object)[order]
+        addresses = df["gas_denovo_cluster_address"].to_numpy(dtype=object)[order]
+
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        n = len(samples)
+        sample_bytes = cls.encode(samples)
+        np.save(index_dir / cls.samples_file, sample_bytes)
+        np.save(index_dir / cls.addresses_file, cls.encode(addresses))
+        sample_order = np.argsort(sample_bytes, kind="stable").astype(np.int64)
+        np.save(index_dir / cls.sample_order_file, sample_order)
+
+        counts = {"rows": n}
+        changed = np.zeros(n, dtype=bool)
+        if n:
+            changed[0] = True
+            changed[1:] |= keys[0][1:] != keys[0][:-1]
+        code = keys[0] + "|"
+        for level in range(1, num_levels + 1):
+            token = keys[level]
+            if n:
+                changed[1:] |= token[1:] != token[:-1]
+            code = code + (delim if level > 1 else "") + token
+            starts = np.flatnonzero(changed)
+            ends = np.append(starts[1:], n)
+            present = token[starts] != ""
+            starts, ends = starts[present], ends[present]
+            codes = cls.encode(code[starts])
+            by_code = np.argsort(codes, kind="stable")
+            np.save(index_dir / f"level_{level}_codes.npy", codes[by_code])
+            ranges = np.stack([starts, ends], axis=1)[by_code].astype(np.int64)
+            np.save(index_dir / f"level_{level}_ranges.npy", ranges)
+            counts[f"level_{level}"] = len(starts)
+
+        with open(index_dir / cls.meta_file, "w") as fh:
+            json.dump({
+                "source": str(line_list_path),
+                "source_signature": [sum(os.path.getsize(p) for p in paths),
+                                     max(int(os.path.getmtime(p)) for p in paths)],
+                "delimiter": delim,
+                "thresholds": list(thresholds or []),
+                "num_levels": num_levels,
+                "counts": counts,
+            }, fh, indent=4)
+        return counts
+
+    @staticmethod
+    def encode(values: np.ndarray) -> np.ndarray:
+        """UTF-8 bytes of text values as a fixed-width array; it sorts like the text."""
+        if len(values) == 0:
+            return np.zeros(0, dtype="S1")
+        return np.array([str(v).encode("utf-8") for v in values], dtype=bytes)
+
+    def level_of_threshold(self, threshold: int) -> int:
+        """
+        Address level the detector truncates to for a distance threshold
+        (see Detector.extract_clusters).
+        """
+        for idx, value in enumerate(self.thresholds):
+            if value == threshold:
+                return max(idx, 1)
+        return 1
+
+    def truncate(self, address: str, level: int) -> str:
+        prefix, _, levels = address.partition("|")
+        return f"{prefix}|{self.delim.join(levels.split(self.delim)[:level])}"
+
+    def code_level(self, code: str) -> int:
+        return len(code.partition("|")[2].split(self.delim))
+
+    def row_range(self, code: str):
+        """Row range [start, end) of a prefix, or None when no sample has it."""
+        level = self.code_level(code)
+        if level > self.num_levels:
+            return None
+        codes = self.level_codes[level - 1]
+        key = code.encode("utf-8")
+        i = int(np.searchsorted(codes, key))
+        if i >= len(codes) or codes[i] != key:
+            return None
+        start, end = self.level_ranges[level - 1][i]
+        return int(start), int(end)
+
+    def members(self, code: str, threshold: Optional[int] = None) -> List[str]:
+        """Sample ids sharing prefix `code`, truncated to the level of `threshold` if given."""
+        if threshold is not None:
+            code = self.truncate(code, self.level_of_threshold(threshold))
+        rows = self.row_range(code)
+        if rows is None:
+            return []
+        return [s.decode("utf-8") for s in self.samples[rows[0]:rows[1]]]
+
+    def find_rows(self, sample_id: str) -> np.ndarray:
+        key = sample_id.encode("utf-8")
+        lo = int(np.searchsorted(self.samples, key, sorter=self.sample_order))
+        hi = int(np.searchsorted(self.samples, key, side="right", sorter=self.sample_order))
+        return np.asarray(self.sample_order[lo:hi])
+
+    def clusters_of(self, sample_id: str) -> pd.DataFrame:
+        """Cluster code, size and matching threshold of a sample at every address level."""
+        rows = []
+        for row in self.find_rows(sample_id):
+            address = self.addresses[row].decode("utf-8")
+            for level in range(1, self.code_level(address) + 1):
+                code = self.truncate(address, level)
+                rows_of_code = self.row_range(code)
+                # levels with an empty token (e.g. "Sal|1..3") are not indexed
+                if rows_of_code is None:
+                    continue
+                start, end = rows_of_code
+                threshold = self.thresholds[level] if level < len(self.thresholds) else None
+                rows.append({"sample_id": sample_id, "level": level, "threshold": threshold,
+                             "cluster_code": code, "members": end - start})
+        columns = ["sample_id", "level", "threshold", "cluster_code", "members"]
+        return pd.DataFrame(rows, columns=columns, dtype=object)
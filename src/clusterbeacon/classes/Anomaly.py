@@ -17,11 +17,19 @@ def load_data(filename,label_col,date_col):
     df['year-week'] = df['date'].dt.strftime('%Y-%U')
     return df.groupby(['year-week',label_col]).size().reset_index(name='count')
 
-def process(df,label_col,min_date,max_date,date_col='year-week'):
+def load_cube(cube_dir,label_col,level):
+    # weekly counts come from the persisted count cube instead of rescanning the line list;
+    # imported here so the rest of this module works without the clusterbeacon package
+    from src.clusterbeacon.classes.CountCube import CountCube
+    df = CountCube(cube_dir).weekly_counts(level)
+    df['year-week'] = df['iso_year'].astype(str) + '-' + df['iso_week'].astype(str).str.zfill(2)
+    return df.rename(columns={'cluster_code':label_col})[['year-week',label_col,'count']]
+
+def process(df,label_col,min_date,max_date,date_col='year-week',num_weeks=52):
     labels = list(df[label_col].unique())
     subsets = []
     for l in labels:
-        dates = [0] * 52
+        dates = [0] * num_weeks
         subset = df[df[label_col] == l]
         for idx,row in subset.iterrows():
             (year, week) = row['year-week'].split('-')
@@ -29,12 +37,24 @@ def process(df,label_col,min_date,max_date,date_col='year-week'):
         print(dates)
         anomalies = isolation_forest(pd.DataFrame(dates,columns=['year-week']))
         
-        subsets.append( pd.DataFrame({'weeks':list(range(0,52)),'genomic_address':[l]*52,'anomalies':list(anomalies),'counts':dates }) )
+        subsets.append( pd.DataFrame({'weeks':list(range(0,num_weeks)),
+                                      'genomic_address':[l]*num_weeks,
+                                      'anomalies':list(anomalies),'counts':dates }) )
     return pd.concat(subsets)
 
-filename = 'out_line_list.tsv'
-x_column = 'date'
-y_column = 'genomic_address_name'
-df = load_data(filename,date_col=x_column,label_col=y_column)
-print(process(df,label_col='genomic_address_name',min_date=None,max_date=None,date_col='year-week').to_csv('anomaly.txt',sep="\t",header=True))
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) > 2:
+        # python Anomaly.py <count_cube_dir> <address level>
+        df = load_cube(sys.argv[1],label_col='genomic_address_name',level=int(sys.argv[2]))
+        num_weeks = 53
+    else:
+        filename = 'out_line_list.tsv'
+        x_column = 'date'
+        y_column = 'genomic_address_name'
+        df = load_data(filename,date_col=x_column,label_col=y_column)
+        num_weeks = 52
+    result = process(df,label_col='genomic_address_name',min_date=None,max_date=None,
+                     date_col='year-week',num_weeks=num_weeks)
+    print(result.to_csv('anomaly.txt',sep="\t",header=True))
 
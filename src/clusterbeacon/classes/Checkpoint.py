@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from src.clusterbeacon.ingest import expand_line_list_paths
+
+
+class Checkpoint:
+    """
+    On-disk progress of a detection run: the formatted input with the settings
+    and input files it was made with, and one ``progress_<k>.pkl`` of new events
+    per flush, so an interrupted run can resume.
+    """
+
+    meta_file = "meta.json"
+    input_file = "input.pkl"
+    # settings that do not change detection results
+    volatile_keys = {'analysis_start_time', 'analysis_end_time', 'run_id', 'date_report', 'force',
+                     'resume', 'trace', 'trace_top', 'stdout_format', 'history_db',
+                     'checkpoint_clusters', 'checkpoint_dir', 'count_cube_report',
+                     'enrichment_report', 'profile_report'}
+
+    def __init__(self, checkpoint_dir: Union[str, Path]) -> None:
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.meta: Dict[str, Any] = {}
+        self.num_flushes = 0
+        if (self.checkpoint_dir / self.meta_file).exists():
+            with open(self.checkpoint_dir / self.meta_file) as fh:
+                self.meta = json.load(fh)
+            self.num_flushes = len(self.progress_files())
+
+    # config entries naming input files whose contents decide the results
+    input_keys = ('line_list_path', 'outbreak_rules_path', 'allele_profiles_path')
+
+    @classmethod
+    def signature(cls, config: Dict[str, Any]) -> str:
+        settings = {k: v for k, v in config.items() if k not in cls.volatile_keys}
+        return hashlib.md5(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()
+
+    @classmethod
+    def input_identity(cls, config: Dict[str, Any],
+                       line_list: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+        """
+        [path, size, mtime_ns] of every file behind each input of `config`
+        (line list partitions, rules, allele profiles, metadata tables). A line
+        list passed in memory is identified by a hash of its contents instead.
+        """
+        paths = {k: config.get(k) for k in cls.input_keys if config.get(k)}
+        for i, spec in enumerate(config.get('metadata_tables') or []):
+            if isinstance(spec, dict) and spec.get('path'):
+                paths[f'metadata_tables[{i}]'] = spec['path']
+        identity = {}
+        for key, path in paths.items():
+            if key == 'line_list_path' and line_list is not None:
+                continue
+            stats = [(p, os.stat(p)) for p in expand_line_list_paths(path)]
+            identity[key] = [[p, st.st_size, st.st_mtime_ns] for p, st in stats]
+        if line_list is not None:
+            digest = pd.util.hash_pandas_object(line_list, index=False).to_numpy()
+            columns = ','.join(map(str, line_list.columns)).encode()
+            identity['line_list'] = hashlib.md5(digest.tobytes() + columns).hexdigest()
+        return identity
+
+    def mismatches(self, config: Dict[str, Any], since_day: Optional[int] = None,
+                   line_list: Optional[pd.DataFrame] = None) -> List[str]:
+        """
+        What keeps this checkpoint from resuming a run of `config`: changed
+        settings, analysis window start or input files, or missing checkpoint
+        files. Empty when it can resume.
+        """
+        if not self.meta:
+            return ['no checkpoint found']
+        reasons = []
+        if self.meta.get('signature') != self.signature(config):
+            reasons.append('settings changed')
+        if self.meta.get('since_day') != since_day:
+            reasons.append('analysis window start changed')
+        stored = self.meta.get('inputs', {})
+        current = self.input_identity(config, line_list)
+        reasons += [f'input {key} changed' for key in sorted(set(stored) | set(current))
+                    if stored.get(key) != current.get(key)]
+        files = [self.input_file] + [f'{name}.pkl' for name in self.meta.get('frames', [])]
+        if not all((self.checkpoint_dir / name).exists() for name in files):
+            reasons.append('checkpoint files incomplete')
+        return reasons
+
+    def matches(self, config: Dict[str, Any], since_day: Optional[int] = None,
+                line_list: Optional[pd.DataFrame] = None) -> bool:
+        """True when a complete input checkpoint exists for the same settings and inputs."""
+        return len(self.mismatches(config, since_day, line_list)) == 0
+
+    def start(self, config: Dict[str, Any], df: pd.DataFrame, reports: Dict[str, Dict[str, Any]],
+              frames: Optional[Dict[str, pd.DataFrame]] = None, since_day: Optional[int] = None,
+              line_list: Optional[pd.DataFrame] = None) -> None:
+        """Replace any previous checkpoint with the formatted input of a new run."""
+        self.remove()
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        self.write_pickle(df, self.input_file)
+        frames = frames or {}
+        for name, frame in frames.items():
+            self.write_pickle(frame, f'{name}.pkl')
+        self.meta = {
+            'signature': self.signature(config),
+            'since_day': since_day,
+            'inputs': self.input_identity(config, line_list),
+            'run_id': config.get('run_id'),
+            'reports': reports,
+            'frames': list(frames),
+        }
+        path = self.checkpoint_dir / self.meta_file
+        with open(f'{path}.tmp', 'w') as fh:
+            json.dump(self.meta, fh, indent=4)
+        os.replace(f'{path}.tmp', path)
+        self.num_flushes = 0
+
+    def read_input(self) -> pd.DataFrame:
+        return pd.read_pickle(self.checkpoint_dir / self.input_file)
+
+    def read_frame(self, name: str) -> pd.DataFrame:
+        return pd.read_pickle(self.checkpoint_dir / f'{name}.pkl')
+
+    def flush(self, completed: int, tracker: int, events: List[Tuple],
+              selected: np.ndarray) -> None:
+        """Record the events and selected row positions since the previous flush."""
+        progress = (completed, tracker, events, selected)
+        self.write_pickle(progress, f'progress_{self.num_flushes}.pkl')
+        self.num_flushes += 1
+
+    def progress(self) -> Iterator[Tuple[int, int, List[Tuple], np.ndarray]]:
+        for path in self.progress_files():
+            yield pd.read_pickle(path)
+
+    def progress_files(self) -> List[Path]:
+        files = list(self.checkpoint_dir.glob('progress_*.pkl'))
+        return sorted(files, key=lambda p: int(p.stem.split('_')[1]))
+
+    def write_pickle(self, obj: Any, name: str) -> None:
+        path = self.checkpoint_dir / name
+        pd.to_pickle(obj, f'{path}.tmp')
+        os.replace(f'{path}.tmp', path)
+
+    def remove(self) -> None:
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+        self.meta = {}
+        self.num_flushes = 0
+
+    @staticmethod
+    def default_dir(config: Dict[str, Any]) -> Optional[str]:
+        if config.get('checkpoint_dir'):
+            return config['checkpoint_dir']
+        if config.get('outdir'):
+            return os.path.join(config['outdir'], 'checkpoint')
+        return None
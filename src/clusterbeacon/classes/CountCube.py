@@ -0,0 +1,149 @@
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+
+class CountCube:
+    """
+    Persisted sample counts by (address level, denovo cluster code, ISO week,
+    jurisdiction, is_human), with a ledger of each sample's cell so updates are
+    incremental.
+    """
+
+    cube_file = "cube.parquet"
+    ledger_file = "samples.parquet"
+    dimensions = ['level', 'cluster_code', 'iso_year', 'iso_week', 'jurisdiction', 'is_human']
+    ledger_columns = ['row_key', 'gas_denovo_cluster_address', 'iso_year', 'iso_week',
+                      'jurisdiction', 'is_human']
+
+    def __init__(self, cube_dir: Union[str, Path], jurisdiction_col: str = 'state_province',
+                 delim: str = '.') -> None:
+        self.cube_dir = Path(cube_dir)
+        self.jurisdiction_col = jurisdiction_col
+        self.delim = delim
+        self.cube = self.read(self.cube_dir / self.cube_file, self.dimensions + ['count'])
+        self.ledger = self.read(self.cube_dir / self.ledger_file, self.ledger_columns)
+        self._totals = None
+
+    @staticmethod
+    def read(path: Path, columns) -> pd.DataFrame:
+        if path.exists():
+            return pd.read_parquet(path)
+        return pd.DataFrame(columns=columns)
+
+    def sample_cells(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Cube cell of every row, keyed by sample id and occurrence."""
+        iso = df['date'].dt.isocalendar()
+        if self.jurisdiction_col in df.columns:
+            jurisdiction = df[self.jurisdiction_col].fillna('').astype(str)
+        else:
+            jurisdiction = pd.Series('', index=df.index)
+        sample_ids = df['sample_id'].astype(str)
+        return pd.DataFrame({
+            'row_key': sample_ids + '#' + sample_ids.groupby(sample_ids).cumcount().astype(str),
+            'gas_denovo_cluster_address': df['gas_denovo_cluster_address'].astype(str),
+            'iso_year': iso['year'].astype(np.int32).to_numpy(),
+            'iso_week': iso['week'].astype(np.int8).to_numpy(),
+            'jurisdiction': jurisdiction.to_numpy(),
+            'is_human': df['is_human'].astype(bool).to_numpy(),
+        }).reset_index(drop=True)
+
+    def contributions(self, cells: pd.DataFrame, sign: int) -> pd.DataFrame:
+        """Counts `cells` adds (sign 1) or removes (sign -1) at every address level."""
+        if len(cells) == 0:
+            return pd.DataFrame(columns=self.dimensions + ['count'])
+        parts = cells['gas_denovo_cluster_address'].str.split('|', n=1, expand=True)
+        if parts.shape[1] < 2:
+            parts[1] = None
+        levels = parts[1].fillna('').str.split(self.delim, expand=True)
+        frames = []
+        code = parts[0] + '|'
+        for n in range(levels.shape[1]):
+            present = levels[n].notna() & (levels[n] != '')
+            code = code + (self.delim if n > 0 else '') + levels[n].fillna('')
+            frame = cells.loc[present, ['iso_year', 'iso_week', 'jurisdiction', 'is_human']].copy()
+            frame['level'] = n + 1
+            frame['cluster_code'] = code[present]
+            frames.append(frame)
+        counts = pd.concat(frames, ignore_index=True).groupby(self.dimensions, sort=False).size()
+        return (counts * sign).rename('count').reset_index()
+
+    def update(self, df: pd.DataFrame, prune: bool = True,
+               sample_ids: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """
+        Bring the cube in line with `df`, removing samples missing from it when
+        `prune`. Given the changed `sample_ids` of a line list diff, only their rows
+        are compared.
+        """
+        if sample_ids is None:
+            cells, ledger, kept = self.sample_cells(df), self.ledger, self.ledger.iloc[0:0]
+        else:
+            ids = pd.Index(pd.unique(pd.Series(list(sample_ids), dtype=object).astype(str)))
+            cells = self.sample_cells(df[df['sample_id'].astype(str).isin(ids).to_numpy()])
+            in_scope = self.ledger['row_key'].str.rsplit('#', n=1).str[0].isin(ids).to_numpy()
+            ledger, kept = self.ledger[in_scope], self.ledger[~in_scope]
+            prune = True
+        merged = cells.merge(ledger, on='row_key', how='outer', suffixes=('', '_old'),
+                             indicator=True)
+        cell_columns = self.ledger_columns[1:]
+        new = merged['_merge'] == 'left_only'
+        both = merged['_merge'] == 'both'
+        removed = (merged['_merge'] == 'right_only') & prune
+        changed = pd.Series(False, index=merged.index)
+        for col in cell_columns:
+            changed |= both & (merged[col] != merged[f'{col}_old'])
+
+        old_columns = {f'{col}_old': col for col in cell_columns}
+        additions = merged.loc[new | changed, cell_columns]
+        removals = merged.loc[changed | removed, list(old_columns)].rename(columns=old_columns)
+        delta = pd.concat([self.contributions(additions, 1), self.contributions(removals, -1)],
+                          ignore_index=True)
+        if len(delta) > 0:
+            cube = pd.concat([self.cube, delta], ignore_index=True)
+            cube = cube.groupby(self.dimensions, sort=False)['count'].sum().reset_index()
+            cube = cube[cube['count'] != 0].reset_index(drop=True)
+            self.cube = cube.astype({'level': np.int8, 'iso_year': np.int32, 'iso_week': np.int8,
+                                     'is_human': bool, 'count': np.int64})
+
+        # samples only in the old ledger stay in it (with their old cell) unless pruned
+        current = merged.loc[new | both, self.ledger_columns]
+        retained = merged.loc[(merged['_merge'] == 'right_only') & ~removed,
+                              ['row_key'] + list(old_columns)]
+        ledger = pd.concat([kept, current, retained.rename(columns=old_columns)], ignore_index=True)
+        self.ledger = ledger.astype({'iso_year': np.int32, 'iso_week': np.int8, 'is_human': bool})
+        self._totals = None
+        return {
+            'mode': 'full' if sample_ids is None else 'changes',
+            'compared': int(len(merged)),
+            'added': int(new.sum()),
+            'changed': int(changed.sum()),
+            'removed': int(removed.sum()),
+            'unchanged': int((both & ~changed).sum()) + len(kept),
+        }
+
+    def save(self) -> None:
+        """Write the cube and sample ledger, replacing the previous files atomically."""
+        os.makedirs(self.cube_dir, exist_ok=True)
+        for frame, name in ((self.cube, self.cube_file), (self.ledger, self.ledger_file)):
+            path = self.cube_dir / name
+            frame.to_parquet(f'{path}.tmp', index=False)
+            os.replace(f'{path}.tmp', path)
+
+    def cluster_totals(self, cluster_codes: Iterable[str]) -> pd.DataFrame:
+        """Total and human sample counts of each cluster code, at whatever level the code is."""
+        if self._totals is None:
+            human = self.cube['count'].where(self.cube['is_human'].astype(bool), 0)
+            self._totals = pd.DataFrame({
+                'cluster_code': self.cube['cluster_code'],
+                'total': self.cube['count'],
+                'human': human,
+            }).groupby('cluster_code').sum()
+        return self._totals.reindex(list(cluster_codes), fill_value=0)
+
+    def weekly_counts(self, level: int) -> pd.DataFrame:
+        """Sample counts per cluster code and ISO week at one address level."""
+        cube = self.cube[self.cube['level'] == level]
+        return cube.groupby(['cluster_code', 'iso_year', 'iso_week'])['count'].sum().reset_index()
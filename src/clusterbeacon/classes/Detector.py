@@ -1,42 +1,241 @@
+import heapq
+import numpy as np
 import pandas as pd
+import pyarrow as pa
 import os
+import sqlite3
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from datetime import datetime
 from src.clusterbeacon.constants import needed_cols_ll, needed_cols_config
-from src.clusterbeacon.utils import calc_md5
+from src.clusterbeacon.utils import calc_md5, normalize_dates
+from src.clusterbeacon.arrow_io import table_to_frame
+from src.clusterbeacon.ingest import (delimiter_of, expand_line_list_paths, is_partitioned,
+                                      read_line_list_partitions)
+from src.clusterbeacon.enrich import (conflict_columns, enrich_frame, parse_table_spec,
+                                      read_metadata_table)
+from src.clusterbeacon.outofcore import (SpillPartitions, estimate_frame_bytes,
+                                         iter_line_list_chunks, memory_budget, plan_partitions,
+                                         working_set_factor)
+from src.clusterbeacon.kernels import (cluster_offsets, forward_date_deltas, gap_windows,
+                                       sliding_windows, sorted_neighbor_pairs, to_epoch_days)
+from src.clusterbeacon.classes.ProfileStore import ProfileStore
+from src.clusterbeacon.classes.OutbreakRegistry import OutbreakRegistry
+from src.clusterbeacon.classes.Tracer import Tracer
+from src.clusterbeacon.classes.CountCube import CountCube
+from src.clusterbeacon.classes.Checkpoint import Checkpoint
+from src.clusterbeacon.linkage import (churn_columns, classify_churn, link_columns, link_outbreaks,
+                                       outbreak_memberships, read_previous_memberships)
 
 class Detector:
-    status = True
-    messages = []
-    input_samples = []
-    selected_samples = []
-    ll_df = None
-    outbreak_df = None
-
-    def __init__(self,config) -> None:
+    # outbreak code of deferred events that only advance the outbreak numbering
+    skipped_event = 'skipped'
+    # overlapping_isolates counts members already in an earlier outbreak of the same cluster, which
+    # only sliding windows produce
+    outbreak_columns = ['year','cluster_id','total_isolates','human_isolates','unassigned_isolates',
+                        'sample_ids','unassigned_samples','existing_outbreak_codes',
+                        'overlapping_isolates']
+    cluster_status_columns = ['cluster_id','total','human','unassigned','rule_key','status']
+    # 'gap' chains dates no more than max_date_delta apart; 'sliding' takes rolling windows of
+    # max_date_delta days
+    window_modes = ['gap','sliding']
+    # in the order the checks are applied
+    gating_failures = [
+        'FAIL: Could not find matching rule set',
+        'FAIL: Does not meet minimum number of total isolates for cluster definition',
+        'FAIL: Does not meet minimum number of human isolates for cluster definition',
+        'FAIL: No new samples to be assigned to an outbreak',
+    ]
+
+    def __init__(self,config,writer=None,line_list=None,rules=None) -> None:
+        """
+        Run detection for `config`.
+
+        `line_list` (DataFrame) and `rules` (DataFrame of rule rows or an
+        already parsed rule dict) replace reading ``line_list_path`` and
+        ``outbreak_rules_path`` so the detector can run entirely in memory.
+        All state lives on the instance.
+        """
+        self.status = True
+        self.messages = []
+        self.ll_df = None
+        self.outbreak_df = None
+        self.outbreak_clusters = {}
+        self.duplicate_candidates = {}
+        self.date_report = {}
+        self.enrichment_report = {}
+        self.enrichment_conflicts = pd.DataFrame(columns=conflict_columns)
+        self.metadata_tables = None
+        self.count_cube = None
+        self.count_cube_report = {}
+        self.profile_report = {}
+        self.truncated_duplicate_rows = 0
+        self.cluster_status = pd.DataFrame(columns=self.cluster_status_columns)
+        self.outbreak_links = pd.DataFrame(columns=link_columns)
+        self.churn = pd.DataFrame(columns=churn_columns)
+        self.writer = writer
+        self.tracer = Tracer(enabled=bool(config.get('trace',False)))
         self.needed_cols_ll = needed_cols_ll
         self.needed_cols_config = needed_cols_config
 
-        self.validate_keys(self.needed_cols_config, list(config.keys()))
+        needed = [k for k in self.needed_cols_config
+                  if not (k == 'line_list_path' and line_list is not None)
+                  and not (k == 'outbreak_rules_path' and rules is not None)]
+        self.validate_keys(needed, list(config.keys()))
         if not self.status:
             return
         
         self.rule_key_columns = config['rule_key_columns']
-        rpath = config['outbreak_rules_path']
         self.gas_denovo_thresholds = config['gas_denovo_thresholds']
-        self.rules = self.process_rules(rpath,self.rule_key_columns)
+        self.window_mode = config.get('window_mode','gap')
+        if self.window_mode not in self.window_modes:
+            self.status = False
+            self.messages.append(f'Error: unknown window_mode {self.window_mode}, '
+                                 f'expected one of {",".join(self.window_modes)}')
+            return
+        with self.tracer.span('process_rules'):
+            if rules is None:
+                self.rules = self.process_rules(config['outbreak_rules_path'],self.rule_key_columns)
+            elif isinstance(rules, dict):
+                self.rules = rules
+            else:
+                self.rules = self.parse_rules(self.to_pandas(rules),self.rule_key_columns)
         if not self.status:
             return
-        self.selected_samples = []
-        fpath = config['line_list_path']
-        df = self.format_df(fpath,col_map=config["column_map"],filters=config['filters'],source_col='source_type')
-        df.to_csv("temp.tsv",sep="\t",header=True, index=False)
-        self.validate_keys(self.needed_cols_ll, list(df.columns))
+        with self.tracer.span('load_profile_store'):
+            self.profile_store = self.load_profile_store(config.get('allele_profiles_path'),
+                                                         config.get('profile_store_dir'))
         if not self.status:
             return
-        
-        self.input_samples = list(df['sample_id'])
-        outbreak_codes = self.process(df)
+        self.selected_rows = np.zeros(0, dtype=bool)
+        self.cluster_groups = set()
+        self.giant_cluster_size = config.get('giant_cluster_size',10000)
+        self.since_day = self.get_since_day(config.get('since'),config.get('lookback_days'),
+                                            config.get('analysis_date'))
+        if not self.status:
+            return
+        self.duplicate_match_columns = ["country","state_province","sex","age"]
+        self.duplicate_mode = config.get('duplicate_mode','exact')
+        self.duplicate_tolerances = config.get('duplicate_tolerances',{})
+        self.duplicate_neighbor_window = config.get('duplicate_neighbor_window',50)
+        self.date_formats = config.get('date_formats',['%Y-%m-%d'])
+        self.partial_date_policy = config.get('partial_date_policy','drop')
+        self.ingest_threads = config.get('ingest_threads')
+        self.metadata_table_specs = config.get('metadata_tables') or []
+        source = config['line_list_path'] if line_list is None else line_list
+        self.deferred = None
+        self.pending = None
+        self.checkpoint = None
+        self.resume_progress = False
+        self.checkpoint_clusters = int(config.get('checkpoint_clusters') or 0)
+        num_partitions = self.plan_out_of_core(source,config)
+        if not self.status:
+            return
+        if num_partitions > 1:
+            with self.tracer.span('process_out_of_core',partitions=num_partitions):
+                outbreak_codes = self.process_out_of_core(source,config,num_partitions)
+            if not self.status:
+                return
+        else:
+            checkpoint_dir = Checkpoint.default_dir(config)
+            if self.checkpoint_clusters > 0 and checkpoint_dir:
+                self.checkpoint = Checkpoint(checkpoint_dir)
+            memory_line_list = None
+            if line_list is not None and self.checkpoint is not None:
+                memory_line_list = self.to_pandas(line_list)
+            if self.checkpoint is not None and config.get('resume') and self.checkpoint.meta:
+                reasons = self.checkpoint.mismatches(config,self.since_day,memory_line_list)
+                if reasons:
+                    self.status = False
+                    self.messages.append(f'Error: cannot resume from checkpoint '
+                                         f'{self.checkpoint.checkpoint_dir} '
+                                         f'({"; ".join(reasons)}); '
+                                         f'rerun without --resume to start over')
+                    return
+                with self.tracer.span('resume_input') as span:
+                    df = self.checkpoint.read_input()
+                    span['rows'] = len(df)
+                reports = self.checkpoint.meta['reports']
+                self.date_report = dict(reports['date_report'])
+                self.enrichment_report = dict(reports['enrichment_report'])
+                self.enrichment_conflicts = self.checkpoint.read_frame('enrichment_conflicts')
+                self.resume_progress = True
+            else:
+                with self.tracer.span('format_df') as span:
+                    df = self.format_df(source,col_map=config["column_map"],
+                                        filters=config['filters'],source_col='source_type')
+                    span['rows'] = len(df)
+                self.validate_keys(self.needed_cols_ll, list(df.columns))
+                if not self.status:
+                    return
+                if self.checkpoint is not None:
+                    reports = {'date_report':self.date_report,
+                               'enrichment_report':self.enrichment_report}
+                    frames = {'enrichment_conflicts':self.enrichment_conflicts}
+                    with self.tracer.span('checkpoint_input'):
+                        try:
+                            self.checkpoint.start(config,df,reports,frames,since_day=self.since_day,
+                                                  line_list=memory_line_list)
+                        except OSError as e:
+                            self.status = False
+                            self.messages.append(f'Error: checkpoint '
+                                                 f'{self.checkpoint.checkpoint_dir} '
+                                                 f'could not be written: {e}')
+                            return
+            self.report_dates()
+            if config.get('count_cube_dir'):
+                with self.tracer.span('count_cube'):
+                    self.count_cube = self.update_count_cube(
+                        df,config['count_cube_dir'],
+                        config.get('cube_jurisdiction_column','state_province'),
+                        config.get('gas_denovo_delimiter','.'),
+                        config.get('count_cube_changes'))
+                if not self.status:
+                    return
+
+            with self.tracer.span('process'):
+                outbreak_codes = self.process(df)
+        if config.get('outbreak_registry_path'):
+            run_id = config.get('run_id', datetime.now().strftime("%Y%m%d%H%M%S"))
+            with self.tracer.span('register_outbreaks'):
+                outbreak_codes = self.register_outbreaks(outbreak_codes,
+                                                         config['outbreak_registry_path'],run_id)
+            if not self.status:
+                return
+            self.outbreak_clusters = outbreak_codes
+        if config.get('previous_memberships_path'):
+            with self.tracer.span('link_outbreaks'):
+                self.link_previous_outbreaks(outbreak_codes,config['previous_memberships_path'])
+            if not self.status:
+                return
+        if self.truncated_duplicate_rows:
+            self.messages.append(f'Warning: {self.truncated_duplicate_rows} rows had more '
+                                 f'duplicate candidates within the date tolerance than '
+                                 f'duplicate_neighbor_window ({self.duplicate_neighbor_window}); '
+                                 f'only the nearest in date were compared')
+        if self.profile_report.get('missing_profiles'):
+            report = self.profile_report
+            self.messages.append(f"Warning: {report['missing_profiles']} of {report['samples']} "
+                                 f"samples have no allele profile and are left out of outbreaks "
+                                 f"(e.g. {', '.join(report['missing_examples'])})")
+        if self.since_day is not None and self.profile_store is not None:
+            # skipped windows are not split by allele distance, so they count as one outbreak each
+            self.profile_report['outbreak_numbering'] = 'approximate before the analysis window'
+            self.messages.append('Warning: outbreak numbers under an analysis window assume one '
+                                 'outbreak per skipped window, so with allele profiles they can '
+                                 'differ from a full run; use an outbreak registry for stable codes')
         self.outbreak_df = pd.DataFrame.from_dict(outbreak_codes,orient='index')
-        self.ll_df = df[df['sample_id'].isin(self.selected_samples)]
+        self.outbreak_df = self.outbreak_df.rename_axis('outbreak_code').reset_index()
+        self.ll_df = self.processed_df[self.selected_rows]
+
+    @classmethod
+    def get_outbreak_columns(cls,config):
+        columns = list(cls.outbreak_columns)
+        if config.get('allele_profiles_path') or config.get('profile_store_dir'):
+            columns += ['max_pairwise_distance','profile_missing']
+        if config.get('outbreak_registry_path'):
+            columns.append('code_status')
+        return columns
 
     def validate_keys(self, fields, data_keys):
         missing = set(fields) - set(data_keys)
@@ -57,7 +256,9 @@ class Detector:
             self.status = False
             self.messages.append(f'Error: rule file {fpath} does not exist or is inaccessible')
             return {}
-        df = pd.read_csv(fpath,header=0,sep="\t")
+        return self.parse_rules(pd.read_csv(fpath,header=0,sep="\t"),columns)
+
+    def parse_rules(self,df,columns):
         rules = {}
         for idx,row in df.iterrows():
             key = []
@@ -71,53 +272,339 @@ class Detector:
             min_human_isolates = row['min_human_isolates']
             max_days = row['max_date_delta']
             max_pairwise_diff = row['max_pairwise_threshold']
+            window_mode = row.get('window_mode')
+            if pd.isna(window_mode) or window_mode == '':
+                window_mode = self.window_mode
+            if window_mode not in self.window_modes:
+                self.status = False
+                self.messages.append(f'Error: rule {key} has unknown window_mode {window_mode}')
             rules[key] = {
                 'min_total_isolates':min_total_isolates,
                 'min_human_isolates':min_human_isolates,
                 'max_date_delta': max_days,
-                'max_pairwise_threshold': max_pairwise_diff
+                'max_pairwise_threshold': max_pairwise_diff,
+                'window_mode': window_mode
             }
         return rules
 
-    def calc_date_delta(self,df,date_col='date'):
-        dates = df[date_col].tolist()
-        date_delta = [0]*len(dates)
-        if len(dates) < 2:
-            return date_delta
-        for i in range(0,len(dates)-1):
-            d1 = dates[i]
-            d2 = dates[i+1]
-            date_delta[i] = int((d2 - d1).days)
-        return date_delta
+    def load_profile_store(self,profile_path,store_dir):
+        if not profile_path and not store_dir:
+            return None
+        if not store_dir:
+            store_dir = f'{profile_path}.store'
+        try:
+            return ProfileStore.open_or_build(profile_path,store_dir)
+        except (OSError, ValueError) as e:
+            self.status = False
+            self.messages.append(f'Error: could not load allele profiles: {e}')
+            return None
 
-    def format_df(self,fpath,col_map,filters,source_col):
-        if not self.file_valid(fpath):
+    def count_missing_profiles(self,sample_ids,profile_rows,num_examples=10):
+        """
+        Count samples absent from the allele profile store. Their distances are
+        unknown, so they are left out of outbreaks (see ``verify_window``).
+        """
+        missing = profile_rows < 0
+        report = self.profile_report
+        report['samples'] = report.get('samples',0) + len(profile_rows)
+        report['missing_profiles'] = report.get('missing_profiles',0) + int(missing.sum())
+        examples = report.setdefault('missing_examples',[])
+        room = max(0,num_examples - len(examples))
+        examples.extend(sample_ids.to_numpy()[missing][:room].astype(str).tolist())
+
+    def verify_window(self,profile_rows,threshold):
+        """
+        Groups of window positions within `threshold` by allele distance, their
+        maximum distances, and the positions of samples without a profile, which
+        are left out of the groups (None without a profile store).
+        """
+        if self.profile_store is None:
+            return [np.arange(len(profile_rows))], [None], None
+        missing = np.flatnonzero(profile_rows < 0)
+        if len(missing) == 0:
+            groups, max_dists = self.profile_store.split_rows_by_threshold(profile_rows,threshold)
+            return groups, max_dists, missing
+        profiled = np.flatnonzero(profile_rows >= 0)
+        if len(profiled) == 0:
+            return [], [], missing
+        groups, max_dists = self.profile_store.split_rows_by_threshold(profile_rows[profiled],
+                                                                       threshold)
+        return [profiled[g] for g in groups], max_dists, missing
+
+    def plan_out_of_core(self,source,config):
+        """Number of spill partitions to process the line list in; 1 means in memory."""
+        forced = config.get('out_of_core_partitions')
+        if config.get('max_memory') is None and not forced:
+            return 1
+        if not isinstance(source,(str,os.PathLike)):
+            return 1
+        if config.get('count_cube_dir'):
+            self.messages.append('Warning: the count cube needs the whole line list in memory; '
+                                 'out-of-core processing disabled')
+            return 1
+        paths = expand_line_list_paths(source)
+        try:
+            budget = memory_budget(config.get('max_memory'))
+            estimate, row_bytes = estimate_frame_bytes(paths)
+        except (OSError, ValueError, pa.ArrowException) as e:
+            self.status = False
+            self.messages.append(f'Error: could not plan out-of-core processing: {e}')
+            return 1
+        self.chunk_rows = config.get('out_of_core_chunk_rows') or max(
+            1000, budget // max(1, 2 * working_set_factor * row_bytes))
+        if forced:
+            return int(forced)
+        return plan_partitions(estimate,budget)
+
+    def process_out_of_core(self,source,config,num_partitions):
+        """
+        Prepare the line list chunk by chunk into hash partitions of
+        denovo_cluster_code spilled to disk, process one partition at a time,
+        then replay the outbreaks and duplicate groups in cluster order so
+        codes and outputs match the in-memory path.
+        """
+        col_map = config["column_map"]
+        spill = SpillPartitions(num_partitions,config.get('spill_dir'))
+        events = []
+        selected = []
+        statuses = []
+        try:
+            with self.tracer.span('spill_partitions') as span:
+                rows = 0
+                paths = expand_line_list_paths(source)
+                for chunk in iter_line_list_chunks(paths,col_map,self.chunk_rows):
+                    chunk = self.prepare_rows(chunk,col_map,config['filters'],'source_type')
+                    if not self.status:
+                        return {}
+                    spill.write(chunk)
+                    rows += len(chunk)
+                span['rows'] = rows
+            self.report_dates()
+            for p in range(num_partitions):
+                df = spill.read(p)
+                spill.remove(p)
+                if len(df) == 0:
+                    continue
+                with self.tracer.span('partition',partition=p,rows=len(df)):
+                    self.deferred = []
+                    self.process(self.order_rows(df))
+                    events.append(self.deferred)
+                    selected.append(self.processed_df[self.selected_rows])
+                    statuses.append(self.cluster_status)
+                del df
+        except (OSError, pa.ArrowException, pd.errors.ParserError) as e:
+            self.status = False
+            self.messages.append(f'Error: out-of-core processing failed: {e}')
+            return {}
+        finally:
+            self.deferred = None
+            spill.cleanup()
+
+        self.outbreak_clusters = {}
+        self.duplicate_candidates = {}
+        self.tracker = 1
+        # each cluster lives in one partition, whose events are already in cluster order
+        for cluster_id, outbreak_code, payload in heapq.merge(*events, key=lambda e: e[0]):
+            if outbreak_code is None:
+                self.emit_duplicates(payload,cluster_id)
+                continue
+            if outbreak_code == self.skipped_event:
+                self.tracker += payload
+                continue
+            year_code = f'{payload["year"]}'[-2:]
+            self.emit_outbreak(f'{year_code}_{cluster_id}_{self.tracker}',payload)
+            self.tracker += 1
+
+        if statuses:
+            status = pd.concat(statuses, ignore_index=True)
+            order = np.argsort(status['cluster_id'].to_numpy(), kind='stable')
+            self.cluster_status = status.iloc[order].reset_index(drop=True)
+        ll_df = pd.concat(selected) if selected else pd.DataFrame(columns=self.needed_cols_ll)
+        if len(ll_df) > 0:
+            ll_df = ll_df.iloc[np.argsort(ll_df['denovo_cluster_code'].to_numpy(), kind='stable')]
+        self.processed_df = ll_df.reset_index(drop=True)
+        self.selected_rows = np.ones(len(ll_df), dtype=bool)
+        return self.outbreak_clusters
+
+    def update_count_cube(self,df,cube_dir,jurisdiction_col,delim,changes_path=None):
+        """
+        Update the persisted count cube with this line list. With `changes_path`
+        (the diff_samples.tsv of a ``diff`` against the delivery the cube was last
+        updated with) only the samples listed there are recounted.
+        """
+        try:
+            cube = CountCube(cube_dir,jurisdiction_col=jurisdiction_col,delim=delim)
+            sample_ids = None
+            if changes_path:
+                if not self.file_valid(changes_path):
+                    raise ValueError(f'line list changes {changes_path} do not exist or are empty')
+                changes = pd.read_csv(changes_path,sep="\t",header=0,dtype=str,
+                                      keep_default_na=False)
+                if 'sample_id' not in changes.columns:
+                    raise ValueError(f'line list changes {changes_path} have no sample_id column')
+                sample_ids = changes['sample_id']
+            self.count_cube_report = cube.update(df,sample_ids=sample_ids)
+            cube.save()
+        except (OSError, ValueError, pa.ArrowException) as e:
+            self.status = False
+            self.messages.append(f'Error: count cube {cube_dir} could not be updated: {e}')
+            return None
+        return cube
+
+    def register_outbreaks(self,outbreak_codes,registry_path,run_id):
+        try:
+            registry = OutbreakRegistry(registry_path)
+            try:
+                return registry.assign(outbreak_codes,run_id)
+            finally:
+                registry.close()
+        except sqlite3.Error as e:
+            self.status = False
+            self.messages.append(f'Error: outbreak registry {registry_path} could not be '
+                                 f'updated: {e}')
+            return outbreak_codes
+
+    def link_previous_outbreaks(self,outbreak_codes,previous_path):
+        try:
+            previous = read_previous_memberships(previous_path)
+        except (FileNotFoundError, ValueError) as e:
             self.status = False
-            self.messages.append(f'Error metadata input {fpath} could not be found or inaccessible')
-            return pd.DataFrame()
-        df = pd.read_csv(fpath,header=0,sep="\t")
+            self.messages.append(f'Error: {e}')
+            return
+        current = outbreak_memberships(outbreak_codes)
+        self.outbreak_links = link_outbreaks(current,previous)
+        self.churn = classify_churn(current,previous,self.outbreak_links)
+
+    def calc_date_delta(self,df,date_col='date',group_col=None):
+        if date_col == 'date' and 'date_days' in df.columns:
+            deltas = forward_date_deltas(df['date_days'].to_numpy())
+        else:
+            deltas = forward_date_deltas(to_epoch_days(df[date_col]))
+        if group_col is not None and len(df) > 0:
+            # the last row of each group has no successor within the group
+            deltas[cluster_offsets(df[group_col].to_numpy())[1:] - 1] = 0
+        return deltas
+
+    @staticmethod
+    def to_pandas(table):
+        if isinstance(table, pa.Table):
+            return table_to_frame(table)
+        return table
+
+    def format_df(self,fpath,col_map,filters,source_col):
+        df = self.read_line_list(fpath,col_map)
+        if not self.status:
+            return df
+        return self.order_rows(self.prepare_rows(df,col_map,filters,source_col))
+
+    def read_line_list(self,fpath,col_map):
+        if isinstance(fpath, (str, os.PathLike)):
+            paths = expand_line_list_paths(fpath)
+            if len(paths) == 0:
+                self.status = False
+                self.messages.append(f'Error metadata input {fpath} could not be found or '
+                                     f'inaccessible')
+                return pd.DataFrame()
+            if is_partitioned(fpath, paths):
+                try:
+                    table = read_line_list_partitions(paths, col_map, self.ingest_threads)
+                    return table_to_frame(table)
+                except (OSError, pa.ArrowException) as e:
+                    self.status = False
+                    self.messages.append(f'Error metadata input {fpath} could not be read: {e}')
+                    return pd.DataFrame()
+            return pd.read_csv(fpath,header=0,sep=delimiter_of(fpath))
+        # caller's frame is never modified
+        return self.to_pandas(fpath).copy()
+
+    def prepare_rows(self,df,col_map,filters,source_col):
+        # row-local steps only, so a line list can also be prepared chunk by chunk
         df = df.rename(columns=col_map)
+        if self.metadata_table_specs:
+            df = self.enrich(df)
+            if not self.status:
+                return df.iloc[0:0]
         cols = set(df.columns)
 
         num_records = len(df)
         for col in self.needed_cols_ll:
             if col not in cols:
                 df[col] = ['']*num_records
-        df = df[df['date'].notna()]
-        
         df = df[df['gas_denovo_cluster_address'].notna()]
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
-        df = self.filter_df(df,filters)
-        df = df.sort_values(by=['taxon_name','genomic_address_name','date'], ascending=True)
+        df = self.normalize_dates(df,date_col='date')
+        df = self.filter_df(df,filters).copy()
         df = self.add_taxonomy(df,taxon_col='taxon_name')
 
         df['denovo_cluster_code'] = self.extract_clusters(df,col_name='gas_denovo_cluster_address',delim='.')
         df['is_human'] = self.detect_human(df,col_name=source_col)
-        df = df.sort_values(by=['denovo_cluster_code','date'])
-        df['date_delta'] = self.calc_date_delta(df,date_col='date')
+        return df
+
+    def load_metadata_tables(self):
+        try:
+            tables = [read_metadata_table(parse_table_spec(spec))
+                      for spec in self.metadata_table_specs]
+        except (OSError, ValueError, pa.ArrowException) as e:
+            self.status = False
+            self.messages.append(f'Error: metadata table could not be read: {e}')
+            return []
+        for table in tables:
+            self.enrichment_report[table['name']] = {
+                'table_rows': table['table_rows'], 'duplicate_keys': table['duplicate_keys'],
+                'rows': 0, 'matched': 0, 'unmatched': 0, 'columns': {}}
+        return tables
+
+    def enrich(self,df):
+        # tables are read once and joined onto every chunk; coverage counts of chunks add up
+        if self.metadata_tables is None:
+            self.metadata_tables = self.load_metadata_tables()
+            if not self.status:
+                return df
+        try:
+            df, report, conflicts = enrich_frame(df,self.metadata_tables)
+        except ValueError as e:
+            self.status = False
+            self.messages.append(f'Error: {e}')
+            return df
+        for name, counts in report.items():
+            totals = self.enrichment_report[name]
+            for key in ('rows','matched','unmatched'):
+                totals[key] += counts[key]
+            for col, col_counts in counts['columns'].items():
+                col_totals = totals['columns'].setdefault(col, {'filled': 0, 'conflicts': 0})
+                for key, value in col_counts.items():
+                    col_totals[key] += value
+        if len(conflicts) > 0:
+            self.enrichment_conflicts = pd.concat([self.enrichment_conflicts, conflicts],
+                                                  ignore_index=True)
+        return df
 
+    def report_dates(self):
+        if self.date_report.get('unparsed', 0) > 0:
+            self.messages.append(f"Warning: {self.date_report['unparsed']} rows with unparseable "
+                                 f"dates were excluded")
+
+    def order_rows(self,df):
+        df = df.sort_values(by=['taxon_name','genomic_address_name','date'], ascending=True)
+        df = df.sort_values(by=['denovo_cluster_code','date'])
+        df['date_delta'] = self.calc_date_delta(df,date_col='date',group_col='denovo_cluster_code')
         return df.reset_index(drop=True)
 
+    def normalize_dates(self,df,date_col='date'):
+        try:
+            days, valid, report = normalize_dates(df[date_col],formats=self.date_formats,
+                                                  partial_policy=self.partial_date_policy)
+        except ValueError as e:
+            self.status = False
+            self.messages.append(f'Error: {e}')
+            return df.iloc[0:0]
+        # reports of line lists prepared chunk by chunk add up
+        for key, value in report.items():
+            self.date_report[key] = self.date_report.get(key, 0) + value
+        df = df[valid].copy()
+        df['date_days'] = days[valid]
+        df[date_col] = pd.to_datetime(df['date_days'].to_numpy().astype('datetime64[D]'))
+        return df
+
     def add_taxonomy(self,df,taxon_col):
         genus = []
         species = []
@@ -160,49 +647,127 @@ class Detector:
         return assign
 
     def summarize_denovo_clusters(self,df):
-        total_cluster_counts = dict(df['denovo_cluster_code'].value_counts())
-        human_cluster_counts = dict(df[df['is_human']]['denovo_cluster_code'].value_counts())
-        unassigned_samples = dict(df[df['outbreak_cluster_code_name'].isna()]['denovo_cluster_code'].value_counts())
-        summary = {}
-        for cluster_code in total_cluster_counts:
-            summary[cluster_code] = {
-                'total':total_cluster_counts[cluster_code],
-                'human':0,
-                'unassigned':0,
-                'unassigned_samples':set(),
-                'outbreak_codes':set(),
-                'samples':set(df['sample_id']),
-                'rules':{},
-                'status':'PASS'
-            }
-            if cluster_code in human_cluster_counts:
-                summary[cluster_code]['human'] = human_cluster_counts[cluster_code]
-            if cluster_code in unassigned_samples:
-                summary[cluster_code]['unassigned'] = unassigned_samples[cluster_code]
-                summary[cluster_code]['unassigned_samples'] = set(df[df['denovo_cluster_code'] == cluster_code]['sample_id'])
-            subset = df[df['outbreak_cluster_code_name'].notnull()]
-            if len(subset) > 0:
-                summary[cluster_code]['outbreak_codes'] = set(subset['outbreak_cluster_code_name'])
-   
+        """
+        Per-cluster aggregate table (one row per denovo cluster, in row order).
+
+        Clusters are visited in sorted code order so tracker numbering does not
+        depend on which other clusters are in the input (see
+        sharding.merge_shard_outputs).
+        """
+        codes = df['denovo_cluster_code'].to_numpy()
+        offsets = cluster_offsets(codes)
+        starts = offsets[:-1]
+        if len(df) == 0:
+            return pd.DataFrame(columns=['cluster_id','row_start','row_end','total','human',
+                                         'unassigned'])
+        total_counts = np.diff(offsets)
+        human_counts = np.add.reduceat(df['is_human'].to_numpy(dtype=np.int64), starts)
+        if self.count_cube is not None:
+            total_counts, human_counts = self.count_cube_totals(codes[starts],total_counts,
+                                                                human_counts)
+        unassigned = df['outbreak_cluster_code_name'].isna().to_numpy(dtype=np.int64)
+        unassigned_counts = np.add.reduceat(unassigned, starts)
+        return pd.DataFrame({
+            'cluster_id': codes[starts],
+            'row_start': starts,
+            'row_end': offsets[1:],
+            'total': np.asarray(total_counts, dtype=np.int64),
+            'human': np.asarray(human_counts, dtype=np.int64),
+            'unassigned': unassigned_counts,
+        })
+
+    def count_cube_totals(self,cluster_ids,total_counts,human_counts):
+        """
+        Cluster totals from the count cube, checked against the counts of the
+        line list in hand; clusters where they disagree (e.g. a cube updated
+        from an incomplete change list) keep the line list counts.
+        """
+        totals = self.count_cube.cluster_totals(cluster_ids)
+        cube_total = totals['total'].to_numpy(dtype=np.int64)
+        cube_human = totals['human'].to_numpy(dtype=np.int64)
+        stale = (cube_total != total_counts) | (cube_human != human_counts)
+        self.count_cube_report['stale_clusters'] = int(stale.sum())
+        if not stale.any():
+            return cube_total, cube_human
+        examples = ', '.join(str(c) for c in cluster_ids[stale][:10])
+        self.messages.append(f'Warning: count cube totals of {int(stale.sum())} clusters differ '
+                             f'from the line list and were recounted (e.g. {examples})')
+        return (np.where(stale, total_counts, cube_total),
+                np.where(stale, human_counts, cube_human))
+
+    def prescreen_clusters(self,df,summary):
+        """
+        Join the cluster aggregates with their resolved rule parameters and
+        apply the gating checks to all clusters at once.
+
+        Adds ``rule_key``, the rule columns and ``status`` ('PASS' or the FAIL
+        reason of the first check a cluster fails).
+        """
+        summary = summary.copy()
+        summary['rule_key'] = self.cluster_rule_keys(df,summary)
+        params = pd.DataFrame.from_dict(self.rules,orient='index',
+                                        columns=['min_total_isolates','min_human_isolates',
+                                                 'max_date_delta','max_pairwise_threshold',
+                                                 'window_mode'])
+        params['window_mode'] = params['window_mode'].fillna(self.window_mode)
+        summary = summary.join(params,on='rule_key')
+        has_rule = summary['rule_key'].isin(params.index).to_numpy()
+        conditions = [
+            ~has_rule,
+            (summary['total'] < summary['min_total_isolates']).to_numpy(),
+            (summary['human'] < summary['min_human_isolates']).to_numpy(),
+            (summary['unassigned'] == 0).to_numpy(),
+        ]
+        summary['status'] = np.select(conditions, self.gating_failures, default='PASS')
         return summary
-        
+
+    def cluster_rule_keys(self,df,summary):
+        """
+        Consensus rule key of every cluster. Clusters with at most one distinct
+        value per rule column (nearly all of them) are resolved from grouped
+        first values; mixed clusters fall back to ``get_rule_key``.
+        """
+        columns = self.rule_key_columns
+        if len(summary) == 0:
+            return np.zeros(0, dtype=object)
+        grouped = df[columns].groupby(df['denovo_cluster_code'], sort=False)
+        first = grouped.first()
+        mixed = (grouped.nunique() > 1).any(axis=1).to_numpy()
+        values = first.apply(lambda col: col.map(lambda v: '' if pd.isna(v) else f'{v}'))
+        codes, combos = pd.factorize(pd.MultiIndex.from_frame(values))
+        keys = np.array([self.resolve_rule_key(combo) for combo in combos], dtype=object)[codes]
+        for i in np.flatnonzero(mixed):
+            start, end = summary['row_start'].iat[i], summary['row_end'].iat[i]
+            keys[i] = self.get_rule_key(df.iloc[start:end],columns)
+        return keys
+
     def extract_clusters(self,df,col_name='gas_denovo_cluster_address',delim='.',t=None):
-        cluster_assignments = []
-        for idx,row in df.iterrows():
-            k = self.get_rule_key_row(row,self.rule_key_columns)
-            addr = row[col_name]
-            (prefix,addr) = addr.split('|')
-            addr = addr.split(delim)
-            if t is None:
-                t = self.rules[k]['max_pairwise_threshold']
-            thresh_idx = self.get_match_threshold_idx(t,self.gas_denovo_thresholds)
-            if thresh_idx > 0:
-                addr = f'{delim}'.join(addr[0:thresh_idx])
-                cluster_assignments.append(f'{prefix}|{addr}')
-            else:
-                cluster_assignments.append(f'{prefix}|{addr[0]}')
+        if len(df) == 0:
+            return []
+        parts = df[col_name].str.split('|', n=1, expand=True)
+        prefix = parts[0]
+        levels = parts[1]
+        if t is None:
+            keys = self.get_rule_keys(df,self.rule_key_columns)
+            thresholds = [self.rules[k]['max_pairwise_threshold'] if k in self.rules else None
+                          for k in keys]
+            idx_lookup = {}
+            num_levels = np.ones(len(df), dtype=np.int64)
+            for i, value in enumerate(thresholds):
+                if value not in idx_lookup:
+                    level = self.get_match_threshold_idx(value,self.gas_denovo_thresholds)
+                    idx_lookup[value] = max(level, 1)
+                num_levels[i] = idx_lookup[value]
+        else:
+            level = max(self.get_match_threshold_idx(t,self.gas_denovo_thresholds), 1)
+            num_levels = np.full(len(df), level, dtype=np.int64)
 
-        return cluster_assignments
+        truncated = pd.Series('', index=df.index, dtype=object)
+        for n in np.unique(num_levels):
+            mask = num_levels == n
+            truncated[mask] = levels[mask].str.split(delim).str[0:n].str.join(delim)
+
+        return (prefix + '|' + truncated).tolist()
         
 
     def filter_df(self, df, filters):
@@ -234,15 +799,8 @@ class Detector:
     def get_line_count(self,f):
         return int(os.popen(f'wc -l {f}').read().split()[0])
     
-    def get_rule_key_row(self,row,columns):
-        rule_key = []
-        for col in columns:
-            v = f'{row[col]}'
-            if v == 'nan':
-                v = ''
-            rule_key.append(f'{v}')
-
-
+    def resolve_rule_key(self,values):
+        rule_key = list(values)
         num_cols = len(rule_key)
         for i in reversed(range(1,num_cols)):
             rule_key[i] = ''
@@ -252,6 +810,21 @@ class Detector:
 
         return ''
 
+    def get_rule_key_row(self,row,columns):
+        rule_key = []
+        for col in columns:
+            v = f'{row[col]}'
+            if v == 'nan':
+                v = ''
+            rule_key.append(f'{v}')
+        return self.resolve_rule_key(rule_key)
+
+    def get_rule_keys(self,df,columns):
+        values = df[columns].astype(str).replace('nan', '')
+        codes, combos = pd.factorize(pd.MultiIndex.from_frame(values))
+        keys = np.array([self.resolve_rule_key(combo) for combo in combos], dtype=object)
+        return keys[codes]
+
     def get_rule_key(self,df,columns):
         summaries = {}
         for col in columns:
@@ -264,117 +837,407 @@ class Detector:
             if len(summaries[col]) > 0:
                 v = list(summaries[col].keys())[0]
             rule_key.append(f'{v}')
-
-        num_cols = len(rule_key)
-        for i in reversed(range(1,num_cols)):
-            rule_key[i] = ''
-            k = "___".join(rule_key)
-            if k in self.rules:
-                return k
-
-        return ''
+        return self.resolve_rule_key(rule_key)
 
     def cluster_dates(self,df,max_date_delta):
-        date_clusters = [[]]
-        clust_id = 0
-        sample_ids = list(df['sample_id'])
-        date_delta = list(df['date_delta'])
-
-        for idx in range(0,len(sample_ids)-1):
-            sample_id = sample_ids[idx]
-            if date_delta[idx] > max_date_delta:
-                clust_id+=1
-                date_clusters.append([])
-            date_clusters[clust_id] += [sample_id, sample_ids[idx+1]]
-
-        return date_clusters
-
-    def duplicate_detect(self,df):
-        max_delta = 90
-        match_columns = ["country","state_province","sex","age"]
-        num_cols = len(match_columns)
-        df['duplicate_group_code'] = self.extract_clusters(df,col_name='gas_denovo_cluster_address',delim='.',t=1)
+        days = to_epoch_days(df['date'])
+        offsets = np.array([0, len(days)], dtype=np.int64)
+        window_ids, window_offsets, _, _ = gap_windows(
+            days, offsets, np.array([max_date_delta], dtype=np.int64),
+            np.zeros(len(days), dtype=bool))
+        sample_ids = df['sample_id'].to_numpy()
+        return [list(sample_ids[window_offsets[j]:window_offsets[j+1]])
+                for j in range(len(window_offsets) - 1)]
 
+    def duplicate_detect(self,df,codes=None):
+        if self.duplicate_mode == 'fuzzy':
+            return self.fuzzy_duplicate_detect(df,codes)
+        match_columns = self.duplicate_match_columns
+        if len(df) < 2:
+            return {}
+        if codes is None:
+            codes = self.duplicate_group_codes(df)
+        # rows sharing the group code and every match value are duplicates; the group key is
+        # the text the md5 of a group has always been computed from
+        values = {col: df[col].to_numpy() if col in df.columns else np.full(len(df),'',dtype=object)
+                  for col in match_columns}
+        keys = pd.Series(codes,dtype=object)
+        for col in match_columns:
+            keys = keys + pd.Series(values[col],dtype=object).astype(str).to_numpy()
+        labels, uniques = pd.factorize(keys)
+        group_sizes = np.bincount(labels, minlength=len(uniques))
+        repeated = np.flatnonzero(group_sizes >= 2)
+        if len(repeated) == 0:
+            return {}
+        sample_ids = df['sample_id'].to_numpy()
+        order = np.argsort(labels, kind='stable')
+        offsets = np.concatenate(([0], np.cumsum(group_sizes)))
+        hashes = calc_md5(list(uniques[repeated]))
         candidates = {}
-        duplicate_group_codes = list(set(df['duplicate_group_code']))
-        for code in duplicate_group_codes:
-            subset = df[df['duplicate_group_code'] == code]
-            if len(subset) < 2:
+        for label, md5 in zip(repeated, hashes):
+            rows = order[offsets[label]:offsets[label+1]]
+            candidates[md5] = [[codes[i]] + [values[col][i] for col in match_columns]
+                               + [sample_ids[i]] for i in rows]
+        return candidates
+
+    def duplicate_group_codes(self,df):
+        codes = self.extract_clusters(df,col_name='gas_denovo_cluster_address',delim='.',t=1)
+        return np.asarray(codes,dtype=object)
+
+    def fuzzy_duplicate_detect(self,df,codes=None):
+        """
+        Duplicate groups allowing per-field tolerances (``duplicate_tolerances``,
+        e.g. {'age': 1, 'date': 7}); fields without a tolerance must match exactly.
+
+        Within each threshold-1 address block rows are sorted by date and only
+        neighbours inside the date tolerance are compared (sorted neighbourhood).
+        Matching pairs are joined transitively into groups. When the date is the
+        only tolerance, adjacent rows suffice; otherwise each row is compared with
+        at most ``duplicate_neighbor_window`` following rows (default 50), and
+        rows whose date window was cut are reported.
+        """
+        match_columns = self.duplicate_match_columns
+        tolerances = self.duplicate_tolerances
+        n = len(df)
+        if n < 2:
+            return {}
+        if codes is None:
+            codes = self.duplicate_group_codes(df)
+        values = {col: df[col].to_numpy() if col in df.columns else np.full(n,'',dtype=object)
+                  for col in match_columns}
+        block_key = pd.Series(codes)
+        for col in match_columns:
+            if col not in tolerances:
+                block_key = block_key + '\x1f' + pd.Series(values[col]).astype(str)
+        blocks = pd.factorize(block_key)[0]
+        days = to_epoch_days(df['date'])
+        order = np.lexsort((days, blocks))
+        other_tolerances = [col for col in tolerances if col != 'date' and col in df.columns]
+        max_neighbors = self.duplicate_neighbor_window if other_tolerances else 1
+        left, right, truncated = sorted_neighbor_pairs(cluster_offsets(blocks[order]), days[order],
+                                                       tolerances.get('date',90), max_neighbors)
+        self.truncated_duplicate_rows += truncated
+        left = order[left]
+        right = order[right]
+        match = np.ones(len(left), dtype=bool)
+        for col, tolerance in tolerances.items():
+            if col == 'date' or col not in df.columns:
                 continue
-            for idx,row in subset.iterrows():
-                sample_id = row['sample_id']
-                meta = [code]
-                for col in match_columns:
-                    if col in row:
-                        meta.append(row[col])
-                    else:
-                        meta.append('')
-                md5 = calc_md5([''.join([str(x) for x in meta])])[0]
-                if md5 not in candidates:
-                    candidates[md5] = []
-                meta.append(sample_id)
-                candidates[md5].append(meta)
-
-        candidate_hash_keys = list(candidates.keys())
-        for md5 in candidate_hash_keys:
-            if len(candidates[md5]) < 2:
-                del(candidates[md5])
+            numeric = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+            a = numeric[left]
+            b = numeric[right]
+            match &= (np.abs(a - b) <= tolerance) | (np.isnan(a) & np.isnan(b))
+        if not match.any():
+            return {}
+        graph = coo_matrix((np.ones(int(match.sum())), (left[match], right[match])), shape=(n, n))
+        _, labels = connected_components(graph, directed=False)
+        group_sizes = np.bincount(labels)
+
+        candidates = {}
+        sample_ids = df['sample_id'].to_numpy()
+        for label in np.unique(labels[group_sizes[labels] >= 2]):
+            rows = np.flatnonzero(labels == label)
+            records = [[codes[i]] + [values[col][i] for col in match_columns] + [sample_ids[i]]
+                       for i in rows]
+            members = ','.join(sorted(str(sample_ids[i]) for i in rows))
+            md5 = calc_md5([codes[rows[0]] + ',' + members])[0]
+            candidates[md5] = records
         return candidates
 
                                 
 
+    def get_since_day(self,since=None,lookback_days=None,analysis_date=None):
+        try:
+            if since:
+                return int(to_epoch_days([pd.Timestamp(since)])[0])
+            if lookback_days is not None:
+                if analysis_date:
+                    reference = pd.Timestamp(analysis_date)
+                else:
+                    reference = pd.Timestamp.now().normalize()
+                return int(to_epoch_days([reference])[0]) - int(lookback_days)
+        except ValueError as e:
+            self.status = False
+            self.messages.append(f'Error: invalid analysis window: {e}')
+        return None
+
+    def recent_clusters(self,df,offsets):
+        """Clusters with a sample collected on or after the start of the analysis window."""
+        if self.since_day is None:
+            return np.ones(len(offsets) - 1, dtype=bool)
+        return df['date_days'].to_numpy()[offsets[1:] - 1] >= self.since_day
+
+    def skip_outbreaks(self,cluster_id,count):
+        """
+        Advance the outbreak numbering past `count` outbreaks left out by the
+        analysis window, so the remaining codes match a full run.
+        """
+        if count == 0:
+            return
+        if self.deferred is not None:
+            self.deferred.append((cluster_id,self.skipped_event,count))
+            return
+        self.tracker += count
+
     def process(self,df):
-        denovo_clust_summary = self.summarize_denovo_clusters(df)
-        outbreak_clusters = {}
-        tracker = 1
-        duplicate_candidates = {}
-        for cluster_id in denovo_clust_summary:
-            subset = df[df['denovo_cluster_code'] == cluster_id]
-            rule_key = self.get_rule_key(subset,self.rule_key_columns)
-            rule_params = {}
-            if rule_key in self.rules:
-                rule_params = self.rules[rule_key]
-            denovo_clust_summary[cluster_id]['rules'] = rule_params
-            if len(rule_params) == 0:
-                denovo_clust_summary[cluster_id]['status'] = 'FAIL: Could not find matching rule set'
-                continue
-            if denovo_clust_summary[cluster_id]['total'] < rule_params['min_total_isolates']:
-                denovo_clust_summary[cluster_id]['status'] = 'FAIL: Does not meet minimum number of total isolates for cluster definition'
-                continue
-            if denovo_clust_summary[cluster_id]['human'] < rule_params['min_human_isolates']:
-                denovo_clust_summary[cluster_id]['status'] = 'FAIL: Does not meet minimum number of human isolates for cluster definition'
-                continue
-            if denovo_clust_summary[cluster_id]['unassigned'] == 0:
-                denovo_clust_summary[cluster_id]['status'] = 'FAIL: No new samples to be assigned to an outbreak'
-                continue                
-            date_clusters = self.cluster_dates(subset, rule_params['max_date_delta'])
-            if len(date_clusters) == 0:
+        with self.tracer.span('summarize_denovo_clusters'):
+            summary = self.summarize_denovo_clusters(df)
+        self.outbreak_clusters = {}
+        self.tracker = 1
+        self.duplicate_candidates = {}
+
+        codes = df['denovo_cluster_code'].to_numpy()
+        offsets = cluster_offsets(codes)
+        # clusters without recent samples are windowed for outbreak numbering but not evaluated
+        recent = self.recent_clusters(df,offsets)
+        with self.tracer.span('rule_gating', clusters=len(summary)) as span:
+            summary = self.prescreen_clusters(df,summary)
+            passed = (summary['status'] == 'PASS').to_numpy()
+            span['passed'] = int(passed.sum())
+        self.cluster_status = summary[self.cluster_status_columns][recent].reset_index(drop=True)
+        max_date_delta = np.zeros(len(offsets) - 1, dtype=np.int64)
+        max_date_delta[passed] = summary['max_date_delta'].to_numpy()[passed]
+        candidate_clusters = np.flatnonzero(passed)
+        rule_keys = summary['rule_key'].to_numpy()
+        sliding = passed & (summary['window_mode'].to_numpy() == 'sliding')
+
+        # window every cluster in one pass, then evaluate the candidates window by window
+        is_human = df['is_human'].to_numpy()
+        day_values = df['date_days'].to_numpy()
+        with self.tracer.span('gap_windows', rows=len(df)):
+            window_ids, window_offsets, _, window_humans = gap_windows(day_values, offsets,
+                                                                       max_date_delta, is_human)
+        slide_offsets = np.zeros(len(offsets), dtype=np.int64)
+        if sliding.any():
+            with self.tracer.span('sliding_windows', clusters=int(sliding.sum())):
+                slide_starts, slide_ends, slide_cluster, slide_humans = sliding_windows(
+                    day_values, offsets, max_date_delta, is_human)
+                # keep the windows of sliding clusters that meet their rule's isolate minimums
+                min_total = summary['min_total_isolates'].to_numpy()
+                min_human = summary['min_human_isolates'].to_numpy()
+                keep = sliding[slide_cluster]
+                keep &= slide_ends - slide_starts >= min_total[slide_cluster]
+                keep &= slide_humans >= min_human[slide_cluster]
+                slide_starts, slide_ends = slide_starts[keep], slide_ends[keep]
+                slide_cluster = slide_cluster[keep]
+                slide_offsets = np.searchsorted(slide_cluster, np.arange(len(offsets)), side='left')
+        # selection and unassigned tracking are carried as row positions into df
+        self.processed_df = df
+        self.selected_rows = np.zeros(len(df), dtype=bool)
+        self.unassigned_rows = df['outbreak_cluster_code_name'].isna().to_numpy()
+        self.duplicate_codes = np.asarray(
+            self.extract_clusters(df,col_name='gas_denovo_cluster_address',delim='.',t=1),dtype=object)
+        profile_rows = np.zeros(len(df), dtype=np.int64)
+        if self.profile_store is not None:
+            profile_rows = self.profile_store.lookup_rows(df['sample_id'])
+            recent_rows = np.repeat(recent, np.diff(offsets))
+            self.count_missing_profiles(df['sample_id'][recent_rows],profile_rows[recent_rows])
+        window_columns = [df.columns.get_loc(col) for col in self.window_columns(df)]
+        completed = 0
+        if self.checkpoint is not None:
+            if self.resume_progress:
+                with self.tracer.span('resume_progress') as span:
+                    completed = self.restore_progress()
+                    span['completed'] = completed
+            self.checkpoint_row = 0
+            if completed > 0:
+                self.checkpoint_row = offsets[candidate_clusters[completed - 1] + 1]
+            self.pending = []
+        for i, c in enumerate(candidate_clusters):
+            if i < completed:
                 continue
-            for i in range(0,len(date_clusters)):
-                sample_ids = date_clusters[i]
-                if len(sample_ids) < rule_params['min_total_isolates']:
-                    continue
-                date_df = subset[subset['sample_id'].isin(sample_ids) ]
-                duplicate_candidates.update(self.duplicate_detect(date_df.copy()))
-                existing_outbreak_codes = set(date_df['outbreak_cluster_code_name'].dropna())
-                unassigned_ids = set(sample_ids) & set(denovo_clust_summary[cluster_id]['unassigned_samples'])
-                year = list(date_df['date'])[0].year
-                year_code = f'{year}'[-2:]
-                count_human = len(date_df[date_df['is_human']])
-                if count_human < rule_params['min_human_isolates']:
-                    continue
-                outbreak_code = f'{year_code}_{cluster_id}_{tracker}'
-                tracker+=1
-                self.selected_samples += sample_ids
-                outbreak_clusters[outbreak_code] = {
-                    'year':year,
-                    'cluster_id':cluster_id,
-                    'total_isolates': len(date_df),
-                    'human_isolates':count_human,
-                    'unassigned_isolates':len(unassigned_ids),
-                    'sample_ids': ','.join(sample_ids),
-                    'unassigned_samples':','.join(unassigned_ids),
-                    'existing_outbreak_codes': existing_outbreak_codes
-                }
-        self.duplicate_candidates = duplicate_candidates
-        return outbreak_clusters
+            cluster_id = codes[offsets[c]]
+            rule_params = self.rules[rule_keys[c]]
+            first_window = window_ids[offsets[c]]
+            first_recent = offsets[c]
+            last_window = window_ids[offsets[c+1] - 1]
+            last_slide = slide_offsets[c+1] if sliding[c] else slide_offsets[c]
+            if self.since_day is not None:
+                # windows ending before the analysis window are skipped; the one containing the
+                # first recent sample keeps its full chained history
+                cluster_days = day_values[offsets[c]:offsets[c+1]]
+                first_recent = offsets[c] + np.searchsorted(cluster_days, self.since_day)
+                first_window = window_ids[first_recent] if recent[c] else last_window + 1
+                # the outbreaks the skipped windows would have had in a full run
+                if sliding[c]:
+                    skipped = np.count_nonzero(slide_ends[slide_offsets[c]:last_slide] <= first_recent)
+                else:
+                    start = window_ids[offsets[c]]
+                    sizes = np.diff(window_offsets[start:first_window+1])
+                    skipped = np.count_nonzero((sizes >= rule_params['min_total_isolates']) &
+                                               (window_humans[start:first_window] >=
+                                                rule_params['min_human_isolates']))
+                self.skip_outbreaks(cluster_id,int(skipped))
+            members = int(offsets[c+1] - offsets[c])
+            giant = self.giant_cluster_size is not None and members > self.giant_cluster_size
+            # member sets already emitted for this cluster; overlapping sliding windows can split
+            # into the same group
+            self.cluster_groups = set()
+            with self.tracer.span('cluster', cluster_id=cluster_id, members=members, giant=giant,
+                                  windows=int(last_window - first_window + 1),
+                                  rule_key=rule_keys[c]):
+                for w in range(first_window, last_window + 1):
+                    self.evaluate_window(df,window_offsets[w],window_offsets[w+1],window_humans[w],
+                                         cluster_id,rule_params,profile_rows,window_columns,giant,
+                                         outbreaks=not sliding[c])
+                # duplicates above come from the chained windows; outbreaks of sliding clusters
+                # from the rolling ones
+                for w in range(slide_offsets[c], last_slide):
+                    if slide_ends[w] <= first_recent:
+                        continue
+                    self.evaluate_window(df,slide_starts[w],slide_ends[w],None,cluster_id,
+                                         rule_params,profile_rows,window_columns,giant,
+                                         duplicates=False)
+            if self.pending is not None and (i + 1) % self.checkpoint_clusters == 0:
+                with self.tracer.span('checkpoint_progress', completed=i + 1):
+                    self.flush_progress(i + 1,offsets[c+1])
+        self.pending = None
+        return self.outbreak_clusters
+
+    def restore_progress(self):
+        """
+        Replay the outbreaks and duplicate groups of the clusters a previous
+        attempt completed, with their original codes, and return how many
+        candidate clusters to skip.
+        """
+        completed = 0
+        for completed, tracker, events, selected in self.checkpoint.progress():
+            for cluster_id, outbreak_code, payload in events:
+                if outbreak_code is None:
+                    self.emit_duplicates(payload,cluster_id)
+                else:
+                    self.emit_outbreak(outbreak_code,payload)
+            self.selected_rows[selected] = True
+            self.tracker = tracker
+        return completed
+
+    def flush_progress(self,completed,row_end):
+        selected = np.flatnonzero(self.selected_rows[self.checkpoint_row:row_end])
+        selected += self.checkpoint_row
+        try:
+            self.checkpoint.flush(completed,self.tracker,self.pending,selected)
+        except OSError as e:
+            # detection itself is unaffected; only a later resume loses this progress
+            self.messages.append(f'Warning: checkpointing stopped, '
+                                 f'{self.checkpoint.checkpoint_dir} could not be written: {e}')
+            self.pending = None
+            return
+        self.pending = []
+        self.checkpoint_row = row_end
+
+    def evaluate_window(self,df,start,end,humans,cluster_id,rule_params,profile_rows,
+                        window_columns,giant,outbreaks=True,duplicates=True):
+        """
+        Evaluate the rows ``start:end`` of one window, split into groups by
+        pairwise allele distance when a profile store is loaded. `humans` of
+        None means the window is already known to meet the human minimum.
+
+        For `giant` clusters only the working columns of this window are
+        copied, so the frame memory follows the window rather than the
+        cluster. Allele distances are computed in row blocks, but complete
+        linkage still holds a distance matrix for any group of samples linked
+        within the threshold whose own maximum distance exceeds it (see
+        ``ProfileStore.split_rows_by_threshold``); windows are not processed
+        out of core.
+        """
+        if end - start < rule_params['min_total_isolates']:
+            return
+        missing = None
+        if not outbreaks or (humans is not None and humans < rule_params['min_human_isolates']):
+            groups = [np.arange(end - start)]
+            max_dists = [None]
+        else:
+            groups, max_dists, missing = self.verify_window(profile_rows[start:end],
+                                                            rule_params['max_pairwise_threshold'])
+        group_outbreaks = [outbreaks] * len(groups)
+        profile_missing = None
+        if missing is not None:
+            profile_missing = len(missing)
+            # samples without a profile are unverified: they only take part in duplicate detection
+            if len(missing) > 0 and duplicates:
+                groups, max_dists = groups + [missing], max_dists + [None]
+                group_outbreaks.append(False)
+        if giant:
+            # giant clusters: copy only the working columns of the current window
+            window_df = df.iloc[start:end, window_columns].copy()
+            for positions, max_dist, group_outbreak in zip(groups, max_dists, group_outbreaks):
+                if len(positions) == end - start:
+                    date_df = window_df
+                else:
+                    date_df = window_df.iloc[positions].copy()
+                self.evaluate_group(date_df,positions + start,cluster_id,rule_params,max_dist,
+                                    group_outbreak,duplicates,profile_missing)
+            del window_df
+        else:
+            for positions, max_dist, group_outbreak in zip(groups, max_dists, group_outbreaks):
+                rows = positions + start
+                self.evaluate_group(df.iloc[rows].copy(),rows,cluster_id,rule_params,max_dist,
+                                    group_outbreak,duplicates,profile_missing)
+
+    def window_columns(self,df):
+        columns = ['sample_id','date','is_human','outbreak_cluster_code_name',
+                   'gas_denovo_cluster_address'] + self.duplicate_match_columns
+        return [col for col in dict.fromkeys(columns) if col in df.columns]
+
+    def evaluate_group(self,date_df,rows,cluster_id,rule_params,max_dist,outbreaks=True,
+                       duplicates=True,profile_missing=None):
+        if len(rows) < rule_params['min_total_isolates']:
+            return
+        if duplicates:
+            self.emit_duplicates(self.duplicate_detect(date_df,self.duplicate_codes[rows]),cluster_id)
+        if not outbreaks:
+            return
+        existing_outbreak_codes = set(date_df['outbreak_cluster_code_name'].dropna().astype(str))
+        year = date_df['date'].iloc[0].year
+        year_code = f'{year}'[-2:]
+        count_human = int(date_df['is_human'].sum())
+        if count_human < rule_params['min_human_isolates']:
+            return
+        member_set = frozenset(rows.tolist())
+        if member_set in self.cluster_groups:
+            return
+        self.cluster_groups.add(member_set)
+        outbreak_code = f'{year_code}_{cluster_id}_{self.tracker}'
+        self.tracker+=1
+        overlapping = int(self.selected_rows[rows].sum())
+        self.selected_rows[rows] = True
+        sample_ids = date_df['sample_id'].to_numpy()
+        unassigned_ids = sample_ids[self.unassigned_rows[rows]]
+        record = {
+            'year':year,
+            'cluster_id':cluster_id,
+            'total_isolates': len(date_df),
+            'human_isolates':count_human,
+            'unassigned_isolates':len(unassigned_ids),
+            'sample_ids': ','.join(sample_ids.astype(str)),
+            'unassigned_samples':','.join(unassigned_ids.astype(str)),
+            'existing_outbreak_codes': ','.join(sorted(existing_outbreak_codes)),
+            'overlapping_isolates': overlapping
+        }
+        if max_dist is not None:
+            record['max_pairwise_distance'] = max_dist
+        if profile_missing is not None:
+            record['profile_missing'] = profile_missing
+        self.emit_outbreak(outbreak_code,record)
+
+    def emit_outbreak(self,outbreak_code,record):
+        if self.deferred is not None:
+            self.deferred.append((record['cluster_id'],outbreak_code,record))
+            return
+        if self.pending is not None:
+            self.pending.append((record['cluster_id'],outbreak_code,record))
+        self.outbreak_clusters[outbreak_code] = record
+        if self.writer is not None:
+            self.writer.write_outbreak(outbreak_code,record)
+
+    def emit_duplicates(self,candidates,cluster_id=None):
+        if self.deferred is not None:
+            if len(candidates) > 0:
+                self.deferred.append((cluster_id,None,candidates))
+            return
+        if self.pending is not None and len(candidates) > 0:
+            self.pending.append((cluster_id,None,candidates))
+        for md5, records in candidates.items():
+            self.duplicate_candidates.setdefault(md5,[]).extend(records)
+        if self.writer is not None:
+            self.writer.write_duplicates(candidates)
@@ -0,0 +1,232 @@
+import json
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import List, Tuple, Union
+
+import pandas as pd
+
+from src.clusterbeacon.utils import file_valid
+
+
+class HistoryStore:
+    """
+    Embedded SQLite store of the results of every run.
+
+    Each run is a partition keyed by ``run_id``: loading a run again replaces
+    its rows, so backfilling old output directories is idempotent.
+
+    Usage
+    -----
+    store = HistoryStore("history.sqlite")
+    store.load_run("results/run_2025_01_01")
+    store.sample_history("S0001")
+    """
+
+    schema = [
+        """CREATE TABLE IF NOT EXISTS runs (
+            run_id TEXT PRIMARY KEY,
+            outdir TEXT,
+            start_time TEXT,
+            end_time TEXT,
+            config TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS outbreaks (
+            run_id TEXT NOT NULL,
+            outbreak_code TEXT NOT NULL,
+            cluster_id TEXT,
+            year INTEGER,
+            total_isolates INTEGER,
+            human_isolates INTEGER,
+            unassigned_isolates INTEGER,
+            PRIMARY KEY (run_id, outbreak_code)
+        ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS memberships (
+            run_id TEXT NOT NULL,
+            outbreak_code TEXT NOT NULL,
+            sample_id TEXT NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS duplicates (
+            run_id TEXT NOT NULL,
+            group_hash TEXT NOT NULL,
+            duplicate_group_code TEXT,
+            sample_id TEXT NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS metrics (
+            run_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            value REAL,
+            PRIMARY KEY (run_id, name)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_outbreaks_code ON outbreaks (outbreak_code, run_id)",
+        "CREATE INDEX IF NOT EXISTS idx_outbreaks_cluster ON outbreaks (cluster_id, run_id)",
+        "CREATE INDEX IF NOT EXISTS idx_memberships_run ON memberships (run_id)",
+        "CREATE INDEX IF NOT EXISTS idx_memberships_sample ON memberships (sample_id, run_id)",
+        "CREATE INDEX IF NOT EXISTS idx_memberships_code ON memberships (outbreak_code, run_id)",
+        "CREATE INDEX IF NOT EXISTS idx_duplicates_run ON duplicates (run_id)",
+        "CREATE INDEX IF NOT EXISTS idx_duplicates_sample ON duplicates (sample_id, run_id)",
+    ]
+
+    def __init__(self, db_path: Union[str, Path]) -> None:
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            for stmt in self.schema:
+                self.conn.execute(stmt)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    @staticmethod
+    def parse_run_time(value: str) -> str:
+        """Normalize the run.json timestamps ("%d/%m/%Y %H:%M:%S") to sortable ISO strings."""
+        if not value:
+            return ''
+        try:
+            return datetime.strptime(value, "%d/%m/%Y %H:%M:%S").isoformat(sep=' ')
+        except ValueError:
+            return value
+
+    def load_run(self, outdir: Union[str, Path]) -> str:
+        """
+        Bulk load one run output directory (run.json, outbreak_summary.tsv,
+        duplicates.tsv) in a single transaction.
+
+        Returns
+        -------
+        str
+            The run id the results were stored under.
+        """
+        outdir = Path(outdir)
+        run_file = outdir / "run.json"
+        if not file_valid(run_file):
+            raise FileNotFoundError(f"{run_file} does not exist or is empty")
+        with open(run_file) as fh:
+            config = json.load(fh)
+        start_time = self.parse_run_time(config.get('analysis_start_time', ''))
+        compact_time = start_time.replace('-', '').replace(':', '').replace(' ', '')
+        run_id = config.get('run_id') or compact_time or outdir.name
+
+        outbreaks = pd.DataFrame()
+        summary_file = outdir / "outbreak_summary.tsv"
+        if file_valid(summary_file):
+            outbreaks = pd.read_csv(summary_file, sep="\t", header=0, dtype={'sample_ids': str})
+        memberships = pd.DataFrame(columns=['outbreak_code', 'sample_id'])
+        if len(outbreaks) > 0:
+            memberships = outbreaks[['outbreak_code', 'sample_ids']].copy()
+            memberships['sample_id'] = memberships['sample_ids'].fillna('').str.split(',')
+            memberships = memberships.explode('sample_id')
+            memberships = memberships[memberships['sample_id'].fillna('') != '']
+
+        duplicates = []
+        duplicates_file = outdir / "duplicates.tsv"
+        if file_valid(duplicates_file):
+            with open(duplicates_file) as fh:
+                for line in fh:
+                    row = line.rstrip("\n").split("\t")
+                    if len(row) >= 3:
+                        duplicates.append((run_id, row[0], row[1], row[-1]))
+
+        metrics = {
+            'num_outbreaks': len(outbreaks),
+            'num_memberships': len(memberships),
+            'num_duplicate_records': len(duplicates),
+        }
+        end_time = self.parse_run_time(config.get('analysis_end_time', ''))
+        if start_time and end_time:
+            runtime = datetime.fromisoformat(end_time) - datetime.fromisoformat(start_time)
+            metrics['runtime_seconds'] = runtime.total_seconds()
+
+        with self.conn:
+            for table in ('runs', 'outbreaks', 'memberships', 'duplicates', 'metrics'):
+                self.conn.execute(f"DELETE FROM {table} WHERE run_id = ?", (run_id,))
+            self.conn.execute(
+                "INSERT INTO runs (run_id, outdir, start_time, end_time, config) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (run_id, str(outdir.resolve()), start_time, end_time, json.dumps(config)),
+            )
+            if len(outbreaks) > 0:
+                columns = ['outbreak_code', 'cluster_id', 'year', 'total_isolates',
+                           'human_isolates', 'unassigned_isolates']
+                rows = outbreaks.reindex(columns=columns).itertuples(index=False)
+                self.conn.executemany(
+                    f"INSERT INTO outbreaks (run_id, {', '.join(columns)}) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    ((run_id, *[self.to_sql(v) for v in row]) for row in rows),
+                )
+                self.conn.executemany(
+                    "INSERT INTO memberships (run_id, outbreak_code, sample_id) VALUES (?, ?, ?)",
+                    ((run_id, code, sample_id) for code, sample_id
+                     in zip(memberships['outbreak_code'], memberships['sample_id'])),
+                )
+            self.conn.executemany(
+                "INSERT INTO duplicates (run_id, group_hash, duplicate_group_code, sample_id) "
+                "VALUES (?, ?, ?, ?)",
+                duplicates,
+            )
+            self.conn.executemany(
+                "INSERT INTO metrics (run_id, name, value) VALUES (?, ?, ?)",
+                ((run_id, name, value) for name, value in metrics.items()),
+            )
+        return run_id
+
+    @staticmethod
+    def to_sql(value):
+        if pd.isna(value):
+            return None
+        if hasattr(value, 'item'):
+            return value.item()
+        return value
+
+    def query(self, sql: str, params: Tuple = ()) -> Tuple[List[str], List[tuple]]:
+        cur = self.conn.execute(sql, params)
+        return [d[0] for d in cur.description], cur.fetchall()
+
+    def list_runs(self):
+        return self.query(
+            """SELECT r.run_id, r.start_time, r.end_time,
+                      (SELECT value FROM metrics m
+                       WHERE m.run_id = r.run_id AND m.name = 'num_outbreaks') AS num_outbreaks,
+                      r.outdir
+               FROM runs r ORDER BY r.run_id"""
+        )
+
+    def sample_history(self, sample_id: str):
+        """Every outbreak a sample was a member of, oldest run first."""
+        return self.query(
+            """SELECT m.run_id, r.start_time, m.outbreak_code, o.cluster_id, o.total_isolates
+               FROM memberships m
+               JOIN runs r ON r.run_id = m.run_id
+               LEFT JOIN outbreaks o ON o.run_id = m.run_id AND o.outbreak_code = m.outbreak_code
+               WHERE m.sample_id = ?
+               ORDER BY m.run_id""",
+            (sample_id,),
+        )
+
+    def outbreak_history(self, outbreak_code: str):
+        """Size of an outbreak code in every run it was reported in."""
+        return self.query(
+            """SELECT o.run_id, r.start_time, o.cluster_id, o.total_isolates, o.human_isolates,
+                      o.unassigned_isolates
+               FROM outbreaks o JOIN runs r ON r.run_id = o.run_id
+               WHERE o.outbreak_code = ?
+               ORDER BY o.run_id""",
+            (outbreak_code,),
+        )
+
+    def cluster_history(self, cluster_id: str):
+        """Growth of a denovo cluster: outbreaks and isolates per run."""
+        return self.query(
+            """SELECT o.run_id, r.start_time, COUNT(*) AS num_outbreaks,
+                      SUM(o.total_isolates) AS total_isolates,
+                      SUM(o.human_isolates) AS human_isolates
+               FROM outbreaks o JOIN runs r ON r.run_id = o.run_id
+               WHERE o.cluster_id = ?
+               GROUP BY o.run_id, r.start_time
+               ORDER BY o.run_id""",
+            (cluster_id,),
+        )
+
@@ -0,0 +1,174 @@
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Union
+
+
+class OutbreakRegistry:
+    """
+    SQLite-backed registry of outbreak codes, sample memberships and code history.
+
+    Codes minted in earlier runs are reused when a newly detected outbreak
+    overlaps an outbreak of the same denovo cluster; only genuinely new
+    events receive a new tracker.
+
+    Usage
+    -----
+    registry = OutbreakRegistry("registry.sqlite")
+    outbreaks = registry.assign(outbreaks, run_id="20250101120000")
+    registry.close()
+    """
+
+    schema = [
+        """CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS outbreaks (
+            code TEXT PRIMARY KEY,
+            cluster_id TEXT NOT NULL,
+            year INTEGER,
+            first_run TEXT,
+            last_run TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS memberships (
+            sample_id TEXT NOT NULL,
+            code TEXT NOT NULL,
+            first_run TEXT,
+            PRIMARY KEY (sample_id, code)
+        ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS code_history (
+            run_id TEXT NOT NULL,
+            code TEXT NOT NULL,
+            event TEXT NOT NULL,
+            total_isolates INTEGER
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_memberships_code ON memberships (code)",
+        "CREATE INDEX IF NOT EXISTS idx_outbreaks_cluster ON outbreaks (cluster_id)",
+        "CREATE INDEX IF NOT EXISTS idx_history_code ON code_history (code)",
+    ]
+
+    def __init__(self, db_path: Union[str, Path]) -> None:
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.conn:
+            for stmt in self.schema:
+                self.conn.execute(stmt)
+            self.conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('next_tracker', '1')")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def next_tracker(self) -> int:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'next_tracker'").fetchone()
+        return int(row[0])
+
+    def lookup_overlaps(self, memberships: Dict[str, list]) -> Dict[str, Dict[str, int]]:
+        """
+        Count, for every provisional outbreak, how many of its samples already
+        belong to each registered outbreak of the same denovo cluster.
+        """
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS run_members "
+                          "(provisional_code TEXT, cluster_id TEXT, sample_id TEXT)")
+        self.conn.execute("DELETE FROM run_members")
+        self.conn.executemany(
+            "INSERT INTO run_members (provisional_code, cluster_id, sample_id) VALUES (?, ?, ?)",
+            ((window, cluster_id, s)
+             for window, (cluster_id, samples) in memberships.items() for s in samples),
+        )
+        rows = self.conn.execute(
+            """SELECT r.provisional_code, m.code, COUNT(*)
+               FROM run_members r
+               JOIN memberships m ON m.sample_id = r.sample_id
+               JOIN outbreaks o ON o.code = m.code AND o.cluster_id = r.cluster_id
+               GROUP BY r.provisional_code, m.code"""
+        ).fetchall()
+        overlaps: Dict[str, Dict[str, int]] = {}
+        for window, code, count in rows:
+            overlaps.setdefault(window, {})[code] = count
+        return overlaps
+
+    def assign(
+        self, outbreaks: Dict[str, Dict[str, Any]], run_id: str
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Replace the provisional codes of `outbreaks` with registry codes and record
+        the run, all in one transaction. Assigning a run_id again replaces its
+        code history, and codes it minted before stay ``new``.
+
+        Parameters
+        ----------
+        outbreaks : dict
+            Provisional outbreak code -> record as produced by ``Detector.process``.
+        run_id : str
+            Identifier of the current run.
+
+        Returns
+        -------
+        dict
+            Registry outbreak code -> record, with ``code_status`` set to
+            ``continued`` or ``new``.
+        """
+        memberships = {
+            code: (record['cluster_id'], [s for s in record['sample_ids'].split(',') if s])
+            for code, record in outbreaks.items()
+        }
+        with self.conn:
+            # a repeated or resumed run replaces its own history
+            self.conn.execute("DELETE FROM code_history WHERE run_id = ?", (run_id,))
+            minted = {row[0] for row in self.conn.execute(
+                "SELECT code FROM outbreaks WHERE first_run = ?", (run_id,))}
+            overlaps = self.lookup_overlaps(memberships)
+
+            # best overlap wins an existing code; each code is claimed at most once per run
+            candidates = sorted(
+                ((count, window, code)
+                 for window, codes in overlaps.items() for code, count in codes.items()),
+                key=lambda x: (-x[0], x[1], x[2]),
+            )
+            claimed = {}
+            used = set()
+            for count, window, code in candidates:
+                if window in claimed or code in used:
+                    continue
+                claimed[window] = code
+                used.add(code)
+
+            tracker = self.next_tracker()
+            assigned = {}
+            for window, record in outbreaks.items():
+                record = dict(record)
+                if window in claimed:
+                    code = claimed[window]
+                    record['code_status'] = 'new' if code in minted else 'continued'
+                else:
+                    year_code = f"{record['year']}"[-2:]
+                    code = f"{year_code}_{record['cluster_id']}_{tracker}"
+                    tracker += 1
+                    record['code_status'] = 'new'
+                assigned[code] = record
+
+            self.conn.execute("UPDATE meta SET value = ? WHERE key = 'next_tracker'",
+                              (str(tracker),))
+            self.conn.executemany(
+                """INSERT INTO outbreaks (code, cluster_id, year, first_run, last_run)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(code) DO UPDATE SET last_run = excluded.last_run""",
+                ((code, r['cluster_id'], int(r['year']), run_id, run_id)
+                 for code, r in assigned.items()),
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO memberships (sample_id, code, first_run) VALUES (?, ?, ?)",
+                ((s, code, run_id)
+                 for code, r in assigned.items() for s in r['sample_ids'].split(',') if s),
+            )
+            self.conn.executemany(
+                "INSERT INTO code_history (run_id, code, event, total_isolates) "
+                "VALUES (?, ?, ?, ?)",
+                ((run_id, code, r['code_status'], int(r['total_isolates']))
+                 for code, r in assigned.items()),
+            )
+        return assigned
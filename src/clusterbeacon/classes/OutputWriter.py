@@ -0,0 +1,130 @@
+import os
+import queue
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+
+class StreamWriter:
+    """
+    Background thread writing queued rows to a TSV under a temporary name,
+    moved into place by ``close()``.
+    """
+
+    _DONE = object()
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        header: Optional[List[str]] = None,
+        max_queue: int = 1024,
+        batch_size: int = 512,
+    ) -> None:
+        self.path = Path(path)
+        self.tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        self.batch_size = batch_size
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.error: Optional[BaseException] = None
+        self.rows_written = 0
+        self.fh = open(self.tmp_path, "w", encoding="utf-8", buffering=1 << 20)
+        if header is not None:
+            self.fh.write("\t".join(header) + "\n")
+        self.thread = threading.Thread(target=self._run, name=f"writer-{self.path.name}",
+                                       daemon=True)
+        self.thread.start()
+
+    def put(self, rows: Iterable[Iterable[Any]]) -> None:
+        """Queue rows for writing; blocks when the writer falls behind."""
+        if self.error is not None:
+            raise self.error
+        self.queue.put(list(rows))
+
+    def _run(self) -> None:
+        # after a failure the queue is still drained, so producers never block on it;
+        # the error is raised to them by put() and close()
+        done = False
+        while not done:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            done = any(rows is self._DONE for rows in batch)
+            if self.error is not None:
+                continue
+            try:
+                lines = ["\t".join(self.format(v) for v in row) + "\n"
+                         for rows in batch if rows is not self._DONE for row in rows]
+                if len(lines) > 0:
+                    self.fh.write("".join(lines))
+                    self.rows_written += len(lines)
+            except Exception as e:
+                self.error = e
+
+    @staticmethod
+    def format(value: Any) -> str:
+        if value is None:
+            return ''
+        return str(value)
+
+    def close(self) -> None:
+        """Drain the queue, then atomically move the file into place."""
+        self.queue.put(self._DONE)
+        self.thread.join()
+        try:
+            self.fh.close()
+        except Exception as e:
+            self.error = self.error or e
+        if self.error is not None:
+            os.remove(self.tmp_path)
+            raise self.error
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self) -> None:
+        self.queue.put(self._DONE)
+        self.thread.join()
+        self.fh.close()
+        if self.tmp_path.exists():
+            os.remove(self.tmp_path)
+
+
+class OutputWriter:
+    """
+    Streams outbreak summaries, memberships and duplicate groups to their TSVs
+    while detection is still running.
+    """
+
+    def __init__(self, outdir: Union[str, Path], outbreak_columns: List[str],
+                 max_queue: int = 1024) -> None:
+        outdir = Path(outdir)
+        self.outbreak_columns = outbreak_columns
+        self.outbreaks = StreamWriter(outdir / "outbreak_summary.tsv",
+                                      ['outbreak_code'] + outbreak_columns, max_queue)
+        self.memberships = StreamWriter(outdir / "memberships.tsv",
+                                        ['outbreak_code', 'sample_id'], max_queue)
+        self.duplicates = StreamWriter(outdir / "duplicates.tsv", None, max_queue)
+
+    def write_outbreak(self, outbreak_code: str, record: Dict[str, Any]) -> None:
+        self.outbreaks.put([[outbreak_code] + [record.get(col) for col in self.outbreak_columns]])
+        self.memberships.put([outbreak_code, s] for s in record['sample_ids'].split(',') if s)
+
+    def write_duplicates(self, candidates: Dict[str, List[list]]) -> None:
+        if len(candidates) == 0:
+            return
+        self.duplicates.put([md5] + list(record)
+                            for md5, records in candidates.items() for record in records)
+
+    def close(self) -> None:
+        errors = []
+        for writer in (self.outbreaks, self.memberships, self.duplicates):
+            try:
+                writer.close()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+
+    def abort(self) -> None:
+        for writer in (self.outbreaks, self.memberships, self.duplicates):
+            writer.abort()
@@ -0,0 +1,244 @@
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Iterator, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial.distance import squareform
+
+from src.clusterbeacon.constants import missing_allele_values
+from src.clusterbeacon.utils import file_valid
+
+
+class ProfileStore:
+    """
+    Memory-mapped store of cgMLST allele profiles indexed by sample, recoded per
+    locus to small integers with 0 meaning missing.
+    """
+
+    matrix_file = "profiles.npy"
+    samples_file = "samples.txt"
+    meta_file = "meta.json"
+    # locus comparisons per distance block (rows x profiles x loci)
+    block_elements = 2**24
+
+    def __init__(self, store_dir: Union[str, Path]) -> None:
+        self.store_dir = Path(store_dir)
+        self.profiles = np.load(self.store_dir / self.matrix_file, mmap_mode="r")
+        with open(self.store_dir / self.samples_file) as fh:
+            self.sample_ids = [line.rstrip("\n") for line in fh]
+        self.sample_index = {s: i for i, s in enumerate(self.sample_ids)}
+        self.num_loci = self.profiles.shape[1]
+
+    @classmethod
+    def open_or_build(cls, profile_path: Union[str, Path, None],
+                      store_dir: Union[str, Path]) -> "ProfileStore":
+        """
+        Open the store in `store_dir`, (re)building it from `profile_path` if it is
+        missing or older than the profile file.
+        """
+        store_dir = Path(store_dir)
+        meta_path = store_dir / cls.meta_file
+        if meta_path.exists():
+            with open(meta_path) as fh:
+                meta = json.load(fh)
+            signature = meta.get("source_signature")
+            if profile_path is None or signature == cls.file_signature(profile_path):
+                return cls(store_dir)
+        if profile_path is None:
+            raise ValueError(f"allele profile store {store_dir} does not exist "
+                             "and no allele profile file was given to build it")
+        cls.build(profile_path, store_dir)
+        return cls(store_dir)
+
+    @staticmethod
+    def file_signature(path: Union[str, Path]) -> List[int]:
+        st = os.stat(path)
+        return [st.st_size, int(st.st_mtime)]
+
+    @classmethod
+    def build(cls, profile_path: Union[str, Path], store_dir: Union[str, Path]) -> None:
+        """
+        Read a profile_dists style TSV (sample id followed by one column per locus)
+        once and write it as a compact integer matrix.
+        """
+        if not file_valid(profile_path):
+            raise FileNotFoundError(
+                f"allele profile file {profile_path} does not exist or is empty")
+        store_dir = Path(store_dir)
+        store_dir.mkdir(parents=True, exist_ok=True)
+        df = pd.read_csv(profile_path, sep="\t", header=0, dtype=str, keep_default_na=False)
+        sample_ids = df.iloc[:, 0].tolist()
+        loci = df.columns[1:]
+
+        codes = np.zeros((len(df), len(loci)), dtype=np.uint32)
+        missing = set(missing_allele_values)
+        for j, locus in enumerate(loci):
+            col = df[locus].str.strip()
+            col = col.where(~col.isin(missing), None)
+            codes[:, j] = pd.factorize(col, use_na_sentinel=True)[0] + 1
+        max_code = int(codes.max()) if codes.size else 0
+        dtype = np.uint8 if max_code < 2**8 else np.uint16 if max_code < 2**16 else np.uint32
+
+        matrix = np.lib.format.open_memmap(store_dir / cls.matrix_file, mode="w+", dtype=dtype,
+                                           shape=codes.shape)
+        matrix[:] = codes
+        matrix.flush()
+        del matrix
+        with open(store_dir / cls.samples_file, "w") as fh:
+            fh.write("".join(f"{s}\n" for s in sample_ids))
+        with open(store_dir / cls.meta_file, "w") as fh:
+            json.dump({
+                "source": str(profile_path),
+                "source_signature": cls.file_signature(profile_path),
+                "num_samples": len(sample_ids),
+                "num_loci": len(loci),
+                "dtype": np.dtype(dtype).name,
+            }, fh, indent=4)
+
+    def lookup_rows(self, sample_ids: Iterable[str]) -> np.ndarray:
+        """Store row of each sample id, -1 for samples without a profile."""
+        return np.array([self.sample_index.get(s, -1) for s in sample_ids], dtype=np.int64)
+
+    def get_profiles(self, sample_ids: Iterable[str]) -> np.ndarray:
+        return self.get_profiles_by_row(self.lookup_rows(sample_ids))
+
+    def get_profiles_by_row(self, rows: np.ndarray) -> np.ndarray:
+        """
+        Gather profiles by store row; rows of -1 (samples absent from the store)
+        get an all-missing profile, which is at distance 0 from every other profile.
+        """
+        out = np.zeros((len(rows), self.num_loci), dtype=self.profiles.dtype)
+        present = rows >= 0
+        if present.any():
+            order = np.argsort(rows[present])
+            present_rows = rows[present][order]
+            dest = np.flatnonzero(present)[order]
+            out[dest] = self.profiles[present_rows]
+        return out
+
+    @staticmethod
+    def hamming(x: np.ndarray, y: np.ndarray, count_missing: bool = False,
+                block_size: int = 64) -> np.ndarray:
+        """
+        Blocked pairwise Hamming distances between profile matrices `x` and `y`.
+
+        Loci missing (0) in either profile are skipped unless `count_missing`
+        is set, matching profile_dists.
+        """
+        dists = np.zeros((len(x), len(y)), dtype=np.int64)
+        if len(y) == 0:
+            return dists
+        y_present = y != 0
+        for start in range(0, len(x), block_size):
+            xb = x[start:start + block_size]
+            diff = xb[:, None, :] != y[None, :, :]
+            if not count_missing:
+                diff &= (xb != 0)[:, None, :]
+                diff &= y_present[None, :, :]
+            dists[start:start + len(xb)] = diff.sum(axis=2)
+        return dists
+
+    def distance_matrix(self, sample_ids: Iterable[str], count_missing: bool = False) -> np.ndarray:
+        rows = self.lookup_rows(sample_ids)
+        return self.distance_matrix_by_row(rows, count_missing=count_missing)
+
+    def distance_matrix_by_row(self, rows: np.ndarray, count_missing: bool = False) -> np.ndarray:
+        profiles = self.get_profiles_by_row(rows)
+        return self.hamming(profiles, profiles, count_missing=count_missing,
+                            block_size=self.block_rows(len(profiles)))
+
+    def block_rows(self, num_columns: int) -> int:
+        """Rows per distance block, so a block's locus comparisons stay around 16M elements."""
+        return max(1, int(self.block_elements // max(1, num_columns * self.num_loci)))
+
+    def distance_blocks(self, profiles: np.ndarray,
+                        count_missing: bool = False) -> Iterator[Tuple[int, np.ndarray]]:
+        """(first row, distances from those rows to every profile) for consecutive row blocks."""
+        block_size = self.block_rows(len(profiles))
+        for start in range(0, len(profiles), block_size):
+            block = profiles[start:start + block_size]
+            yield start, self.hamming(block, profiles, count_missing=count_missing,
+                                      block_size=len(block))
+
+    def max_distance_of_profiles(self, profiles: np.ndarray, count_missing: bool = False) -> int:
+        """Maximum pairwise distance, one row block at a time."""
+        blocks = self.distance_blocks(profiles, count_missing)
+        return max((int(d.max()) for _, d in blocks if d.size), default=0)
+
+    def max_distance(self, sample_ids: Iterable[str], count_missing: bool = False) -> int:
+        profiles = self.get_profiles(sample_ids)
+        return self.max_distance_of_profiles(profiles, count_missing=count_missing)
+
+    def threshold_components(self, profiles: np.ndarray, threshold: int,
+                             count_missing: bool = False) -> Tuple[np.ndarray, int]:
+        """
+        Connected components of profiles linked at most `threshold` apart, built one
+        row block at a time, and the maximum pairwise distance.
+        """
+        labels = np.arange(len(profiles))
+        max_dist = 0
+        for start, dists in self.distance_blocks(profiles, count_missing):
+            if dists.size:
+                max_dist = max(max_dist, int(dists.max()))
+            i, j = np.nonzero(dists <= threshold)
+            if len(i) == 0:
+                continue
+            # merge the components joined by this block's edges on the (small) graph of their labels
+            pairs = np.unique(np.stack([labels[i + start], labels[j]], axis=1), axis=0)
+            names, codes = np.unique(pairs, return_inverse=True)
+            codes = codes.reshape(pairs.shape)
+            graph = coo_matrix((np.ones(len(codes), dtype=np.int8), (codes[:, 0], codes[:, 1])),
+                               shape=(len(names), len(names)))
+            _, merged = connected_components(graph, directed=False)
+            # relabel each merged component by its smallest member label
+            smallest = np.full(len(names), len(profiles), dtype=np.int64)
+            np.minimum.at(smallest, merged, names)
+            mapping = np.arange(len(profiles))
+            mapping[names] = smallest[merged]
+            labels = mapping[labels]
+        return labels, max_dist
+
+    def split_by_threshold(self, sample_ids: List[str], threshold: int,
+                           count_missing: bool = False):
+        rows = self.lookup_rows(sample_ids)
+        return self.split_rows_by_threshold(rows, threshold, count_missing=count_missing)
+
+    def split_rows_by_threshold(self, rows: np.ndarray, threshold: int,
+                                count_missing: bool = False):
+        """
+        Split store rows into complete linkage groups of maximum pairwise distance at
+        most `threshold`, clustering only components that are not already tight.
+        Returns positions into `rows` per group and each group's maximum distance.
+        """
+        profiles = self.get_profiles_by_row(rows)
+        n = len(rows)
+        labels, max_dist = self.threshold_components(profiles, threshold, count_missing)
+        if n < 2 or max_dist <= threshold:
+            return [np.arange(n)], [max_dist]
+        groups = []
+        max_dists = []
+        for label in pd.unique(labels):
+            members = np.flatnonzero(labels == label)
+            if len(members) == 1:
+                groups.append(members)
+                max_dists.append(0)
+                continue
+            dists = self.hamming(profiles[members], profiles[members], count_missing=count_missing,
+                                 block_size=self.block_rows(len(members)))
+            if dists.max() <= threshold:
+                groups.append(members)
+                max_dists.append(int(dists.max()))
+                continue
+            tree = linkage(squareform(dists, checks=False), method="complete")
+            sub_labels = fcluster(tree, t=threshold, criterion="distance")
+            for sub_label in pd.unique(sub_labels):
+                positions = np.flatnonzero(sub_labels == sub_label)
+                groups.append(members[positions])
+                max_dists.append(int(dists[np.ix_(positions, positions)].max()))
+        order = np.argsort([group[0] for group in groups], kind="stable")
+        return [groups[k] for k in order], [max_dists[k] for k in order]
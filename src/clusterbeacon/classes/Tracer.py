@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+import pandas as pd
+
+
+class _NullAttrs(dict):
+    """Attribute dict of a disabled span; it drops every value, so it can be shared."""
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        pass
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        return default
+
+
+class _NullSpan:
+    def __init__(self) -> None:
+        self.attrs: Dict[str, Any] = _NullAttrs()
+
+    def __enter__(self) -> Dict[str, Any]:
+        return self.attrs
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "attrs", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: Dict[str, Any]) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.start = 0
+
+    def __enter__(self) -> Dict[str, Any]:
+        self.start = time.perf_counter_ns()
+        return self.attrs
+
+    def __exit__(self, *exc) -> bool:
+        elapsed = time.perf_counter_ns() - self.start
+        self.tracer.events.append((self.name, self.start, elapsed, threading.get_ident(),
+                                   self.attrs))
+        return False
+
+
+class Tracer:
+    """
+    Opt-in span recorder for pipeline stages and per-cluster evaluation.
+
+    Spans yield their attribute dict so values only known at the end (e.g. the
+    number of windows) can be added inside the block. When disabled, ``span``
+    returns a shared no-op context manager.
+
+    Usage
+    -----
+    tracer = Tracer(enabled=True)
+    with tracer.span("cluster", cluster_id="Sal|1.2") as attrs:
+        attrs["windows"] = 3
+    tracer.write_chrome_trace("trace.json")
+    """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.origin = time.perf_counter_ns()
+        self.events: List[tuple] = []
+
+    def span(self, name: str, **attrs):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, attrs)
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        pid = os.getpid()
+        events = [
+            {
+                "name": name,
+                "cat": "clusterbeacon",
+                "ph": "X",
+                "ts": (start - self.origin) / 1000,
+                "dur": elapsed / 1000,
+                "pid": pid,
+                "tid": tid,
+                "args": {k: self.to_json(v) for k, v in attrs.items()},
+            }
+            for name, start, elapsed, tid, attrs in self.events
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    @staticmethod
+    def to_json(value):
+        if hasattr(value, "item"):
+            return value.item()
+        if isinstance(value, (str, int, float, bool)) or value is None:
+            return value
+        return str(value)
+
+    def write_chrome_trace(self, path: Union[str, Path]) -> None:
+        """Write spans in Chrome trace event format (chrome://tracing, Perfetto)."""
+        with open(path, "w") as fh:
+            json.dump(self.to_chrome_trace(), fh)
+
+    def slowest(self, name: str = "cluster", top_n: int = 20) -> pd.DataFrame:
+        """Table of the `top_n` slowest spans called `name`, slowest first."""
+        rows = [
+            dict(attrs, elapsed_ms=elapsed / 1e6)
+            for span_name, _, elapsed, _, attrs in self.events
+            if span_name == name
+        ]
+        if len(rows) == 0:
+            return pd.DataFrame(columns=["elapsed_ms"])
+        df = pd.DataFrame(rows).sort_values("elapsed_ms", ascending=False).head(top_n)
+        return df.reset_index(drop=True)
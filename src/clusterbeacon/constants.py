@@ -2,6 +2,7 @@ needed_cols_ll = ['sample_id','primary_type_name','secondary_type_name','date','
 needed_cols_config = ['outbreak_rules_path','line_list_path',"column_map","filters",'outdir',
                       "duplicate_max_pairwise_distance","duplicate_detection_columns","rule_key_columns",
                       'gas_denovo_delimiter','gas_denovo_thresholds','force']
+missing_allele_values = ['', '0', '-', '?', 'nan', 'NaN', 'NA', 'N/A']
 
 
 
@@ -0,0 +1,161 @@
+import os
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from src.clusterbeacon.arrow_io import table_to_frame
+from src.clusterbeacon.ingest import delimiter_of
+
+conflict_columns = ['sample_id', 'table', 'column', 'line_list_value', 'table_value']
+prefer_values = ('line_list', 'table')
+
+
+def key_strings(values: pd.Series) -> pd.Series:
+    """
+    Values as text for joining and comparing; integral floats (ids read next
+    to missing values) lose their '.0'.
+    """
+    if pd.api.types.is_float_dtype(values):
+        present = values.dropna()
+        if len(present) == 0 or (present == np.floor(present)).all():
+            values = values.astype('Int64')
+    return values.astype('string').astype(object).where(values.notna(), None)
+
+
+def missing_values(values: pd.Series) -> np.ndarray:
+    return (values.isna() | (values.astype(str).str.strip() == '')).to_numpy()
+
+
+def same_values(current: pd.Series, incoming: np.ndarray) -> np.ndarray:
+    """
+    Whether line list values and table values agree once both are normalized:
+    surrounding whitespace and case are ignored, and a numeric line list
+    column also matches table text of the same number ('1' and 1.0).
+    """
+    incoming_text = pd.Series(incoming, dtype='string').str.strip()
+    same = (key_strings(current).astype('string').str.strip().str.casefold().reset_index(drop=True)
+            == incoming_text.str.casefold()).fillna(False).to_numpy(dtype=bool)
+    if pd.api.types.is_numeric_dtype(current) and not pd.api.types.is_bool_dtype(current):
+        numbers = pd.to_numeric(incoming_text, errors='coerce').to_numpy(dtype=float)
+        same |= current.to_numpy(dtype=float) == numbers
+    return same
+
+
+def parse_table_spec(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalized auxiliary table spec from the ``metadata_tables`` config section.
+
+    ``columns`` is a list of column names, or a dict of table column ->
+    line list column; ``table_key`` defaults to ``key``; ``prefer`` decides
+    conflicting values ('line_list' keeps the line list value and only fills
+    missing ones, 'table' overwrites).
+    """
+    if not spec.get('path') or not spec.get('key'):
+        raise ValueError(f"metadata table {spec} needs path and key")
+    columns = spec.get('columns', [])
+    if not isinstance(columns, dict):
+        columns = {c: c for c in columns}
+    prefer = spec.get('prefer', 'line_list')
+    if prefer not in prefer_values:
+        raise ValueError(f"metadata table {spec['path']} has unknown prefer value {prefer}")
+    table_key = spec.get('table_key', spec['key'])
+    name = spec.get('name', os.path.basename(str(spec['path'])))
+    return {'name': name, 'path': str(spec['path']), 'key': spec['key'], 'table_key': table_key,
+            'columns': dict(columns), 'prefer': prefer}
+
+
+def read_metadata_table(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Read only the key and projected columns of an auxiliary table, as text,
+    and index it by key (surrounding whitespace removed). Repeated keys keep
+    their first row.
+    """
+    path = spec['path']
+    delimiter = delimiter_of(path)
+    include = list(dict.fromkeys([spec['table_key']] + list(spec['columns'])))
+    table = pacsv.read_csv(
+        path,
+        parse_options=pacsv.ParseOptions(delimiter=delimiter),
+        convert_options=pacsv.ConvertOptions(include_columns=include,
+                                             column_types={c: pa.string() for c in include},
+                                             strings_can_be_null=True),
+    )
+    frame = table_to_frame(table)
+    keys = frame[spec['table_key']].str.strip()
+    present = keys.notna().to_numpy()
+    first = present & ~keys.duplicated(keep='first').to_numpy()
+    duplicate_keys = int((present & ~first).sum())
+    frame = frame[first].reset_index(drop=True)
+    return dict(spec, index=pd.Index(keys[first].to_numpy()), frame=frame,
+                table_rows=int(len(table)), duplicate_keys=duplicate_keys)
+
+
+def enrich_frame(
+    df: pd.DataFrame,
+    tables: List[Dict[str, Any]],
+) -> Tuple[pd.DataFrame, Dict[str, Dict[str, Any]], pd.DataFrame]:
+    """
+    Hash-join every auxiliary table onto `df` by key lookup.
+
+    Each table's keys are held in a hash index, and line list keys are looked
+    up in one vectorized ``get_indexer`` call, so a row never matches more
+    than once and the row count is preserved. Columns missing from `df` are
+    added; existing columns are filled where empty, and values that
+    disagree with the table (after ``same_values`` normalization) are
+    counted as conflicts and resolved by the table's ``prefer`` setting.
+
+    Returns
+    -------
+    (pd.DataFrame, dict, pd.DataFrame)
+        The enriched frame, coverage counts per table and one row per
+        conflicting value (``conflict_columns``).
+    """
+    report = {}
+    conflicts = []
+    sample_ids = df['sample_id'].to_numpy() if 'sample_id' in df.columns else np.full(len(df), '')
+    for table in tables:
+        name = table['name']
+        if table['key'] not in df.columns:
+            raise ValueError(
+                f"metadata table {name} joins on {table['key']}, which the line list does not have")
+        position = table['index'].get_indexer(key_strings(df[table['key']]).str.strip())
+        matched = position >= 0
+        counts = {'rows': int(len(df)), 'matched': int(matched.sum()),
+                  'unmatched': int((~matched).sum()), 'columns': {}}
+        rows = np.flatnonzero(matched)
+        for table_col, col in table['columns'].items():
+            incoming = np.full(len(df), None, dtype=object)
+            incoming[rows] = table['frame'][table_col].to_numpy(dtype=object)[position[rows]]
+            has_value = ~missing_values(pd.Series(incoming, dtype=object))
+            if col not in df.columns:
+                df[col] = incoming
+                counts['columns'][col] = {'filled': int(has_value.sum()), 'conflicts': 0}
+                continue
+            current = df[col]
+            empty = missing_values(current)
+            fill = has_value & empty
+            differs = has_value & ~empty
+            differs[differs] = ~same_values(current[differs], incoming[differs])
+            if differs.any():
+                conflicts.append(pd.DataFrame({
+                    'sample_id': sample_ids[differs],
+                    'table': name,
+                    'column': col,
+                    'line_list_value': current.to_numpy()[differs],
+                    'table_value': incoming[differs],
+                }))
+            replace = fill | differs if table['prefer'] == 'table' else fill
+            if replace.any():
+                values = current.astype(object).to_numpy(copy=True)
+                values[replace] = incoming[replace]
+                df[col] = values
+            counts['columns'][col] = {'filled': int(fill.sum()), 'conflicts': int(differs.sum())}
+        report[name] = counts
+    if conflicts:
+        conflicts = pd.concat(conflicts, ignore_index=True)
+    else:
+        conflicts = pd.DataFrame(columns=conflict_columns)
+    return df, report, conflicts
@@ -0,0 +1,280 @@
+import importlib
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from queue import Empty
+from typing import Any, Callable, Dict, List, Union
+
+import numpy as np
+import pandas as pd
+
+
+def generate_inputs(
+    outdir: Union[str, Path], num_samples: int = 2000, seed: int = 1,
+    legacy_compatible: bool = False,
+) -> Dict[str, Any]:
+    """
+    Write a synthetic line list, rule table and config to `outdir` and return the
+    config. With `legacy_compatible`, no ``LEGACY_KNOWN_DIFFERENCES`` apply.
+    """
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    taxa = np.array(['Salmonella enterica', 'Listeria monocytogenes', 'Escherichia coli'])
+    taxon = taxa[rng.integers(0, 3, num_samples)]
+    levels = [rng.integers(1, high, num_samples) for high in (4, 6, 30, 60, 200)]
+    prefix = pd.Series(taxon).str.split(' ').str[0].str[:3]
+    address = prefix + '|' + pd.Series(['.'.join(map(str, v)) for v in zip(*levels)])
+    dates = pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 900, num_samples),
+                                                         unit='D')
+    has_code = rng.random(num_samples) < 0.1
+    codes = pd.Series(rng.integers(0, 5, num_samples)).map('OB{}'.format)
+    existing = np.where(has_code, codes, None)
+    df = pd.DataFrame({
+        'sample_id': [f'S{i:07d}' for i in range(num_samples)],
+        'taxon_name': taxon,
+        'genomic_address_name': [f'{a}.{b}' for a, b in zip(levels[0], levels[1])],
+        'collection_date': dates.strftime('%Y-%m-%d'),
+        'gas_denovo_cluster_address': address,
+        'source_type': rng.choice(['Human', 'food', 'Environment', 'patient stool'], num_samples),
+        'outbreak_cluster_code_name': existing,
+        'country': 'Canada',
+        'state_province': rng.choice(['ON', 'QC', 'BC'], num_samples),
+        'sex': rng.choice(['M', 'F'], num_samples),
+        'age': rng.integers(0, 90, num_samples),
+    })
+    df.to_csv(outdir / 'line_list.tsv', sep='\t', index=False)
+    rules = pd.DataFrame([
+        dict(genus='Salmonella', species='enterica', subspecies='', min_total_isolates=3,
+             min_human_isolates=1, max_date_delta=30, max_pairwise_threshold=10),
+        dict(genus='Listeria', species='', subspecies='', min_total_isolates=2,
+             min_human_isolates=1, max_date_delta=60, max_pairwise_threshold=5),
+        dict(genus='Escherichia', species='coli', subspecies='', min_total_isolates=3,
+             min_human_isolates=2, max_date_delta=20, max_pairwise_threshold=20),
+    ])
+    if legacy_compatible:
+        rules['max_pairwise_threshold'] = 10
+        rules['max_date_delta'] = 900
+    rules.to_csv(outdir / 'rules.tsv', sep='\t', index=False)
+    config = {
+        'outbreak_rules_path': str(outdir / 'rules.tsv'),
+        'line_list_path': str(outdir / 'line_list.tsv'),
+        'column_map': {'collection_date': 'date'},
+        'filters': {},
+        'outdir': str(outdir / 'results'),
+        'duplicate_max_pairwise_distance': 0,
+        'duplicate_detection_columns': ['country', 'state_province', 'sex', 'age'],
+        'rule_key_columns': ['genus', 'species', 'subspecies'],
+        'gas_denovo_delimiter': '.',
+        'gas_denovo_thresholds': [50, 20, 10, 5, 0],
+        'force': True,
+    }
+    with open(outdir / 'config.json', 'w') as fh:
+        json.dump(config, fh, indent=4)
+    return config
+
+
+# ----------------------------
+# Engines
+# ----------------------------
+# Each engine runs detection for a config and returns plain results:
+# outbreaks as (cluster_id, [sample ids]) and duplicates as {group hash: [sample ids]}.
+
+# bugs of the legacy detector fixed in every clusterbeacon engine; results differ from legacy
+# wherever one of them applies
+LEGACY_KNOWN_DIFFERENCES = [
+    "the rule threshold of the first row sets the denovo cluster level of every row",
+    "the sample at a date gap belongs to the windows on both sides and counts twice towards "
+    "the isolate minimums",
+    "the rule key of a cluster comes from its least common genus/species/subspecies",
+    "duplicate groups of a later window replace those of an earlier one",
+]
+
+
+def _load_legacy_detector():
+    # the legacy package still imports itself under its pre-rename name
+    legacy = importlib.import_module('src.outbreakbeacon')
+    sys.modules.setdefault('outbreak_detector', legacy)
+    for name in ('constants', 'utils'):
+        sys.modules.setdefault(f'outbreak_detector.{name}',
+                               importlib.import_module(f'src.outbreakbeacon.{name}'))
+    return importlib.import_module('src.outbreakbeacon.classes.detector').detector
+
+
+def _results(outbreak_records, duplicate_candidates) -> Dict[str, Any]:
+    return {
+        'outbreaks': [(str(r['cluster_id']), [s for s in str(r['sample_ids']).split(',') if s])
+                      for r in outbreak_records],
+        'duplicates': {md5: [str(record[-1]) for record in records]
+                       for md5, records in duplicate_candidates.items()},
+    }
+
+
+def run_legacy(config: Dict[str, Any]) -> Dict[str, Any]:
+    detector = _load_legacy_detector()
+    config = dict(config)
+    for key in ('line_list_path', 'outbreak_rules_path'):
+        config[key] = os.path.abspath(config[key])
+    # run in a scratch directory: the legacy detector dumps temp.tsv into its working directory
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            obj = detector(config=config)
+        finally:
+            os.chdir(cwd)
+    if not obj.status:
+        raise RuntimeError(f'legacy detector failed: {obj.messages}')
+    records = obj.outbreak_df.to_dict('records') if obj.outbreak_df is not None else []
+    return _results(records, obj.duplicate_candidates)
+
+
+def _run_detector(config: Dict[str, Any]) -> Dict[str, Any]:
+    from src.clusterbeacon.classes.Detector import Detector
+    obj = Detector(config=config)
+    if not obj.status:
+        raise RuntimeError(f'detector failed: {obj.messages}')
+    return _results(obj.outbreak_clusters.values(), obj.duplicate_candidates)
+
+
+def run_detector(config: Dict[str, Any]) -> Dict[str, Any]:
+    return _run_detector(config)
+
+
+def run_streamed(config: Dict[str, Any]) -> Dict[str, Any]:
+    # every cluster takes the giant-cluster path that materializes one window at a time
+    return _run_detector(dict(config, giant_cluster_size=0))
+
+
+def run_out_of_core(config: Dict[str, Any]) -> Dict[str, Any]:
+    partitions = config.get('out_of_core_partitions', 4)
+    return _run_detector(dict(config, out_of_core_partitions=partitions))
+
+
+def run_api(config: Dict[str, Any]) -> Dict[str, Any]:
+    from src.clusterbeacon.api import detect
+    line_list = pd.read_csv(config['line_list_path'], sep='\t', header=0)
+    rules = pd.read_csv(config['outbreak_rules_path'], sep='\t', header=0)
+    settings = {k: v for k, v in config.items()
+                if k not in ('line_list_path', 'outbreak_rules_path')}
+    result = detect(line_list, rules, settings)
+    if not result.status:
+        raise RuntimeError(f'api detection failed: {result.messages}')
+    duplicates = {md5: group['sample_id'].astype(str).tolist()
+                  for md5, group in result.duplicates.groupby('group_hash', sort=False)}
+    outbreaks = zip(result.outbreaks['cluster_id'], result.outbreaks['sample_ids'])
+    return {
+        'outbreaks': [(str(c), [s for s in str(ids).split(',') if s]) for c, ids in outbreaks],
+        'duplicates': duplicates,
+    }
+
+
+ENGINES: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    'legacy': run_legacy,
+    'detector': run_detector,
+    'streamed': run_streamed,
+    'out_of_core': run_out_of_core,
+    'api': run_api,
+}
+
+
+def _timed(engine: str, config: Dict[str, Any], queue) -> None:
+    try:
+        start = time.perf_counter()
+        results = ENGINES[engine](config)
+        seconds = time.perf_counter() - start
+        # ru_maxrss is in KiB on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        queue.put({'results': results, 'seconds': seconds, 'peak_rss_bytes': peak, 'error': None})
+    except Exception as e:
+        queue.put({'results': None, 'seconds': None, 'peak_rss_bytes': None,
+                   'error': f'{type(e).__name__}: {e}'})
+
+
+def run_engine(engine: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one engine in a fresh process so its time and peak memory are its own."""
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_timed, args=(engine, config, queue))
+    proc.start()
+    # a process killed before it reports (e.g. out of memory) must not block the comparison
+    while True:
+        try:
+            run = queue.get(timeout=1)
+            break
+        except Empty:
+            if not proc.is_alive():
+                try:
+                    run = queue.get(timeout=1)
+                except Empty:
+                    run = {'results': None, 'seconds': None, 'peak_rss_bytes': None,
+                           'error': f'engine process exited with code {proc.exitcode}'}
+                break
+    proc.join()
+    return run
+
+
+# ----------------------------
+# Comparison
+# ----------------------------
+def normalize(results: Dict[str, Any]) -> Dict[str, set]:
+    """
+    Order-insensitive view of engine results: outbreak codes, tracker order
+    and row order are dropped, repeated sample ids collapse.
+    """
+    outbreaks = {(cluster_id, frozenset(samples)) for cluster_id, samples in results['outbreaks']}
+    memberships = {(sample, cluster_id) for cluster_id, samples in outbreaks for sample in samples}
+    duplicates = {frozenset(samples) for samples in results['duplicates'].values()}
+    return {'outbreaks': outbreaks, 'memberships': memberships, 'duplicates': duplicates}
+
+
+def diff(baseline: Dict[str, set], other: Dict[str, set]) -> Dict[str, Dict[str, int]]:
+    return {
+        table: {
+            'baseline': len(baseline[table]),
+            'engine': len(other[table]),
+            'missing': len(baseline[table] - other[table]),
+            'extra': len(other[table] - baseline[table]),
+        }
+        for table in ('outbreaks', 'memberships', 'duplicates')
+    }
+
+
+def compare_engines(config: Dict[str, Any], engines: List[str], baseline: str = 'legacy',
+                    repeat: int = 1) -> pd.DataFrame:
+    """
+    Run `baseline` and each of `engines` on the same input and diff their
+    outbreaks, memberships and duplicate groups, one row per engine. Speedup and
+    memory ratio are baseline / engine.
+    """
+    unknown = [e for e in [baseline] + engines if e not in ENGINES]
+    if unknown:
+        raise ValueError(f"unknown engine(s): {','.join(unknown)}")
+    runs = {}
+    for engine in dict.fromkeys([baseline] + engines):
+        attempts = [run_engine(engine, config) for _ in range(max(1, repeat))]
+        ok = [a for a in attempts if a['error'] is None]
+        runs[engine] = min(ok, key=lambda a: a['seconds']) if ok else attempts[0]
+
+    base = runs[baseline]
+    base_sets = normalize(base['results']) if base['error'] is None else None
+    rows = []
+    for engine, run in runs.items():
+        row = {'engine': engine, 'error': run['error'], 'seconds': run['seconds'],
+               'peak_rss_mb': run['peak_rss_bytes'] / 2**20 if run['peak_rss_bytes'] else None}
+        if run['error'] is None and base['error'] is None:
+            row['speedup'] = base['seconds'] / run['seconds'] if run['seconds'] else None
+            row['memory_ratio'] = base['peak_rss_bytes'] / run['peak_rss_bytes']
+            differences = diff(base_sets, normalize(run['results']))
+            for table, counts in differences.items():
+                for key, value in counts.items():
+                    row[f'{table}_{key}'] = value
+            row['identical'] = all(c['missing'] == 0 and c['extra'] == 0
+                                   for c in differences.values())
+        rows.append(row)
+    return pd.DataFrame(rows)
@@ -0,0 +1,116 @@
+import glob
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from src.clusterbeacon.utils import file_valid
+
+# the extensions pyarrow decompresses transparently
+compressed_suffixes = ('.gz', '.zst', '.bz2', '.lz4')
+line_list_suffixes = ('.tsv', '.txt', '.csv')
+
+
+def expand_line_list_paths(path: Union[str, Path]) -> List[str]:
+    """
+    Files making up a line list given as a single file, a directory of
+    partitions or a glob pattern, in sorted order.
+
+    Directories contribute every ``.tsv``/``.txt``/``.csv`` file (optionally
+    compressed) directly inside them. Empty files are skipped.
+    """
+    path = str(path)
+    if os.path.isdir(path):
+        candidates = [os.path.join(path, f) for f in os.listdir(path) if is_line_list_file(f)]
+    elif glob.has_magic(path):
+        candidates = glob.glob(path)
+    else:
+        candidates = [path]
+    return sorted(p for p in candidates if os.path.isfile(p) and file_valid(p))
+
+
+def is_line_list_file(name: str) -> bool:
+    name = name.lower()
+    for suffix in compressed_suffixes:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    return name.endswith(line_list_suffixes)
+
+
+def is_partitioned(path: Union[str, Path], paths: List[str]) -> bool:
+    """True unless `path` names one uncompressed file."""
+    if len(paths) != 1 or paths[0] != str(path):
+        return True
+    return str(path).lower().endswith(compressed_suffixes)
+
+
+def delimiter_of(path: Union[str, Path]) -> str:
+    """Comma for ``.csv`` files (optionally compressed), tab for everything else."""
+    name = str(path).lower()
+    for suffix in compressed_suffixes:
+        name = name.removesuffix(suffix)
+    return ',' if name.endswith('.csv') else '\t'
+
+
+def read_partition(path: str, column_map: Dict[str, str]) -> pa.Table:
+    # compression is detected from the file extension
+    table = pacsv.read_csv(
+        path,
+        parse_options=pacsv.ParseOptions(delimiter=delimiter_of(path)),
+        convert_options=pacsv.ConvertOptions(strings_can_be_null=True),
+    )
+    return table.rename_columns([column_map.get(c, c) for c in table.column_names])
+
+
+def unify_schemas(tables: List[pa.Table]) -> List[pa.Table]:
+    """
+    Give all tables the same columns: columns missing from a partition are
+    filled with nulls and columns whose inferred type differs between
+    partitions are widened to float64 (mixed numbers) or strings.
+    """
+    types: Dict[str, set] = {}
+    for table in tables:
+        for field in table.schema:
+            types.setdefault(field.name, set()).add(field.type)
+    schema = pa.schema([(name, common_type(kinds)) for name, kinds in types.items()])
+    unified = []
+    for table in tables:
+        columns = []
+        for field in schema:
+            if field.name in table.column_names:
+                columns.append(table[field.name].cast(field.type))
+            else:
+                columns.append(pa.nulls(table.num_rows, field.type))
+        unified.append(pa.Table.from_arrays(columns, schema=schema))
+    return unified
+
+
+def common_type(kinds: set) -> pa.DataType:
+    kinds = kinds - {pa.null()}
+    if len(kinds) == 0:
+        return pa.null()
+    if len(kinds) == 1:
+        return kinds.pop()
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in kinds):
+        return pa.float64()
+    return pa.string()
+
+
+def read_line_list_partitions(paths: List[str], column_map: Dict[str, str],
+                              max_workers: Optional[int] = None) -> pa.Table:
+    """
+    Read and decompress line list partitions concurrently and concatenate
+    them into one Arrow table, with columns renamed through `column_map`.
+
+    Partitions are concatenated in the order of `paths`; chunks are kept as
+    read rather than copied into one buffer.
+    """
+    if max_workers is None:
+        max_workers = min(8, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        tables = list(pool.map(lambda p: read_partition(p, column_map), paths))
+    return pa.concat_tables(unify_schemas(tables))
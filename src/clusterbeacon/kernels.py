@@ -0,0 +1,172 @@
+import numpy as np
+from typing import Optional, Tuple
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:  # pragma: no cover - numba is optional at runtime
+    HAVE_NUMBA = False
+
+
+def to_epoch_days(dates) -> np.ndarray:
+    """Datetime-like values as int64 days since 1970-01-01."""
+    return np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+
+
+def cluster_offsets(codes: np.ndarray) -> np.ndarray:
+    """
+    Boundaries of the runs of equal values in sorted `codes`; cluster i spans
+    rows ``offsets[i]:offsets[i+1]``.
+    """
+    n = len(codes)
+    if n == 0:
+        return np.zeros(1, dtype=np.int64)
+    breaks = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+    return np.concatenate(([0], breaks, [n])).astype(np.int64)
+
+
+def forward_date_deltas(days: np.ndarray) -> np.ndarray:
+    """Day difference between each row and the next one; the last value is 0."""
+    out = np.zeros(len(days), dtype=np.int64)
+    if len(days) > 1:
+        out[:-1] = np.diff(days)
+    return out
+
+
+def _gap_windows_np(days, offsets, max_delta, is_human):
+    n = len(days)
+    sizes = np.diff(offsets)
+    row_cluster = np.repeat(np.arange(len(sizes), dtype=np.int64), sizes)
+    is_start = np.ones(n, dtype=bool)
+    if n > 1:
+        is_start[1:] = np.diff(days) > max_delta[row_cluster[1:]]
+    is_start[offsets[:-1][sizes > 0]] = True
+    window_ids = np.cumsum(is_start, dtype=np.int64) - 1
+    starts = np.flatnonzero(is_start)
+    window_offsets = np.append(starts, n).astype(np.int64)
+    window_cluster = row_cluster[starts]
+    window_humans = np.bincount(window_ids, weights=is_human, minlength=len(starts))
+    window_humans = window_humans.astype(np.int64)
+    return window_ids, window_offsets, window_cluster, window_humans
+
+
+if HAVE_NUMBA:
+    @njit(cache=True)
+    def _gap_windows_nb(days, offsets, max_delta, is_human):
+        n = days.shape[0]
+        window_ids = np.empty(n, dtype=np.int64)
+        starts = np.empty(n + 1, dtype=np.int64)
+        window_cluster = np.empty(n, dtype=np.int64)
+        window_humans = np.zeros(n, dtype=np.int64)
+        w = -1
+        for c in range(offsets.shape[0] - 1):
+            lo = offsets[c]
+            hi = offsets[c + 1]
+            for i in range(lo, hi):
+                if i == lo or days[i] - days[i - 1] > max_delta[c]:
+                    w += 1
+                    starts[w] = i
+                    window_cluster[w] = c
+                window_ids[i] = w
+                if is_human[i]:
+                    window_humans[w] += 1
+        nw = w + 1
+        starts[nw] = n
+        return (window_ids, starts[:nw + 1].copy(), window_cluster[:nw].copy(),
+                window_humans[:nw].copy())
+
+
+def gap_windows(
+    days: np.ndarray,
+    offsets: np.ndarray,
+    max_delta: np.ndarray,
+    is_human: np.ndarray,
+    use_numba: bool = True,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Split every cluster into date windows in a single pass. A window starts at
+    the first row of each cluster and wherever consecutive dates are more than
+    the cluster's `max_delta` days apart.
+
+    Returns the window of each row, the window row offsets, the cluster of each
+    window and its number of human isolates.
+    """
+    days = np.ascontiguousarray(days, dtype=np.int64)
+    offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+    max_delta = np.ascontiguousarray(max_delta, dtype=np.int64)
+    is_human = np.ascontiguousarray(is_human, dtype=np.bool_)
+    if use_numba and HAVE_NUMBA:
+        return _gap_windows_nb(days, offsets, max_delta, is_human)
+    return _gap_windows_np(days, offsets, max_delta, is_human)
+
+
+def sorted_neighbor_pairs(
+    block_offsets: np.ndarray,
+    days: np.ndarray,
+    max_delta: int,
+    max_neighbors: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Sorted-neighborhood candidate pairs: rows of the same block, sorted by
+    (block, day), at most `max_delta` days apart. Each row is paired with at
+    most `max_neighbors` following rows of its date window (all when None).
+
+    Returns the left and right row positions of each pair and the number of
+    rows whose window was cut by `max_neighbors`.
+    """
+    empty = np.zeros(0, dtype=np.int64)
+    n = len(days)
+    if n < 2:
+        return empty, empty, 0
+    sizes = np.diff(block_offsets)
+    block = np.repeat(np.arange(len(sizes), dtype=np.int64), sizes)
+    # spacing blocks further apart than any window keeps windows inside their block
+    stride = int(days.max() - days.min()) + int(max_delta) + 1
+    keys = (days - days.min()).astype(np.int64) + block * stride
+    window_end = np.searchsorted(keys, keys + int(max_delta), side='right')
+    span = window_end - np.arange(n)
+    truncated = 0
+    if max_neighbors is not None:
+        truncated = int((span > max_neighbors + 1).sum())
+        span = np.minimum(span, max_neighbors + 1)
+    left, right = [], []
+    for k in range(1, int(span.max())):
+        rows = np.flatnonzero(span > k)
+        left.append(rows)
+        right.append(rows + k)
+    if len(left) == 0:
+        return empty, empty, truncated
+    return np.concatenate(left), np.concatenate(right), truncated
+
+
+def sliding_windows(
+    days: np.ndarray,
+    offsets: np.ndarray,
+    max_delta: np.ndarray,
+    is_human: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Every maximal rolling window of every cluster: the rows dated within
+    `max_delta` days of a start row, in O(n log n) via one searchsorted.
+
+    Returns window starts, ends (exclusive), clusters and human counts.
+    """
+    n = len(days)
+    if n == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, empty
+    days = np.asarray(days, dtype=np.int64)
+    max_delta = np.asarray(max_delta, dtype=np.int64)
+    sizes = np.diff(offsets)
+    row_cluster = np.repeat(np.arange(len(sizes), dtype=np.int64), sizes)
+    # spacing clusters further apart than any window keeps windows inside their cluster
+    stride = int(days.max() - days.min()) + int(max_delta.max(initial=0)) + 1
+    keys = (days - days.min()) + row_cluster * stride
+    ends = np.searchsorted(keys, keys + max_delta[row_cluster], side='right').astype(np.int64)
+    maximal = np.ones(n, dtype=bool)
+    maximal[1:] = (ends[1:] > ends[:-1]) | (row_cluster[1:] != row_cluster[:-1])
+    starts = np.flatnonzero(maximal).astype(np.int64)
+    human_prefix = np.concatenate(([0], np.cumsum(is_human, dtype=np.int64)))
+    window_ends = ends[starts]
+    window_humans = human_prefix[window_ends] - human_prefix[starts]
+    return starts, window_ends, row_cluster[starts], window_humans
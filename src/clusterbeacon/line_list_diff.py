@@ -0,0 +1,141 @@
+import os
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from src.clusterbeacon.ingest import delimiter_of, expand_line_list_paths
+
+hash_column = '_row_hash'
+key_column = '_row_key'
+snapshot_suffix = '.parquet'
+
+
+def read_text_line_list(path: Union[str, Path], column_map: Dict[str, str]) -> pd.DataFrame:
+    """
+    Line list values as text, with `column_map` applied, so a diff sees
+    exactly what was delivered (no date or number parsing). Accepts the same
+    files, directories and globs as detection.
+    """
+    paths = expand_line_list_paths(path)
+    if len(paths) == 0:
+        raise FileNotFoundError(f"line list {path} does not exist or is empty")
+    frames = [read_text_partition(p) for p in paths]
+    df = pd.concat(frames, ignore_index=True).fillna('') if len(frames) > 1 else frames[0]
+    df = df.rename(columns=column_map)
+    if 'sample_id' not in df.columns:
+        raise ValueError(f"line list {path} has no sample_id column")
+    return df
+
+
+def read_text_partition(path: str) -> pd.DataFrame:
+    # decompressed by extension, like ingest.read_partition
+    with pa.input_stream(path, compression='detect') as stream:
+        return pd.read_csv(stream, sep=delimiter_of(path), header=0, dtype=str,
+                           keep_default_na=False)
+
+
+def hash_rows(df: pd.DataFrame, columns: List[str]) -> np.ndarray:
+    """uint64 content hash of every row over `columns`, in one vectorized pass."""
+    if len(df) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+
+def row_keys(sample_ids: pd.Series) -> pd.Series:
+    """sample_id plus its occurrence number, so repeated sample ids still pair up one to one."""
+    sample_ids = sample_ids.astype(str)
+    return sample_ids + '#' + sample_ids.groupby(sample_ids).cumcount().astype(str)
+
+
+def load_snapshot(path: Union[str, Path], column_map: Dict[str, str]) -> pd.DataFrame:
+    """
+    Text frame of a line list with its row hashes. A ``.parquet`` path is a
+    snapshot saved by ``save_snapshot`` and is read as is; anything else is
+    read as a line list and hashed.
+    """
+    if str(path).lower().endswith(snapshot_suffix):
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"snapshot {path} does not exist")
+        return pd.read_parquet(path)
+    df = read_text_line_list(path, column_map)
+    columns = list(df.columns)
+    df[key_column] = row_keys(df['sample_id'])
+    df[hash_column] = hash_rows(df, columns)
+    return df
+
+
+def save_snapshot(df: pd.DataFrame, path: Union[str, Path]) -> None:
+    """Write the text frame and its hash columns so the next diff only reads the new delivery."""
+    df.to_parquet(f"{path}.tmp", index=False)
+    os.replace(f"{path}.tmp", path)
+
+
+def data_columns(df: pd.DataFrame) -> List[str]:
+    return [c for c in df.columns if c not in (hash_column, key_column)]
+
+
+def diff_line_lists(
+    old: pd.DataFrame, new: pd.DataFrame
+) -> Tuple[pd.DataFrame, pd.DataFrame, Dict[str, int]]:
+    """
+    Added, removed and modified samples between two hashed line lists.
+
+    Rows pair up by sample id (and occurrence). Paired rows whose hashes
+    agree are unchanged; values are only compared column by column for the
+    rows whose hashes differ. When the two deliveries have different columns
+    the hashes are recomputed over the shared columns.
+
+    Returns
+    -------
+    (pd.DataFrame, pd.DataFrame, dict)
+        One row per changed sample (sample_id, change, changed_columns), one
+        row per column (column, status, modified_samples), and summary counts.
+    """
+    old_columns, new_columns = data_columns(old), data_columns(new)
+    shared = [c for c in new_columns if c in old_columns]
+    old_hash, new_hash = old[hash_column].to_numpy(), new[hash_column].to_numpy()
+    if shared != old_columns or shared != new_columns:
+        old_hash, new_hash = hash_rows(old, shared), hash_rows(new, shared)
+
+    old_index = pd.Index(old[key_column])
+    position = old_index.get_indexer(new[key_column])
+    paired = position >= 0
+    new_rows = np.flatnonzero(paired)
+    old_rows = position[paired]
+    modified = old_hash[old_rows] != new_hash[new_rows]
+    new_rows, old_rows = new_rows[modified], old_rows[modified]
+
+    changed_columns = pd.Series('', index=range(len(new_rows)), dtype=object)
+    column_counts = []
+    for col in shared:
+        differs = old[col].to_numpy()[old_rows] != new[col].to_numpy()[new_rows]
+        column_counts.append((col, 'shared', int(differs.sum())))
+        changed_columns = changed_columns + np.where(differs, col + ',', '')
+    removed = np.ones(len(old), dtype=bool)
+    removed[position[paired]] = False
+
+    samples = pd.concat([
+        pd.DataFrame({'sample_id': new['sample_id'].to_numpy()[~paired], 'change': 'added',
+                      'changed_columns': ''}),
+        pd.DataFrame({'sample_id': old['sample_id'].to_numpy()[removed], 'change': 'removed',
+                      'changed_columns': ''}),
+        pd.DataFrame({'sample_id': new['sample_id'].to_numpy()[new_rows], 'change': 'modified',
+                      'changed_columns': changed_columns.str.rstrip(',').to_numpy()}),
+    ], ignore_index=True)
+    column_counts += [(c, 'added', 0) for c in new_columns if c not in old_columns]
+    column_counts += [(c, 'removed', 0) for c in old_columns if c not in new_columns]
+    columns = pd.DataFrame(column_counts, columns=['column', 'status', 'modified_samples'])
+    counts = {
+        'old_rows': len(old),
+        'new_rows': len(new),
+        'added': int((~paired).sum()),
+        'removed': int(removed.sum()),
+        'modified': int(len(new_rows)),
+        'unchanged': int(modified.size - modified.sum()),
+        'columns_added': len(new_columns) - len(shared),
+        'columns_removed': len(old_columns) - len(shared),
+    }
+    return samples, columns, counts
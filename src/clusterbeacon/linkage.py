@@ -0,0 +1,167 @@
+from pathlib import Path
+from typing import Any, Dict, Union
+
+import numpy as np
+import pandas as pd
+
+from src.clusterbeacon.utils import file_valid
+
+link_columns = ['outbreak_code', 'previous_outbreak_code', 'overlap', 'size', 'previous_size',
+                'jaccard']
+churn_columns = ['outbreak_code', 'event', 'previous_outbreak_codes', 'size', 'previous_size',
+                 'new_samples', 'best_match', 'best_jaccard']
+link_dtypes = [object, object, np.int64, np.int64, np.int64, np.float64]
+
+
+def read_previous_memberships(path: Union[str, Path]) -> pd.DataFrame:
+    """
+    (outbreak_code, sample_id) rows of a previous run, from its output
+    directory or its ``memberships.tsv``.
+    """
+    path = Path(path)
+    if path.is_dir():
+        path = path / "memberships.tsv"
+    if not file_valid(path):
+        raise FileNotFoundError(f"previous memberships {path} do not exist or are empty")
+    df = pd.read_csv(path, sep="\t", header=0, dtype=str, keep_default_na=False)
+    if not {'outbreak_code', 'sample_id'}.issubset(df.columns):
+        raise ValueError(f"previous memberships {path} need outbreak_code and sample_id columns")
+    return df[['outbreak_code', 'sample_id']]
+
+
+def outbreak_memberships(outbreak_clusters: Dict[str, Dict[str, Any]]) -> pd.DataFrame:
+    """(outbreak_code, sample_id) rows of the outbreaks of this run."""
+    rows = [(code, s) for code, record in outbreak_clusters.items()
+            for s in str(record['sample_ids']).split(',') if s]
+    return pd.DataFrame(rows, columns=['outbreak_code', 'sample_id'])
+
+
+def link_outbreaks(current: pd.DataFrame, previous: pd.DataFrame) -> pd.DataFrame:
+    """
+    Membership overlap of every (current, previous) outbreak pair sharing a sample.
+
+    Sample ids are factorized over both runs and the previous memberships
+    become a sample -> previous outbreak inverted index; joining the current
+    memberships against it yields every shared sample once, so the cost is
+    linear in the number of memberships plus shared pairs.
+
+    Returns
+    -------
+    pd.DataFrame
+        ``link_columns``, sorted by outbreak code and descending Jaccard score.
+    """
+    current = current.drop_duplicates()
+    previous = previous.drop_duplicates()
+    if len(current) == 0 or len(previous) == 0:
+        return empty_links()
+    samples = pd.concat([current['sample_id'], previous['sample_id']], ignore_index=True)
+    sample_codes, _ = pd.factorize(samples)
+    cur_codes, cur_names = pd.factorize(current['outbreak_code'])
+    prev_codes, prev_names = pd.factorize(previous['outbreak_code'])
+    cur_size = np.bincount(cur_codes, minlength=len(cur_names))
+    prev_size = np.bincount(prev_codes, minlength=len(prev_names))
+
+    cur = pd.DataFrame({'sample': sample_codes[:len(current)], 'cur': cur_codes})
+    index = pd.DataFrame({'sample': sample_codes[len(current):], 'prev': prev_codes})
+    pairs = cur.merge(index, on='sample', how='inner')
+    if len(pairs) == 0:
+        return empty_links()
+    overlap = pairs.groupby(['cur', 'prev'], sort=False).size()
+    c = overlap.index.get_level_values('cur').to_numpy()
+    p = overlap.index.get_level_values('prev').to_numpy()
+    shared = overlap.to_numpy()
+    links = pd.DataFrame({
+        'outbreak_code': cur_names[c],
+        'previous_outbreak_code': prev_names[p],
+        'overlap': shared,
+        'size': cur_size[c],
+        'previous_size': prev_size[p],
+        'jaccard': shared / (cur_size[c] + prev_size[p] - shared),
+    })
+    return links.sort_values(['outbreak_code', 'jaccard', 'previous_outbreak_code'],
+                             ascending=[True, False, True], kind='stable').reset_index(drop=True)
+
+
+def empty_links() -> pd.DataFrame:
+    return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in zip(link_columns, link_dtypes)})
+
+
+def classify_churn(
+    current: pd.DataFrame, previous: pd.DataFrame, links: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    One event per current outbreak, plus one ``dissolved`` row per previous
+    outbreak that shares no sample with this run.
+
+    Events are ``new`` (no previous outbreak), ``merge`` (several previous
+    outbreaks), ``split`` (its previous outbreak continues in several
+    outbreaks), ``merge_split``, and for one-to-one links ``unchanged``,
+    ``growth`` (gained samples only), ``shrink`` (lost samples only) or
+    ``changed``.
+
+    Returns
+    -------
+    pd.DataFrame
+        ``churn_columns``.
+    """
+    current = current.drop_duplicates()
+    previous = previous.drop_duplicates()
+    sizes = current.groupby('outbreak_code', sort=True).size()
+    prev_sizes = previous.groupby('outbreak_code', sort=True).size()
+    known = current['sample_id'].isin(previous['sample_id'])
+    new_samples = (~known).groupby(current['outbreak_code']).sum()
+    new_samples = new_samples.reindex(sizes.index, fill_value=0)
+
+    n_prev = links.groupby('outbreak_code').size().reindex(sizes.index, fill_value=0)
+    n_cur = links.groupby('previous_outbreak_code').size()
+    split_links = links['previous_outbreak_code'].map(n_cur).to_numpy() > 1
+    split = pd.Series(split_links, index=links.index).groupby(links['outbreak_code']).any()
+    split = split.reindex(sizes.index, fill_value=False)
+    # links are sorted by descending Jaccard within each outbreak, so the first is the best match
+    best = links.drop_duplicates('outbreak_code').set_index('outbreak_code').reindex(sizes.index)
+    by_outbreak = links.groupby('outbreak_code')
+    prev_codes = by_outbreak['previous_outbreak_code'].agg(lambda s: ','.join(sorted(s)))
+    previous_size = by_outbreak['previous_size'].sum().reindex(sizes.index, fill_value=0)
+
+    size = sizes.to_numpy()
+    overlap = best['overlap'].fillna(0).to_numpy()
+    best_prev_size = best['previous_size'].fillna(0).to_numpy()
+    n = n_prev.to_numpy()
+    event = np.select(
+        [n == 0,
+         (n > 1) & split.to_numpy(),
+         n > 1,
+         split.to_numpy(),
+         (overlap == size) & (overlap == best_prev_size),
+         overlap == best_prev_size,
+         overlap == size],
+        ['new', 'merge_split', 'merge', 'split', 'unchanged', 'growth', 'shrink'],
+        default='changed')
+    churn = pd.DataFrame({
+        'outbreak_code': sizes.index,
+        'event': event,
+        'previous_outbreak_codes': prev_codes.reindex(sizes.index, fill_value='').to_numpy(),
+        'size': size,
+        'previous_size': previous_size.to_numpy(),
+        'new_samples': new_samples.to_numpy().astype(np.int64),
+        'best_match': best['previous_outbreak_code'].fillna('').to_numpy(),
+        'best_jaccard': best['jaccard'].fillna(0.0).to_numpy(),
+    })
+
+    dissolved = prev_sizes[~prev_sizes.index.isin(links['previous_outbreak_code'])]
+    if len(dissolved) > 0:
+        n = len(dissolved)
+        dissolved = pd.DataFrame({
+            'outbreak_code': np.full(n, '', dtype=object),
+            'event': np.full(n, 'dissolved', dtype=object),
+            'previous_outbreak_codes': dissolved.index.to_numpy(dtype=object),
+            'size': np.zeros(n, dtype=np.int64),
+            'previous_size': dissolved.to_numpy().astype(np.int64),
+            'new_samples': np.zeros(n, dtype=np.int64),
+            'best_match': np.full(n, '', dtype=object),
+            'best_jaccard': np.zeros(n, dtype=np.float64),
+        })
+        # an empty churn frame would make concat fall back to its column dtypes
+        churn = pd.concat([churn, dissolved], ignore_index=True) if len(churn) > 0 else dissolved
+    return churn[churn_columns]
+
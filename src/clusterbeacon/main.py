@@ -1,6 +1,17 @@
 from argparse import (ArgumentParser, ArgumentDefaultsHelpFormatter, RawDescriptionHelpFormatter)
 from src.clusterbeacon.version import __version__
-from src.clusterbeacon.classes.detector import detector
+from src.clusterbeacon.classes.Detector import Detector
+from src.clusterbeacon.classes.ConfigLoader import ConfigLoader
+from src.clusterbeacon.classes.HistoryStore import HistoryStore
+from src.clusterbeacon.classes.AddressIndex import AddressIndex
+from src.clusterbeacon.classes.Checkpoint import Checkpoint
+from src.clusterbeacon.classes.OutputWriter import OutputWriter
+from src.clusterbeacon.sharding import merge_shard_outputs, shard_line_list
+from src.clusterbeacon.harness import (ENGINES, LEGACY_KNOWN_DIFFERENCES, compare_engines,
+                                       generate_inputs)
+from src.clusterbeacon.api import memberships_table
+from src.clusterbeacon.arrow_io import read_ipc_stream, write_ipc_tables
+from src.clusterbeacon.line_list_diff import diff_line_lists, load_snapshot, save_snapshot
 import json
 import os
 import sys
@@ -8,9 +19,14 @@ from datetime import datetime
 from pathlib import Path
 
 
-def parse_args():
-    class CustomFormatter(ArgumentDefaultsHelpFormatter, RawDescriptionHelpFormatter):
-        pass
+default_checkpoint_clusters = 1000
+
+
+class CustomFormatter(ArgumentDefaultsHelpFormatter, RawDescriptionHelpFormatter):
+    pass
+
+
+def parse_args(argv=None):
 
     parser = ArgumentParser(
         description=(
@@ -25,7 +41,8 @@ def parse_args():
         dest="line_list",
         type=Path,
         required=False,
-        help="Arborator line list (TSV) output path",
+        help="Arborator line list (TSV) output path, a directory or quoted glob of (.gz/.zst "
+        "compressed) partitions, or '-' to read an Arrow IPC stream from stdin",
     )
     parser.add_argument(
         "--config",
@@ -34,6 +51,14 @@ def parse_args():
         required=True,
         help="Configuration file (YAML or JSON)",
     )
+    parser.add_argument(
+        "--stdout-format",
+        dest="stdout_format",
+        choices=["arrow"],
+        required=False,
+        help="Also write the outbreak and membership tables to stdout as consecutive Arrow IPC "
+        "streams",
+    )
     parser.add_argument(
         "--outdir",
         "-o",
@@ -47,11 +72,363 @@ def parse_args():
         action="store_true",
         help="Overwrite existing output directory if it exists",
     )
+    parser.add_argument(
+        "--profiles",
+        "-p",
+        dest="allele_profiles",
+        type=Path,
+        required=False,
+        help="cgMLST allele profiles (TSV) used to verify the max pairwise distance of each "
+        "outbreak",
+    )
+    parser.add_argument(
+        "--registry",
+        dest="outbreak_registry",
+        type=Path,
+        required=False,
+        help="SQLite outbreak registry used to keep outbreak codes stable across runs",
+    )
+    parser.add_argument(
+        "--since",
+        type=str,
+        required=False,
+        help="Only report outbreaks with samples collected on or after this date (YYYY-MM-DD); "
+             "outbreak codes match a full run unless allele profiles split skipped windows",
+    )
+    parser.add_argument(
+        "--lookback-days",
+        dest="lookback_days",
+        type=int,
+        required=False,
+        help="Only report outbreaks with samples collected in the last N days; outbreak codes "
+             "match a full run unless allele profiles split skipped windows",
+    )
+    parser.add_argument(
+        "--max-memory",
+        dest="max_memory",
+        type=str,
+        required=False,
+        help="Memory budget (e.g. 8G); larger line lists are spilled to disk by denovo cluster "
+        "and processed partition by partition",
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        dest="checkpoint_clusters",
+        type=int,
+        required=False,
+        help="Checkpoint progress into <outdir>/checkpoint every N candidate clusters",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume an interrupted run from the checkpoint in its output directory",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Record stage and per-cluster timing spans to trace.json and slowest_clusters.tsv",
+    )
+    parser.add_argument(
+        "--trace-top",
+        dest="trace_top",
+        type=int,
+        default=20,
+        help="Number of clusters listed in slowest_clusters.tsv",
+    )
+    parser.add_argument(
+        "--history-db",
+        dest="history_db",
+        type=Path,
+        required=False,
+        help="SQLite history store the results of this run are loaded into",
+    )
+    parser.add_argument(
+        "--previous",
+        dest="previous_memberships",
+        type=Path,
+        required=False,
+        help="Output directory or memberships.tsv of the previous run; writes outbreak_links.tsv "
+        "and churn.tsv",
+    )
     parser.add_argument(
         "-V", "--version", action="version", version="%(prog)s " + __version__
     )
 
-    return parser.parse_args()
+    return parser.parse_args(argv)
+
+
+def parse_history_args(argv):
+    parser = ArgumentParser(
+        prog="clusterbeacon history",
+        description="Load run output directories into a history store and query it",
+        formatter_class=CustomFormatter,
+    )
+    parser.add_argument("--db", "-d", type=Path, required=True, help="SQLite history store")
+    sub = parser.add_subparsers(dest="action", required=True)
+    load = sub.add_parser("load", help="Bulk load one or more run output directories")
+    load.add_argument("outdirs", type=Path, nargs="+")
+    sub.add_parser("runs", help="List loaded runs")
+    sample = sub.add_parser("sample", help="Outbreaks a sample has belonged to, oldest first")
+    sample.add_argument("sample_id")
+    outbreak = sub.add_parser("outbreak", help="Size of an outbreak code across runs")
+    outbreak.add_argument("outbreak_code")
+    cluster = sub.add_parser("cluster", help="Growth of a denovo cluster across runs")
+    cluster.add_argument("cluster_id")
+    return parser.parse_args(argv)
+
+
+def _print_table(columns, rows) -> None:
+    print("\t".join(columns))
+    for row in rows:
+        print("\t".join('' if v is None else str(v) for v in row))
+
+
+def run_history(argv) -> None:
+    args = parse_history_args(argv)
+    store = HistoryStore(args.db)
+    try:
+        if args.action == "load":
+            for outdir in args.outdirs:
+                try:
+                    run_id = store.load_run(outdir)
+                except FileNotFoundError as e:
+                    print(f"Error: {e}", file=sys.stderr)
+                    sys.exit(1)
+                print(f"loaded {outdir} as run {run_id}")
+        elif args.action == "runs":
+            _print_table(*store.list_runs())
+        elif args.action == "sample":
+            _print_table(*store.sample_history(args.sample_id))
+        elif args.action == "outbreak":
+            _print_table(*store.outbreak_history(args.outbreak_code))
+        elif args.action == "cluster":
+            _print_table(*store.cluster_history(args.cluster_id))
+    finally:
+        store.close()
+
+
+def parse_shard_args(argv):
+    parser = ArgumentParser(
+        prog="clusterbeacon shard",
+        description="Split a line list into shards by hash of the top-level genomic address prefix",
+        formatter_class=CustomFormatter,
+    )
+    parser.add_argument("--ll", "-i", dest="line_list", type=Path, required=False,
+                        help="Arborator line list (TSV)")
+    parser.add_argument("--config", "-c", type=Path, required=True,
+                        help="Configuration file (YAML or JSON)")
+    parser.add_argument("--num-shards", "-k", dest="num_shards", type=int, required=True,
+                        help="Number of shards")
+    parser.add_argument("--outdir", "-o", type=Path, required=True,
+                        help="Directory for shard_<i>.tsv files")
+    return parser.parse_args(argv)
+
+
+def run_shard(argv) -> None:
+    args = parse_shard_args(argv)
+    if args.num_shards < 1:
+        print("Error: --num-shards must be at least 1", file=sys.stderr)
+        sys.exit(1)
+    config = _load_config(args.config)
+    line_list = str(args.line_list) if args.line_list else config.get("line_list_path")
+    try:
+        paths = shard_line_list(line_list, args.outdir, args.num_shards,
+                                config.get("column_map", {}),
+                                config.get("gas_denovo_delimiter", "."))
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    for path in paths:
+        print(path)
+
+
+def parse_merge_args(argv):
+    parser = ArgumentParser(
+        prog="clusterbeacon merge",
+        description="Merge shard output directories into the result of a single run",
+        formatter_class=CustomFormatter,
+    )
+    parser.add_argument("shard_dirs", type=Path, nargs="+",
+                        help="Output directories of the shard runs")
+    parser.add_argument("--outdir", "-o", type=Path, required=True,
+                        help="Output directory for merged results")
+    parser.add_argument("--delimiter", default=".", help="Genomic address level delimiter")
+    parser.add_argument("--force", "-f", action="store_true",
+                        help="Overwrite existing output directory if it exists")
+    return parser.parse_args(argv)
+
+
+def run_merge(argv) -> None:
+    args = parse_merge_args(argv)
+    prepare_outdir(args.outdir, args.force)
+    counts = merge_shard_outputs(args.shard_dirs, args.outdir, args.delimiter)
+    print(json.dumps(counts))
+
+
+def parse_compare_args(argv):
+    parser = ArgumentParser(
+        prog="clusterbeacon compare",
+        description="Run detector engines on the same input and diff their results against a "
+        "baseline engine",
+        formatter_class=CustomFormatter,
+    )
+    parser.add_argument("--config", "-c", type=Path, required=False,
+                        help="Configuration file (YAML or JSON) of a real input")
+    parser.add_argument("--generate", type=int, required=False,
+                        help="Generate a synthetic line list with this many samples instead")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the generated line list")
+    parser.add_argument("--engines", nargs="+", default=["streamed", "out_of_core", "api"],
+                        choices=sorted(ENGINES), help="Engines compared against the baseline")
+    parser.add_argument("--legacy-compatible", dest="legacy_compatible", action="store_true",
+                        help="Generate rules the known legacy bugs do not affect, so every engine "
+                             "must match the legacy detector")
+    parser.add_argument("--baseline", default="legacy", choices=sorted(ENGINES),
+                        help="Reference engine; 'legacy' runs the outbreakbeacon detector")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Runs per engine; the fastest is reported")
+    parser.add_argument("--outdir", "-o", type=Path, required=False,
+                        help="Directory for generated inputs and compare.tsv")
+    parser.add_argument("--strict", action="store_true",
+                        help="Exit with status 1 if any engine differs from the baseline")
+    return parser.parse_args(argv)
+
+
+def run_compare(argv) -> None:
+    args = parse_compare_args(argv)
+    if args.config is None and args.generate is None:
+        print("Error: one of --config or --generate is required", file=sys.stderr)
+        sys.exit(1)
+    outdir = args.outdir or Path("compare")
+    if args.generate is not None:
+        config = generate_inputs(outdir, args.generate, args.seed, args.legacy_compatible)
+    else:
+        config = _load_config(args.config)
+    report = compare_engines(config, args.engines, args.baseline, args.repeat)
+    if args.baseline == "legacy" and not args.legacy_compatible:
+        print("Known differences from the legacy detector:", file=sys.stderr)
+        for difference in LEGACY_KNOWN_DIFFERENCES:
+            print(f"  - {difference}", file=sys.stderr)
+    outdir.mkdir(parents=True, exist_ok=True)
+    report.to_csv(outdir / "compare.tsv", sep="\t", header=True, index=False)
+    print(report.to_string(index=False))
+    identical = ("identical" in report.columns
+                 and report["identical"].fillna(False).astype(bool).all())
+    if args.strict and not identical:
+        sys.exit(1)
+
+
+def parse_index_args(argv):
+    parser = ArgumentParser(
+        prog="clusterbeacon index",
+        description="Build a memory-mapped prefix index over gas_denovo_cluster_address levels",
+        formatter_class=CustomFormatter,
+    )
+    parser.add_argument("--ll", "-i", dest="line_list", type=Path, required=False,
+                        help="Arborator line list (TSV), or a directory or quoted glob of "
+                        "(.gz/.zst compressed) partitions")
+    parser.add_argument("--config", "-c", type=Path, required=True,
+                        help="Configuration file (YAML or JSON)")
+    parser.add_argument("--index", "-o", dest="index_dir", type=Path, required=True,
+                        help="Index directory")
+    return parser.parse_args(argv)
+
+
+def run_index(argv) -> None:
+    args = parse_index_args(argv)
+    config = _load_config(args.config)
+    line_list = str(args.line_list) if args.line_list else config.get("line_list_path")
+    try:
+        counts = AddressIndex.build(line_list, args.index_dir, config.get("column_map", {}),
+                                    config.get("gas_denovo_delimiter", "."),
+                                    config.get("gas_denovo_thresholds", []))
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(counts))
+
+
+def parse_query_args(argv):
+    parser = ArgumentParser(
+        prog="clusterbeacon query",
+        description="Look up cluster memberships in an address prefix index",
+        formatter_class=CustomFormatter,
+    )
+    parser.add_argument("--index", "-d", dest="index_dir", type=Path, required=True,
+                        help="Index directory built by clusterbeacon index")
+    sub = parser.add_subparsers(dest="action", required=True)
+    sample = sub.add_parser("sample", help="Cluster codes of samples at every address level")
+    sample.add_argument("sample_ids", nargs="+")
+    cluster = sub.add_parser("cluster", help="Samples sharing an address prefix")
+    cluster.add_argument("cluster_code")
+    cluster.add_argument("--threshold", "-t", type=int, required=False,
+                         help="Truncate the prefix to the level the detector uses for this "
+                              "threshold")
+    return parser.parse_args(argv)
+
+
+def run_query(argv) -> None:
+    args = parse_query_args(argv)
+    try:
+        index = AddressIndex(args.index_dir)
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.action == "sample":
+        columns = ["sample_id", "level", "threshold", "cluster_code", "members"]
+        rows = []
+        for sample_id in args.sample_ids:
+            rows.extend(index.clusters_of(sample_id).itertuples(index=False))
+        _print_table(columns, rows)
+    elif args.action == "cluster":
+        _print_table(["sample_id"], [[s] for s in index.members(args.cluster_code, args.threshold)])
+
+
+def parse_diff_args(argv):
+    parser = ArgumentParser(
+        prog="clusterbeacon diff",
+        description="Report added, removed and modified samples between two line list deliveries",
+        formatter_class=CustomFormatter,
+    )
+    parser.add_argument("old",
+                        help="Previous line list, or a .parquet snapshot saved by an earlier diff")
+    parser.add_argument("new", help="Current line list")
+    parser.add_argument("--config", "-c", type=Path, required=False,
+                        help="Configuration file (YAML or JSON) providing column_map")
+    parser.add_argument("--outdir", "-o", type=Path, required=True,
+                        help="Directory for diff_samples.tsv and diff_columns.tsv")
+    parser.add_argument("--snapshot", "-s", type=Path, required=False,
+                        help="Save the hashed current line list here (.parquet) to diff the next "
+                             "delivery against")
+    return parser.parse_args(argv)
+
+
+def run_diff(argv) -> None:
+    args = parse_diff_args(argv)
+    column_map = _load_config(args.config).get("column_map", {}) if args.config else {}
+    try:
+        old = load_snapshot(args.old, column_map)
+        new = load_snapshot(args.new, column_map)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    samples, columns, counts = diff_line_lists(old, new)
+    args.outdir.mkdir(parents=True, exist_ok=True)
+    samples.to_csv(args.outdir / "diff_samples.tsv", sep="\t", header=True, index=False)
+    columns.to_csv(args.outdir / "diff_columns.tsv", sep="\t", header=True, index=False)
+    if args.snapshot:
+        save_snapshot(new, args.snapshot)
+    print(json.dumps(counts))
+
+
+SUBCOMMANDS = {
+    "history": run_history,
+    "shard": run_shard,
+    "merge": run_merge,
+    "compare": run_compare,
+    "index": run_index,
+    "query": run_query,
+    "diff": run_diff,
+}
 
 
 def prepare_outdir(outdir: Path, force: bool) -> None:
@@ -74,58 +451,161 @@ def prepare_outdir(outdir: Path, force: bool) -> None:
 
 
 
-def run_outbreak_detector(config):
+def run_outbreak_detector(config, line_list=None):
     config['analysis_start_time'] = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+    checkpoint = None
+    if config.get('checkpoint_clusters') and Checkpoint.default_dir(config):
+        checkpoint = Checkpoint(Checkpoint.default_dir(config))
+        if config.get('resume') and checkpoint.meta.get('run_id'):
+            # a resumed run keeps the run id of the attempt it continues; the
+            # detector refuses to resume when the settings or inputs changed
+            config['run_id'] = checkpoint.meta['run_id']
+    config.setdefault('run_id', datetime.now().strftime("%Y%m%d%H%M%S"))
     outdir = config['outdir']
     if not os.path.isdir(outdir):
         os.makedirs(outdir, 0o755)
-    elif not config['force']:
-        print(f'Error directory {outdir} already exists but force not specified')
+    elif not config['force'] and not config.get('resume'):
+        print(f'Error directory {outdir} already exists but force not specified', file=sys.stderr)
         sys.exit()
     
-    obj = detector(config=config)
+    # outputs are streamed while detection runs unless registry codes are only final at the end
+    outbreak_columns = Detector.get_outbreak_columns(config)
+    writer = None
+    if config.get('stream_outputs', True) and not config.get('outbreak_registry_path'):
+        writer = OutputWriter(outdir, outbreak_columns)
+    try:
+        obj = Detector(config=config, writer=writer, line_list=line_list)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
     status = obj.status
     if not status:
-        print(f'Error something went wrong please check the log messages: \n {obj.messages}')
+        if writer is not None:
+            writer.abort()
+        print(f'Error something went wrong please check the log messages: \n {obj.messages}',
+              file=sys.stderr)
         sys.exit()
+    for message in obj.messages:
+        if message.startswith('Warning'):
+            print(message, file=sys.stderr)
 
-    obj.outbreak_df.to_csv(os.path.join(outdir,"outbreak_summary.tsv"),sep="\t",header=True, index=False)
-    obj.ll_df.to_csv(os.path.join(outdir,"line_list.tsv"),sep="\t",header=True, index=False)
-    fh = open(os.path.join(outdir,"duplicates.tsv"),'w')
-    for md5 in obj.duplicate_candidates:
-        for record in obj.duplicate_candidates[md5]:
-            data = "\t".join([str(x) for x in record])
-            fh.write(f'{md5}\t{data}\n')
-    fh.close()
+    if writer is None:
+        writer = OutputWriter(outdir, outbreak_columns)
+        for outbreak_code, record in obj.outbreak_clusters.items():
+            writer.write_outbreak(outbreak_code, record)
+        writer.write_duplicates(obj.duplicate_candidates)
+    writer.close()
+    line_list_path = os.path.join(outdir,"line_list.tsv")
+    obj.ll_df.to_csv(f"{line_list_path}.tmp",sep="\t",header=True, index=False)
+    os.replace(f"{line_list_path}.tmp", line_list_path)
+    # gating outcome of every denovo cluster, including the FAIL reasons of rejected ones
+    status_path = os.path.join(outdir,"cluster_status.tsv")
+    obj.cluster_status.to_csv(f"{status_path}.tmp",sep="\t",header=True, index=False)
+    os.replace(f"{status_path}.tmp", status_path)
+    if config.get('previous_memberships_path'):
+        for frame, name in ((obj.outbreak_links, "outbreak_links.tsv"), (obj.churn, "churn.tsv")):
+            path = os.path.join(outdir, name)
+            frame.to_csv(f"{path}.tmp", sep="\t", header=True, index=False)
+            os.replace(f"{path}.tmp", path)
 
+    if config.get('stdout_format') == 'arrow':
+        outbreaks = obj.outbreak_df.reindex(columns=['outbreak_code'] + outbreak_columns)
+        write_ipc_tables({'outbreaks': outbreaks, 'memberships': memberships_table(outbreaks)})
+
+    if obj.tracer.enabled:
+        obj.tracer.write_chrome_trace(os.path.join(outdir,"trace.json"))
+        slowest = obj.tracer.slowest('cluster',config.get('trace_top',20))
+        slowest.to_csv(os.path.join(outdir,"slowest_clusters.tsv"),sep="\t",header=True,
+                       index=False)
+
+    config['date_report'] = obj.date_report
+    if config.get('count_cube_dir'):
+        config['count_cube_report'] = obj.count_cube_report
+    if obj.profile_report:
+        config['profile_report'] = obj.profile_report
+    if config.get('metadata_tables'):
+        config['enrichment_report'] = obj.enrichment_report
+        conflicts_path = os.path.join(outdir,"enrichment_conflicts.tsv")
+        obj.enrichment_conflicts.to_csv(f"{conflicts_path}.tmp",sep="\t",header=True, index=False)
+        os.replace(f"{conflicts_path}.tmp", conflicts_path)
     config['analysis_end_time'] = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
     #write run parameters
     with open(os.path.join(outdir,"run.json"),'w' ) as fh:
         fh.write(json.dumps(config, indent=4))
+    # all outputs are in place, so the run no longer needs its checkpoint
+    if checkpoint is not None:
+        checkpoint.remove()
+
+    if config.get('history_db'):
+        store = HistoryStore(config['history_db'])
+        try:
+            store.load_run(outdir)
+        finally:
+            store.close()
+
+
+def _load_config(config_path: Path) -> dict:
+    return ConfigLoader.load_config(config_path).data
 
 
 # ----------------------------
 # Entrypoint
 # ----------------------------
 def main() -> None:
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        SUBCOMMANDS[sys.argv[1]](sys.argv[2:])
+        return
+
     args = parse_args()
 
     # Load config (YAML preferred, JSON supported)
     config = _load_config(args.config)
 
     # CLI overrides
-    if args.line_list:
+    line_list = None
+    if args.line_list and str(args.line_list) == "-":
+        line_list = read_ipc_stream()
+        config["line_list_path"] = "-"
+    elif args.line_list:
         config["line_list_path"] = str(args.line_list)
+    if args.stdout_format:
+        config["stdout_format"] = args.stdout_format
+    if args.allele_profiles:
+        config["allele_profiles_path"] = str(args.allele_profiles)
+    if args.outbreak_registry:
+        config["outbreak_registry_path"] = str(args.outbreak_registry)
+    if args.history_db:
+        config["history_db"] = str(args.history_db)
+    if args.previous_memberships:
+        config["previous_memberships_path"] = str(args.previous_memberships)
     if args.outdir:
         config["outdir"] = str(args.outdir)
     else:
         # Ensure a default exists if not provided in config
         config.setdefault("outdir", "results")
 
+    if args.since:
+        config["since"] = args.since
+    if args.lookback_days is not None:
+        config["lookback_days"] = args.lookback_days
+
+    if args.max_memory:
+        config["max_memory"] = args.max_memory
+    if args.checkpoint_clusters is not None:
+        config["checkpoint_clusters"] = args.checkpoint_clusters
+    if args.resume:
+        config["resume"] = True
+        config.setdefault("checkpoint_clusters", default_checkpoint_clusters)
+
+    if args.trace:
+        config["trace"] = True
+        config["trace_top"] = args.trace_top
+
     # Force flag overrides config
     config["force"] = bool(args.force)
 
-    run_outbreak_detector(config)
+    run_outbreak_detector(config, line_list=line_list)
 
 
 if __name__ == "__main__":
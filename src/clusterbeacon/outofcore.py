@@ -0,0 +1,143 @@
+import math
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+import psutil
+
+from src.clusterbeacon.arrow_io import table_to_frame
+from src.clusterbeacon.ingest import compressed_suffixes, delimiter_of, read_partition
+from src.clusterbeacon.sharding import shard_ids
+
+# processing holds a few copies of the formatted frame (sorts, window slices)
+working_set_factor = 3
+# assumed expansion of compressed partitions when estimating their size
+compression_ratio = 5
+
+_units = {'': 1, 'B': 1, 'K': 2**10, 'M': 2**20, 'G': 2**30, 'T': 2**40}
+
+
+def parse_memory_size(value: Union[str, int, float]) -> int:
+    """
+    Bytes in a memory size such as ``8G``, ``512M``, ``1.5GB`` or a plain byte count.
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip().upper().removesuffix('IB').removesuffix('B')
+    unit = text[-1:] if text[-1:] in _units else ''
+    number = text[:-1] if unit else text
+    try:
+        return int(float(number) * _units[unit])
+    except ValueError:
+        raise ValueError(f"invalid memory size: {value}")
+
+
+def memory_budget(max_memory: Union[str, int, float, None]) -> int:
+    """The configured budget, capped at the memory currently available."""
+    available = psutil.virtual_memory().available
+    if max_memory is None:
+        return available
+    return min(parse_memory_size(max_memory), available)
+
+
+def estimate_frame_bytes(paths: List[str], sample_rows: int = 10000) -> Tuple[int, int]:
+    """
+    Estimated in-memory size of the line list in `paths`, extrapolated from
+    the first `sample_rows` rows of the first file.
+
+    Returns
+    -------
+    (int, int)
+        Estimated total DataFrame bytes and bytes per row.
+    """
+    if len(paths) == 0:
+        return 0, 0
+    first = paths[0]
+    if first.lower().endswith(compressed_suffixes):
+        sample = table_to_frame(read_partition(first, {})).head(sample_rows)
+    else:
+        sample = pd.read_csv(first, sep=delimiter_of(first), header=0, nrows=sample_rows)
+    if len(sample) == 0:
+        return 0, 0
+    row_bytes = sample.memory_usage(deep=True).sum() / len(sample)
+    row_text_bytes = len(sample.to_csv(sep="\t", index=False, header=False).encode()) / len(sample)
+    disk_bytes = sum(os.path.getsize(p)
+                     * (compression_ratio if p.lower().endswith(compressed_suffixes) else 1)
+                     for p in paths)
+    return int(row_bytes * disk_bytes / max(1.0, row_text_bytes)), int(math.ceil(row_bytes))
+
+
+def plan_partitions(estimated_bytes: int, budget_bytes: int) -> int:
+    """
+    Number of partitions needed to keep one partition's working set within
+    half the budget; 1 means the line list can be processed in memory.
+    """
+    needed = estimated_bytes * working_set_factor
+    if needed <= budget_bytes:
+        return 1
+    return max(2, math.ceil(needed / max(1, budget_bytes // 2)))
+
+
+def iter_line_list_chunks(paths: List[str], column_map: Dict[str, str],
+                          chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """
+    Read a line list (one TSV or a list of partition files) a chunk at a
+    time, in file order. Compressed partitions are read whole.
+    """
+    for path in paths:
+        if path.lower().endswith(compressed_suffixes) or len(paths) > 1:
+            yield table_to_frame(read_partition(path, column_map))
+            continue
+        chunksize = max(1, chunk_rows)
+        with pd.read_csv(path, sep=delimiter_of(path), header=0, chunksize=chunksize) as reader:
+            for chunk in reader:
+                yield chunk
+
+
+class SpillPartitions:
+    """
+    Hash-partitioned spill files of prepared line list rows.
+
+    Rows are assigned to a partition by hash of `key_col`, so every denovo
+    cluster lands in exactly one partition. Each written chunk becomes one
+    pickle per partition; reading a partition concatenates its chunks in
+    the order they were written.
+    """
+
+    def __init__(self, num_partitions: int, spill_dir: Optional[Union[str, Path]] = None,
+                 key_col: str = 'denovo_cluster_code') -> None:
+        self.num_partitions = num_partitions
+        self.key_col = key_col
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+        self.spill_dir = Path(tempfile.mkdtemp(prefix="clusterbeacon-spill-", dir=spill_dir))
+        self.chunks: List[List[Path]] = [[] for _ in range(num_partitions)]
+
+    def write(self, df: pd.DataFrame) -> None:
+        if len(df) == 0:
+            return
+        partitions = shard_ids(df[self.key_col], self.num_partitions)
+        for p in range(self.num_partitions):
+            part = df[partitions == p]
+            if len(part) == 0:
+                continue
+            path = self.spill_dir / f"part_{p}_{len(self.chunks[p])}.pkl"
+            part.to_pickle(path)
+            self.chunks[p].append(path)
+
+    def read(self, partition: int) -> pd.DataFrame:
+        frames = [pd.read_pickle(path) for path in self.chunks[partition]]
+        if len(frames) == 0:
+            return pd.DataFrame()
+        return pd.concat(frames)
+
+    def remove(self, partition: int) -> None:
+        for path in self.chunks[partition]:
+            os.remove(path)
+        self.chunks[partition] = []
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
@@ -0,0 +1,154 @@
+import json
+import os
+import zlib
+from pathlib import Path
+from typing import Dict, List, Union
+
+import numpy as np
+import pandas as pd
+
+from src.clusterbeacon.utils import file_valid
+
+
+def top_level_key(addresses: pd.Series, delim: str = ".") -> pd.Series:
+    """
+    Top-level partition key of genomic addresses ('Sal|1.2.3' -> 'Sal|1'); denovo
+    clusters and duplicate groups never span two keys.
+    """
+    addresses = addresses.fillna("").astype(str)
+    parts = addresses.str.split("|", n=1, expand=True)
+    if parts.shape[1] < 2:
+        return parts[0].str.split(delim, n=1).str[0]
+    levels = parts[1].fillna("").str.split(delim, n=1).str[0]
+    return parts[0] + "|" + levels
+
+
+def shard_ids(keys: pd.Series, num_shards: int) -> np.ndarray:
+    """Stable shard number for each partition key (crc32, hashed once per distinct key)."""
+    codes, uniques = pd.factorize(keys)
+    shard_of_key = np.array([zlib.crc32(k.encode()) % num_shards for k in uniques], dtype=np.int64)
+    return shard_of_key[codes]
+
+
+def shard_line_list(
+    line_list_path: Union[str, Path],
+    outdir: Union[str, Path],
+    num_shards: int,
+    column_map: Dict[str, str],
+    delim: str = ".",
+) -> List[str]:
+    """
+    Split a line list into `num_shards` TSV files by hash of the top-level
+    ``gas_denovo_cluster_address`` prefix and return their paths.
+    """
+    if not file_valid(line_list_path):
+        raise FileNotFoundError(f"line list {line_list_path} does not exist or is empty")
+    os.makedirs(outdir, exist_ok=True)
+    df = pd.read_csv(line_list_path, sep="\t", header=0, dtype=str, keep_default_na=False)
+    address_col = 'gas_denovo_cluster_address'
+    for src, dest in column_map.items():
+        if dest == address_col and src in df.columns:
+            address_col = src
+    if address_col not in df.columns:
+        raise ValueError(f"line list {line_list_path} has no gas_denovo_cluster_address column")
+
+    shards = shard_ids(top_level_key(df[address_col], delim), num_shards)
+    paths = []
+    for i in range(num_shards):
+        path = os.path.join(outdir, f"shard_{i}.tsv")
+        df[shards == i].to_csv(path, sep="\t", header=True, index=False)
+        paths.append(path)
+    with open(os.path.join(outdir, "shards.json"), "w") as fh:
+        json.dump({
+            "line_list_path": str(line_list_path),
+            "num_shards": num_shards,
+            "rows": [int((shards == i).sum()) for i in range(num_shards)],
+        }, fh, indent=4)
+    return paths
+
+
+def _read_tsv(path: Union[str, Path], header=0) -> pd.DataFrame:
+    if not file_valid(path):
+        return pd.DataFrame()
+    return pd.read_csv(path, sep="\t", header=header, dtype=str, keep_default_na=False)
+
+
+def merge_shard_outputs(
+    shard_dirs: List[Union[str, Path]], outdir: Union[str, Path], delim: str = "."
+) -> Dict[str, int]:
+    """
+    Combine shard output directories in single-node order, renumbering outbreak
+    trackers unless the shards used an outbreak registry. Returns row counts.
+    """
+    os.makedirs(outdir, exist_ok=True)
+    outbreaks, lists, duplicates, statuses = [], [], [], []
+    runs = []
+    for shard, shard_dir in enumerate(shard_dirs):
+        shard_dir = Path(shard_dir)
+        summary = _read_tsv(shard_dir / "outbreak_summary.tsv")
+        if len(summary) > 0:
+            outbreaks.append(summary.assign(_shard=shard))
+        line_list = _read_tsv(shard_dir / "line_list.tsv")
+        if len(line_list) > 0:
+            lists.append(line_list)
+        status = _read_tsv(shard_dir / "cluster_status.tsv")
+        if len(status) > 0:
+            statuses.append(status)
+        dups = _read_tsv(shard_dir / "duplicates.tsv", header=None)
+        if len(dups) > 0:
+            duplicates.append(dups)
+        if file_valid(shard_dir / "run.json"):
+            with open(shard_dir / "run.json") as fh:
+                runs.append(json.load(fh))
+
+    counts = {"outbreaks": 0, "memberships": 0, "line_list": 0, "cluster_status": 0,
+              "duplicates": 0}
+    if outbreaks:
+        summary = pd.concat(outbreaks, ignore_index=True)
+    else:
+        summary = pd.DataFrame(columns=["outbreak_code", "cluster_id", "sample_ids"])
+    if len(summary) > 0:
+        summary["_key"] = top_level_key(summary["cluster_id"], delim)
+        summary = summary.sort_values("_key", kind="stable").reset_index(drop=True)
+        if "code_status" not in summary.columns:
+            trackers = pd.Series(np.arange(1, len(summary) + 1), dtype=str)
+            summary["outbreak_code"] = (summary["year"].str[-2:] + "_" + summary["cluster_id"]
+                                        + "_" + trackers)
+        summary = summary.drop(columns=["_key", "_shard"])
+    summary.to_csv(os.path.join(outdir, "outbreak_summary.tsv"), sep="\t", header=True, index=False)
+    counts["outbreaks"] = len(summary)
+
+    memberships = summary[["outbreak_code", "sample_ids"]].copy()
+    memberships["sample_id"] = memberships["sample_ids"].str.split(",")
+    memberships = memberships.explode("sample_id")
+    memberships = memberships[memberships["sample_id"].fillna("") != ""]
+    memberships[["outbreak_code", "sample_id"]].to_csv(os.path.join(outdir, "memberships.tsv"),
+                                                       sep="\t", header=True, index=False)
+    counts["memberships"] = len(memberships)
+
+    if lists:
+        line_list = pd.concat(lists, ignore_index=True)
+        order = np.argsort(line_list["denovo_cluster_code"].to_numpy(), kind="stable")
+        line_list = line_list.iloc[order]
+        line_list.to_csv(os.path.join(outdir, "line_list.tsv"), sep="\t", header=True, index=False)
+        counts["line_list"] = len(line_list)
+
+    if statuses:
+        status = pd.concat(statuses, ignore_index=True)
+        status = status.iloc[np.argsort(status["cluster_id"].to_numpy(), kind="stable")]
+        status.to_csv(os.path.join(outdir, "cluster_status.tsv"), sep="\t", header=True,
+                      index=False)
+        counts["cluster_status"] = len(status)
+
+    with open(os.path.join(outdir, "duplicates.tsv"), "w") as fh:
+        if duplicates:
+            dups = pd.concat(duplicates, ignore_index=True)
+            order = np.argsort(top_level_key(dups[1], delim).to_numpy(), kind="stable")
+            dups = dups.iloc[order]
+            dups.to_csv(fh, sep="\t", header=False, index=False)
+            counts["duplicates"] = len(dups)
+
+    with open(os.path.join(outdir, "run.json"), "w") as fh:
+        json.dump({"merged_shards": [str(d) for d in shard_dirs], "shard_runs": runs,
+                   "counts": counts}, fh, indent=4)
+    return counts
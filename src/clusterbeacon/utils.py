@@ -1,8 +1,9 @@
 import hashlib
 from datetime import datetime
+import numpy as np
 import pandas as pd
 import os
-from typing import Iterable, Any, Optional, List, Union
+from typing import Iterable, Any, Dict, Optional, List, Tuple, Union
 
 def calc_md5(values: Iterable[Union[str, bytes]]) -> List[str]:
     """
@@ -166,4 +167,106 @@ def file_valid(f: str) -> bool:
     try:
         return os.path.getsize(f) > 0
     except OSError:
-        return False
\ No newline at end of file
+        return False
+
+
+def normalize_dates(
+    values: pd.Series,
+    formats: Optional[List[str]] = None,
+    partial_policy: str = "drop",
+    month_formats: Optional[List[str]] = None,
+    year_formats: Optional[List[str]] = None,
+) -> Tuple[np.ndarray, np.ndarray, Dict[str, int]]:
+    """
+    Parse date strings to int32 days since 1970-01-01 using explicit formats.
+
+    Each distinct string is parsed once: values are factorized into a memo
+    table of unique strings, the formats are tried in order against the
+    still-unparsed uniques, and the result is broadcast back to the rows.
+    Values with a time of day after the date ("2024-01-05 10:00",
+    "2024-01-05T10:00:00Z") are parsed by their date part.
+
+    Parameters
+    ----------
+    values : pd.Series
+        Raw date values.
+    formats : list of str, optional
+        Full-date strptime formats tried in order. Defaults to ``['%Y-%m-%d']``.
+    partial_policy : {'drop', 'first', 'midpoint'}, default 'drop'
+        How to treat month ('2024-05') or year ('2024') only dates: drop them,
+        use the first day of the period, or use its midpoint (15th of the
+        month, 1 July).
+    month_formats, year_formats : list of str, optional
+        Formats recognised as partial dates. Default to ``['%Y-%m', '%Y/%m']``
+        and ``['%Y']``.
+
+    Returns
+    -------
+    days : np.ndarray
+        int32 epoch days; undefined where `valid` is False.
+    valid : np.ndarray
+        Boolean mask of rows with a usable date.
+    report : dict
+        Row counts: ``parsed``, ``partial`` (resolved by the policy),
+        ``partial_dropped``, ``missing`` and ``unparsed``.
+    """
+    if partial_policy not in ("drop", "first", "midpoint"):
+        raise ValueError(f"Unsupported partial date policy: {partial_policy}")
+    if pd.api.types.is_datetime64_any_dtype(values):
+        valid = values.notna().to_numpy()
+        days = values.to_numpy(dtype="datetime64[D]").astype(np.int64)
+        days = np.where(valid, days, 0).astype(np.int32)
+        report = {"parsed": int(valid.sum()), "partial": 0, "partial_dropped": 0,
+                  "missing": int((~valid).sum()), "unparsed": 0}
+        return days, valid, report
+    formats = formats or ["%Y-%m-%d"]
+    month_formats = month_formats or ["%Y-%m", "%Y/%m"]
+    year_formats = year_formats or ["%Y"]
+
+    codes, uniques = pd.factorize(values.astype("string").str.strip(), use_na_sentinel=True)
+    uniques = pd.Series(np.asarray(uniques, dtype=object))
+    num_unique = len(uniques)
+    unique_days = np.zeros(num_unique, dtype=np.int64)
+    kind = np.zeros(num_unique, dtype=np.int8)  # 0 unparsed, 1 full, 2 month, 3 year
+
+    def parse(fmts, label, offset=None, texts=uniques):
+        for fmt in fmts:
+            todo = np.flatnonzero(kind == 0)
+            if len(todo) == 0:
+                return
+            parsed = pd.to_datetime(texts.iloc[todo], format=fmt, errors="coerce")
+            ok = parsed.notna().to_numpy()
+            if not ok.any():
+                continue
+            days = parsed[ok].to_numpy(dtype="datetime64[D]")
+            if offset is not None:
+                days = offset(days)
+            unique_days[todo[ok]] = days.astype(np.int64)
+            kind[todo[ok]] = label
+
+    parse(formats, 1)
+    # datetimes: retry what is left with the time of day cut off
+    parse(formats, 1, texts=uniques.str.split(r"[T ]", n=1, regex=True).str[0])
+    if partial_policy == "midpoint":
+        parse(month_formats, 2, lambda d: d + np.timedelta64(14, "D"))
+        def mid_year(d):
+            return (d.astype("datetime64[Y]") + np.timedelta64(6, "M")).astype("datetime64[D]")
+        parse(year_formats, 3, mid_year)
+    else:
+        parse(month_formats, 2)
+        parse(year_formats, 3)
+
+    row_kind = np.where(codes >= 0, kind[codes], -1)
+    is_partial = row_kind >= 2
+    valid = row_kind == 1
+    if partial_policy != "drop":
+        valid |= is_partial
+    days = np.where(codes >= 0, unique_days[codes], 0).astype(np.int32)
+    report = {
+        "parsed": int((row_kind == 1).sum()),
+        "partial": int(is_partial.sum()) if partial_policy != "drop" else 0,
+        "partial_dropped": int(is_partial.sum()) if partial_policy == "drop" else 0,
+        "missing": int((row_kind == -1).sum()),
+        "unparsed": int((row_kind == 0).sum()),
+    }
+    return days, valid, report
@@ -0,0 +1,14 @@
+import pytest
+
+from src.clusterbeacon.harness import generate_inputs
+
+
+@pytest.fixture(scope="session")
+def generated(tmp_path_factory):
+    """Config of a small synthetic line list and rule table shared by all tests."""
+    return generate_inputs(tmp_path_factory.mktemp("inputs"), num_samples=600, seed=1)
+
+
+@pytest.fixture
+def config(generated, tmp_path):
+    return dict(generated, outdir=str(tmp_path / "results"))
@@ -0,0 +1,49 @@
+import pandas as pd
+
+from src.clusterbeacon.classes.AddressIndex import AddressIndex
+
+
+def build_index(tmp_path, rows):
+    path = tmp_path / 'line_list.tsv'
+    df = pd.DataFrame(rows, columns=['sample_id', 'gas_denovo_cluster_address'])
+    df.to_csv(path, sep='\t', index=False)
+    AddressIndex.build(path, tmp_path / 'index', thresholds=[50, 20, 10])
+    return AddressIndex(tmp_path / 'index')
+
+
+def test_members_and_clusters_of(tmp_path):
+    index = build_index(tmp_path, [('S1', 'Sal|1.2.3'), ('S2', 'Sal|1.2.4'), ('S3', 'Sal|1.5.3'),
+                                   ('S4', 'Lis|1.2.3')])
+    assert index.members('Sal|1.2') == ['S1', 'S2']
+    assert index.members('Sal|1') == ['S1', 'S2', 'S3']
+    clusters = index.clusters_of('S2')
+    assert clusters['cluster_code'].tolist() == ['Sal|1', 'Sal|1.2', 'Sal|1.2.4']
+    assert clusters['members'].tolist() == [3, 2, 1]
+
+
+def test_non_ascii_sample_ids(tmp_path):
+    index = build_index(tmp_path, [('Échantillon-1', 'Sal|1.2'), ('樣本-2', 'Sal|1.2'),
+                                   ('S3', 'Sal|1.3')])
+    assert index.members('Sal|1.2') == ['Échantillon-1', '樣本-2']
+    assert index.clusters_of('樣本-2')['cluster_code'].tolist() == ['Sal|1', 'Sal|1.2']
+
+
+def test_empty_address_token_is_skipped(tmp_path):
+    index = build_index(tmp_path, [('S1', 'Sal|1..3'), ('S2', 'Sal|1.2.3')])
+    clusters = index.clusters_of('S1')
+    assert clusters['level'].tolist() == [1, 3]
+    assert clusters['cluster_code'].tolist() == ['Sal|1', 'Sal|1..3']
+    assert index.clusters_of('missing').empty
+
+
+def test_build_from_partition_directory(tmp_path):
+    parts = tmp_path / 'parts'
+    parts.mkdir()
+    columns = ['sample_id', 'gas_denovo_cluster_address']
+    pd.DataFrame([('S1', 'Sal|1.2.3')], columns=columns).to_csv(parts / 'a.csv', index=False)
+    pd.DataFrame([('S2', 'Sal|1.2.4')], columns=columns).to_csv(parts / 'b.tsv.gz', sep='\t',
+                                                                 index=False)
+    counts = AddressIndex.build(parts, tmp_path / 'index', thresholds=[50, 20, 10])
+    index = AddressIndex(tmp_path / 'index')
+    assert index.members('Sal|1.2') == ['S1', 'S2']
+    assert counts == AddressIndex.build(str(parts / '*'), tmp_path / 'glob', thresholds=[50, 20, 10])
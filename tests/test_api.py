@@ -0,0 +1,64 @@
+import io
+
+import pandas as pd
+import pyarrow as pa
+
+from src.clusterbeacon import api
+from src.clusterbeacon.arrow_io import (read_ipc_stream, read_ipc_tables, table_to_frame,
+                                        write_ipc_tables)
+from src.clusterbeacon.classes.Detector import Detector
+
+
+def test_detect_on_frames_matches_a_file_run(config):
+    line_list = pd.read_csv(config['line_list_path'], sep='\t')
+    rules = pd.read_csv(config['outbreak_rules_path'], sep='\t')
+    settings = {k: v for k, v in config.items() if not k.endswith('_path') and k != 'outdir'}
+    result = api.detect(line_list, rules, settings)
+    expected = Detector(dict(config))
+    assert result.status, result.messages
+    for column in ('outbreak_code', 'sample_ids'):
+        assert result.outbreaks[column].tolist() == expected.outbreak_df[column].tolist()
+    assert len(result.memberships) == result.outbreaks['total_isolates'].astype(int).sum()
+    assert len(result.duplicates) == sum(len(r) for r in expected.duplicate_candidates.values())
+
+
+def test_detect_accepts_an_arrow_table(config):
+    line_list = pd.read_csv(config['line_list_path'], sep='\t')
+    rules = pd.read_csv(config['outbreak_rules_path'], sep='\t')
+    settings = {k: v for k, v in config.items() if not k.endswith('_path') and k != 'outdir'}
+    from_frame = api.detect(line_list, rules, settings)
+    from_table = api.detect(pa.Table.from_pandas(line_list, preserve_index=False), rules, settings)
+    assert from_table.status, from_table.messages
+    pd.testing.assert_frame_equal(from_table.outbreaks, from_frame.outbreaks)
+
+
+def test_failed_detection_returns_empty_tables(config):
+    line_list = pd.read_csv(config['line_list_path'], sep='\t')
+    rules = pd.read_csv(config['outbreak_rules_path'], sep='\t')
+    result = api.detect(line_list, rules, {'window_mode': 'rolling'})
+    assert not result.status
+    assert len(result.outbreaks) == 0 and len(result.messages) > 0
+
+
+def test_ipc_tables_round_trip():
+    outbreaks = pd.DataFrame({'outbreak_code': ['24_Sal|1_1'], 'total_isolates': [3]})
+    memberships = pd.DataFrame({'outbreak_code': ['24_Sal|1_1'] * 3,
+                                'sample_id': ['S1', 'S2', 'S3']})
+    sink = io.BytesIO()
+    write_ipc_tables({'outbreaks': outbreaks, 'memberships': memberships}, sink)
+    sink.seek(0)
+    tables = read_ipc_tables(sink)
+    assert list(tables) == ['outbreaks', 'memberships']
+    pd.testing.assert_frame_equal(table_to_frame(tables['outbreaks']), outbreaks)
+    pd.testing.assert_frame_equal(table_to_frame(tables['memberships']), memberships)
+
+
+def test_ipc_stream_dates_read_as_datetimes():
+    df = pd.DataFrame({'sample_id': ['S1'], 'date': pd.to_datetime(['2024-01-02']).date})
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    sink.seek(0)
+    frame = table_to_frame(read_ipc_stream(sink))
+    assert frame['date'].dtype.kind == 'M'
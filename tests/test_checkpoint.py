@@ -0,0 +1,62 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src.clusterbeacon.classes.Checkpoint import Checkpoint
+from src.clusterbeacon.classes.Detector import Detector
+
+
+def interrupted_run(monkeypatch, config, after):
+    evaluate_group = Detector.evaluate_group
+    calls = [0]
+
+    def preempted(self, *args, **kwargs):
+        calls[0] += 1
+        if calls[0] > after:
+            raise KeyboardInterrupt('preempted')
+        return evaluate_group(self, *args, **kwargs)
+
+    monkeypatch.setattr(Detector, 'evaluate_group', preempted)
+    with pytest.raises(KeyboardInterrupt):
+        Detector(config)
+    monkeypatch.setattr(Detector, 'evaluate_group', evaluate_group)
+
+
+def test_resumed_run_matches_uninterrupted_run(monkeypatch, config):
+    full = Detector(dict(config))
+    assert full.status
+
+    checkpointed = dict(config, checkpoint_clusters=2)
+    interrupted_run(monkeypatch, checkpointed, after=20)
+    assert Checkpoint(Checkpoint.default_dir(checkpointed)).num_flushes > 0
+
+    resumed = Detector(dict(checkpointed, resume=True))
+    assert resumed.status, resumed.messages
+    assert resumed.resume_progress
+    pd.testing.assert_frame_equal(resumed.outbreak_df, full.outbreak_df)
+    pd.testing.assert_frame_equal(resumed.ll_df.reset_index(drop=True),
+                                  full.ll_df.reset_index(drop=True))
+
+
+def test_resume_refuses_changed_inputs(monkeypatch, config):
+    checkpointed = dict(config, checkpoint_clusters=2)
+    interrupted_run(monkeypatch, checkpointed, after=20)
+
+    stat = os.stat(config['outbreak_rules_path'])
+    os.utime(config['outbreak_rules_path'], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    try:
+        resumed = Detector(dict(checkpointed, resume=True))
+    finally:
+        os.utime(config['outbreak_rules_path'], ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert not resumed.status
+    assert any('input outbreak_rules_path changed' in m for m in resumed.messages)
+
+
+def test_resume_refuses_changed_analysis_window(monkeypatch, config):
+    checkpointed = dict(config, checkpoint_clusters=2, since='2020-01-01')
+    interrupted_run(monkeypatch, checkpointed, after=5)
+
+    checkpoint = Checkpoint(Checkpoint.default_dir(checkpointed))
+    assert checkpoint.mismatches(checkpointed, since_day=checkpoint.meta['since_day']) == []
+    assert checkpoint.mismatches(checkpointed, since_day=0) == ['analysis window start changed']
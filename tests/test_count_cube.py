@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+from src.clusterbeacon.classes.CountCube import CountCube
+from src.clusterbeacon.classes.Detector import Detector
+
+
+def line_list(n, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'sample_id': [f'S{i}' for i in range(n)],
+        'date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 120, n), unit='D'),
+        'gas_denovo_cluster_address': [f'Sal|{a}.{b}.{c}'
+                                       for a, b, c in rng.integers(1, 4, (n, 3))],
+        'state_province': rng.choice(['ON', 'QC', 'BC'], n),
+        'is_human': rng.random(n) < 0.7,
+    })
+
+
+def sorted_frame(df, columns):
+    return df.sort_values(columns).reset_index(drop=True)
+
+
+def test_update_from_changed_samples_matches_full_update(tmp_path):
+    old = line_list(300, seed=1)
+    new = old.copy()
+    new.loc[5:24, 'gas_denovo_cluster_address'] = 'Sal|9.9.9'
+    new.loc[30:34, 'date'] = pd.Timestamp('2024-06-01')
+    new = pd.concat([new.drop(index=range(40, 50)), line_list(310, seed=2).tail(10)],
+                    ignore_index=True)
+    changed = [f'S{i}' for i in list(range(5, 25)) + list(range(30, 35)) + list(range(40, 50))]
+    changed += [f'S{i}' for i in range(300, 310)]
+
+    full = CountCube(tmp_path / 'full')
+    full.update(old)
+    full_report = full.update(new)
+    incremental = CountCube(tmp_path / 'incremental')
+    incremental.update(old)
+    report = incremental.update(new, sample_ids=changed)
+
+    pd.testing.assert_frame_equal(sorted_frame(incremental.cube, CountCube.dimensions),
+                                  sorted_frame(full.cube, CountCube.dimensions))
+    pd.testing.assert_frame_equal(sorted_frame(incremental.ledger, ['row_key']),
+                                  sorted_frame(full.ledger, ['row_key']))
+    assert report['mode'] == 'changes'
+    assert report['compared'] == len(changed)
+    for key in ('added', 'changed', 'removed', 'unchanged'):
+        assert report[key] == full_report[key]
+
+
+def test_saved_cube_reloads(tmp_path):
+    cube = CountCube(tmp_path / 'cube')
+    cube.update(line_list(50, seed=3))
+    cube.save()
+    reloaded = CountCube(tmp_path / 'cube')
+    assert reloaded.cluster_totals(['Sal|1', 'Sal|2'])['total'].sum() == \
+        cube.cluster_totals(['Sal|1', 'Sal|2'])['total'].sum()
+    assert reloaded.update(line_list(50, seed=3))['unchanged'] == 50
+
+
+def test_stale_cube_totals_fall_back_to_line_list_counts(config, tmp_path):
+    cube_dir = str(tmp_path / 'cube')
+    built = Detector(dict(config, count_cube_dir=cube_dir))
+    assert built.status, built.messages
+    assert built.count_cube_report['stale_clusters'] == 0
+
+    # drop rows without listing them as changes, so the cube keeps counting them
+    rows = pd.read_csv(config['line_list_path'], sep='\t')
+    rows.iloc[::3].to_csv(tmp_path / 'line_list.tsv', sep='\t', index=False)
+    pd.DataFrame(columns=['sample_id']).to_csv(tmp_path / 'changes.tsv', sep='\t', index=False)
+    line_list = str(tmp_path / 'line_list.tsv')
+    stale = Detector(dict(config, line_list_path=line_list, count_cube_dir=cube_dir,
+                          count_cube_changes=str(tmp_path / 'changes.tsv')))
+    assert stale.status, stale.messages
+    assert stale.count_cube_report['stale_clusters'] > 0
+    assert any('count cube totals' in m for m in stale.messages)
+    expected = Detector(dict(config, line_list_path=line_list))
+    pd.testing.assert_frame_equal(stale.cluster_status, expected.cluster_status)
+    pd.testing.assert_frame_equal(stale.outbreak_df, expected.outbreak_df)
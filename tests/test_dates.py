@@ -0,0 +1,30 @@
+import pandas as pd
+
+from src.clusterbeacon.main import run_outbreak_detector
+from src.clusterbeacon.utils import normalize_dates
+
+
+def test_datetimes_are_parsed_by_their_date_part():
+    values = pd.Series(['2024-01-05 10:00', '2024-01-05T10:00:00Z', '2024-01-05', None, 'unknown'])
+    days, valid, report = normalize_dates(values)
+    assert valid.tolist() == [True, True, True, False, False]
+    assert days[:3].tolist() == [19727] * 3
+    assert report == {'parsed': 3, 'partial': 0, 'partial_dropped': 0, 'missing': 1, 'unparsed': 1}
+
+
+def test_partial_dates_follow_the_policy():
+    values = pd.Series(['2024-05', '2024', '2024-05-02'])
+    _, valid, report = normalize_dates(values)
+    assert valid.tolist() == [False, False, True]
+    assert report['partial_dropped'] == 2
+    days, valid, _ = normalize_dates(values, partial_policy='midpoint')
+    assert valid.all()
+    assert days[:2].astype('datetime64[D]').astype(str).tolist() == ['2024-05-15', '2024-07-01']
+
+
+def test_unparseable_date_warning_is_printed_on_success(config, tmp_path, capsys):
+    line_list = pd.read_csv(config['line_list_path'], sep='\t', dtype=str)
+    line_list.loc[:2, 'collection_date'] = 'not a date'
+    line_list.to_csv(tmp_path / 'line_list.tsv', sep='\t', index=False)
+    run_outbreak_detector(dict(config, line_list_path=str(tmp_path / 'line_list.tsv')))
+    assert 'Warning: 3 rows with unparseable dates were excluded' in capsys.readouterr().err
@@ -0,0 +1,145 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from src.clusterbeacon.classes import Detector as detector_module
+from src.clusterbeacon.classes.Detector import Detector
+from src.clusterbeacon.utils import calc_md5
+
+
+def test_giant_cluster_path_matches_regular_path(config):
+    regular = Detector(dict(config, giant_cluster_size=None))
+    giant = Detector(dict(config, giant_cluster_size=0))
+    assert regular.status and giant.status
+    pd.testing.assert_frame_equal(giant.outbreak_df, regular.outbreak_df)
+    assert giant.duplicate_candidates == regular.duplicate_candidates
+
+
+def test_exact_duplicates_group_rows_by_code_and_match_values(config):
+    detector = Detector(dict(config))
+    df = pd.DataFrame({
+        'sample_id': ['S1', 'S2', 'S3', 'S4', 'S5'],
+        'gas_denovo_cluster_address': ['Sal|1.2.3', 'Sal|1.2.4', 'Sal|2.5.6', 'Sal|1.2.3',
+                                       'Sal|1.2.3'],
+        'country': ['CA'] * 5,
+        'state_province': ['ON', 'ON', 'ON', 'QC', 'ON'],
+        'sex': ['F'] * 5,
+        'age': [30, 30, 30, 30, 31],
+    })
+    candidates = detector.duplicate_detect(df)
+    code = detector.extract_clusters(df.iloc[[0]], t=1)[0]
+    md5 = calc_md5([code + 'CAONF30'])[0]
+    assert candidates == {md5: [[code, 'CA', 'ON', 'F', 30, 'S1'],
+                                [code, 'CA', 'ON', 'F', 30, 'S2']]}
+
+
+def test_out_of_core_partitions_match_in_memory(config):
+    in_memory = Detector(dict(config))
+    partitioned = Detector(dict(config, out_of_core_partitions=3))
+    assert in_memory.status and partitioned.status, partitioned.messages
+    pd.testing.assert_frame_equal(partitioned.outbreak_df, in_memory.outbreak_df)
+    pd.testing.assert_frame_equal(partitioned.ll_df.reset_index(drop=True),
+                                  in_memory.ll_df.reset_index(drop=True))
+    assert partitioned.duplicate_candidates == in_memory.duplicate_candidates
+
+
+def test_out_of_core_chunks_and_spill_match_in_memory(config, monkeypatch):
+    chunks = []
+
+    def counting_chunks(*args):
+        for chunk in read_chunks(*args):
+            chunks.append(len(chunk))
+            yield chunk
+
+    read_chunks = detector_module.iter_line_list_chunks
+    monkeypatch.setattr(detector_module, 'iter_line_list_chunks', counting_chunks)
+    in_memory = Detector(dict(config))
+    chunked = Detector(dict(config, out_of_core_partitions=3, out_of_core_chunk_rows=100))
+    assert chunked.status, chunked.messages
+    assert len(chunks) > 3 and max(chunks) == 100
+    pd.testing.assert_frame_equal(chunked.outbreak_df, in_memory.outbreak_df)
+    pd.testing.assert_frame_equal(chunked.ll_df.reset_index(drop=True),
+                                  in_memory.ll_df.reset_index(drop=True))
+    assert chunked.duplicate_candidates == in_memory.duplicate_candidates
+
+
+def test_analysis_window_keeps_clusters_active_since(config):
+    since = pd.Timestamp('2024-06-01')
+    detector = Detector(dict(config, since=str(since.date())))
+    assert detector.status, detector.messages
+    assert len(detector.outbreak_df) > 0
+    dates = pd.read_csv(config['line_list_path'], sep='\t', dtype=str).set_index('sample_id')
+    dates = pd.to_datetime(dates['collection_date'])
+    for sample_ids in detector.outbreak_df['sample_ids']:
+        assert dates[sample_ids.split(',')].max() >= since
+
+
+@pytest.mark.parametrize('window_mode', ['gap', 'sliding'])
+def test_analysis_window_codes_match_a_full_run(config, window_mode):
+    since = '2024-06-01'
+    full = Detector(dict(config, window_mode=window_mode))
+    restricted = Detector(dict(config, window_mode=window_mode, since=since))
+    partitioned = Detector(dict(config, window_mode=window_mode, since=since,
+                                out_of_core_partitions=3))
+    assert restricted.status and partitioned.status, partitioned.messages
+    assert 0 < len(restricted.outbreak_df) < len(full.outbreak_df)
+    expected = full.outbreak_df.set_index('sample_ids')['outbreak_code']
+    for detector in (restricted, partitioned):
+        codes = detector.outbreak_df.set_index('sample_ids')['outbreak_code']
+        assert codes.equals(expected[codes.index])
+
+
+def test_sliding_windows_span_at_most_the_date_delta(config):
+    detector = Detector(dict(config, window_mode='sliding'))
+    assert detector.status, detector.messages
+    assert len(detector.outbreak_df) > 0
+    max_delta = pd.read_csv(config['outbreak_rules_path'], sep='\t')['max_date_delta'].max()
+    dates = detector.ll_df.set_index('sample_id')['date']
+    for sample_ids in detector.outbreak_df['sample_ids']:
+        members = dates[sample_ids.split(',')]
+        assert (members.max() - members.min()).days <= max_delta
+
+
+def test_overlapping_sliding_windows_record_shared_isolates(config):
+    detector = Detector(dict(config, window_mode='sliding'))
+    assert detector.status, detector.messages
+    outbreaks = detector.outbreak_df
+    assert (outbreaks['overlapping_isolates'] > 0).any()
+    assert not outbreaks['sample_ids'].duplicated().any()
+    seen = {}
+    for _, row in outbreaks.iterrows():
+        members = set(row['sample_ids'].split(','))
+        earlier = seen.setdefault(row['cluster_id'], set())
+        assert row['overlapping_isolates'] == len(members & earlier)
+        earlier |= members
+    gap = Detector(dict(config))
+    assert (gap.outbreak_df['overlapping_isolates'] == 0).all()
+
+
+def test_unknown_window_mode_is_an_error(config):
+    detector = Detector(dict(config, window_mode='rolling'))
+    assert not detector.status
+    assert any('unknown window_mode' in m for m in detector.messages)
+
+
+def test_registry_codes_are_stable_across_runs(config, tmp_path):
+    registry = str(tmp_path / 'registry.sqlite')
+    first = Detector(dict(config, outbreak_registry_path=registry, run_id='run1'))
+    second = Detector(dict(config, outbreak_registry_path=registry, run_id='run2'))
+    assert first.status and second.status, second.messages
+    assert len(first.outbreak_df) > 0
+    codes = first.outbreak_df.set_index('sample_ids')['outbreak_code']
+    assert second.outbreak_df.set_index('sample_ids')['outbreak_code'].equals(codes)
+
+
+def test_registry_rerun_of_a_run_replaces_its_history(config, tmp_path):
+    registry = tmp_path / 'registry.sqlite'
+    first = Detector(dict(config, outbreak_registry_path=str(registry), run_id='run1'))
+    again = Detector(dict(config, outbreak_registry_path=str(registry), run_id='run1'))
+    assert first.status and again.status, again.messages
+    pd.testing.assert_frame_equal(again.outbreak_df, first.outbreak_df)
+    assert (again.outbreak_df['code_status'] == 'new').all()
+    with sqlite3.connect(registry) as conn:
+        rows = conn.execute('SELECT COUNT(*), COUNT(DISTINCT code) FROM code_history').fetchone()
+    assert rows == (len(first.outbreak_df), len(first.outbreak_df))
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from src.clusterbeacon.enrich import enrich_frame, parse_table_spec, read_metadata_table
+
+
+def lims_table(tmp_path, prefer='line_list'):
+    path = tmp_path / 'lims.csv'
+    path.write_text('accession,age,province,lab\n'
+                    ' S1 ,1,on ,LabA\n'
+                    'S2,4,QC,LabB\n'
+                    'S3,,BC,LabC\n'
+                    'S3,9,AB,LabD\n')
+    spec = parse_table_spec({'path': str(path), 'key': 'sample_id', 'table_key': 'accession',
+                             'columns': {'age': 'age', 'province': 'state_province', 'lab': 'lab'},
+                             'prefer': prefer})
+    return read_metadata_table(spec)
+
+
+def line_list():
+    return pd.DataFrame({
+        'sample_id': ['S1', 'S2', 'S3', 'S4'],
+        'age': [1.0, 3.0, np.nan, 7.0],
+        'state_province': ['ON', ' QC', '', 'NS'],
+    })
+
+
+def test_join_fills_adds_and_counts(tmp_path):
+    table = lims_table(tmp_path)
+    assert table['duplicate_keys'] == 1
+    df, report, conflicts = enrich_frame(line_list(), [table])
+    counts = report['lims.csv']
+    assert (counts['matched'], counts['unmatched']) == (3, 1)
+    assert df['lab'].tolist() == ['LabA', 'LabB', 'LabC', None]
+    assert df['state_province'].tolist() == ['ON', ' QC', 'BC', 'NS']
+    assert counts['columns']['state_province'] == {'filled': 1, 'conflicts': 0}
+
+
+def test_formatting_differences_are_not_conflicts(tmp_path):
+    df, report, conflicts = enrich_frame(line_list(), [lims_table(tmp_path, prefer='table')])
+    # 1.0 vs '1', 'ON' vs 'on ' and ' QC' vs 'QC' agree; only age 3 vs 4 differs
+    assert conflicts[['sample_id', 'column', 'table_value']].values.tolist() == [['S2', 'age', '4']]
+    assert report['lims.csv']['columns']['age'] == {'filled': 0, 'conflicts': 1}
+    assert df['state_province'].tolist()[:2] == ['ON', ' QC']
+    assert df['age'].tolist()[:2] == [1.0, '4']
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+from src.clusterbeacon import harness
+
+
+def test_normalize_memberships_are_sample_cluster_pairs():
+    results = {'outbreaks': [('Sal|1.2', ['S1', 'S2']), ('Sal|1.3', ['S3'])], 'duplicates': {}}
+    sets = harness.normalize(results)
+    assert sets['memberships'] == {('S1', 'Sal|1.2'), ('S2', 'Sal|1.2'), ('S3', 'Sal|1.3')}
+
+
+def test_diff_counts_missing_and_extra():
+    duplicates = {'x': ['S1', 'S2']}
+    base = harness.normalize({'outbreaks': [('A', ['S1', 'S2'])], 'duplicates': duplicates})
+    other = harness.normalize({'outbreaks': [('A', ['S1', 'S3'])], 'duplicates': duplicates})
+    counts = harness.diff(base, other)
+    assert counts['memberships'] == {'baseline': 2, 'engine': 2, 'missing': 1, 'extra': 1}
+    assert counts['duplicates']['missing'] == 0
+
+
+def test_run_legacy_restores_working_directory(monkeypatch, config):
+    def failing_detector(config):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(harness, '_load_legacy_detector', lambda: failing_detector)
+    cwd = os.getcwd()
+    with pytest.raises(RuntimeError):
+        harness.run_legacy(config)
+    assert os.getcwd() == cwd
+
+
+def test_run_legacy_leaves_no_files_in_working_directory(monkeypatch, config, tmp_path):
+    workdir = tmp_path / 'cwd'
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+    harness.run_legacy(config)
+    assert list(workdir.iterdir()) == []
+
+
+def test_engines_agree_with_detector_baseline(config):
+    report = harness.compare_engines(config, ['api', 'out_of_core'], baseline='detector')
+    assert report['error'].isna().all()
+    assert report['identical'].all()
+
+
+def test_engines_match_legacy_on_compatible_inputs(tmp_path):
+    config = harness.generate_inputs(tmp_path, num_samples=600, seed=1, legacy_compatible=True)
+    report = harness.compare_engines(config, ['detector', 'streamed', 'out_of_core', 'api'])
+    assert report['engine'].tolist()[0] == 'legacy'
+    assert report['error'].isna().all()
+    assert report['identical'].all()
+    assert (report['outbreaks_baseline'] > 0).all()
@@ -0,0 +1,40 @@
+import pandas as pd
+
+from src.clusterbeacon.classes.HistoryStore import HistoryStore
+from src.clusterbeacon.main import run_outbreak_detector
+
+
+def test_runs_are_loaded_and_queried(config, tmp_path):
+    db = tmp_path / 'history.sqlite'
+    for run_id in ('20240101000000', '20240102000000'):
+        run_outbreak_detector(dict(config, outdir=str(tmp_path / run_id), run_id=run_id,
+                                   history_db=str(db)))
+    store = HistoryStore(db)
+    try:
+        _, runs = store.list_runs()
+        assert [r[0] for r in runs] == ['20240101000000', '20240102000000']
+        summary = pd.read_csv(tmp_path / '20240102000000' / 'outbreak_summary.tsv', sep='\t',
+                              dtype=str)
+        assert all(int(r[3]) == len(summary) for r in runs)
+
+        outbreak_code, sample_ids = summary.loc[0, ['outbreak_code', 'sample_ids']]
+        _, rows = store.sample_history(sample_ids.split(',')[0])
+        assert [(r[0], r[2]) for r in rows] == [(r[0], outbreak_code) for r in runs]
+    finally:
+        store.close()
+
+
+def test_loading_a_run_twice_replaces_it(config, tmp_path):
+    outdir = tmp_path / 'results'
+    run_outbreak_detector(dict(config, outdir=str(outdir), run_id='20240101000000'))
+    store = HistoryStore(tmp_path / 'history.sqlite')
+    try:
+        store.load_run(outdir)
+        store.load_run(outdir)
+        _, rows = store.query('SELECT COUNT(*) FROM runs')
+        assert rows[0][0] == 1
+        _, rows = store.query('SELECT COUNT(*) FROM memberships')
+        expected = pd.read_csv(outdir / 'memberships.tsv', sep='\t')
+        assert rows[0][0] == len(expected)
+    finally:
+        store.close()
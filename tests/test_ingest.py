@@ -0,0 +1,37 @@
+import gzip
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from src.clusterbeacon.ingest import (delimiter_of, expand_line_list_paths, is_line_list_file,
+                                      read_line_list_partitions)
+
+
+@pytest.mark.parametrize('name, delimiter', [
+    ('part.tsv', '\t'), ('part.TSV.gz', '\t'), ('part.csv', ','), ('part.csv.zst', ','),
+    ('part.txt.bz2', '\t'),
+])
+def test_delimiter_follows_the_suffix(name, delimiter):
+    assert delimiter_of(name) == delimiter
+
+
+def test_zstd_spelling_is_not_a_line_list():
+    assert is_line_list_file('part.tsv.zst')
+    assert not is_line_list_file('part.tsv.zstd')
+
+
+def test_mixed_partitions_are_read_with_their_delimiters(tmp_path):
+    first = pd.DataFrame({'sample': ['S1', 'S2'], 'age': [3, 4]})
+    second = pd.DataFrame({'sample': ['S3'], 'age': [5], 'sex': ['F']})
+    first.to_csv(tmp_path / 'a.tsv', sep='\t', index=False)
+    with gzip.open(tmp_path / 'b.csv.gz', 'wt') as fh:
+        second.to_csv(fh, index=False)
+    with pa.CompressedOutputStream(str(tmp_path / 'c.csv.zst'), 'zstd') as fh:
+        fh.write(second.assign(sample='S4').to_csv(index=False).encode())
+
+    paths = expand_line_list_paths(tmp_path)
+    table = read_line_list_partitions(paths, {'sample': 'sample_id'}).to_pandas()
+    assert table['sample_id'].tolist() == ['S1', 'S2', 'S3', 'S4']
+    assert table['age'].tolist() == [3, 4, 5, 5]
+    assert table['sex'].tolist() == [None, None, 'F', 'F']
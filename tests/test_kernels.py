@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from src.clusterbeacon.kernels import (HAVE_NUMBA, cluster_offsets, gap_windows, sliding_windows,
+                                      sorted_neighbor_pairs)
+
+
+def sorted_blocks(n, seed):
+    rng = np.random.default_rng(seed)
+    blocks = np.sort(rng.integers(0, 6, n))
+    days = rng.integers(0, 60, n)
+    order = np.lexsort((days, blocks))
+    return blocks[order], days[order].astype(np.int64)
+
+
+def clusters(n, seed):
+    rng = np.random.default_rng(seed)
+    codes = np.sort(rng.integers(0, 40, n))
+    days = rng.integers(0, 400, n)
+    order = np.lexsort((days, codes))
+    offsets = cluster_offsets(codes[order])
+    max_delta = rng.integers(0, 30, len(offsets) - 1)
+    return days[order].astype(np.int64), offsets, max_delta, rng.random(n) < 0.5
+
+
+def components(n, left, right):
+    graph = coo_matrix((np.ones(len(left)), (left, right)), shape=(n, n))
+    return connected_components(graph, directed=False)[1]
+
+
+@pytest.mark.parametrize('max_delta', [0, 3, 10])
+def test_pairs_are_every_same_block_pair_within_the_date_window(max_delta):
+    blocks, days = sorted_blocks(300, seed=1)
+    left, right, truncated = sorted_neighbor_pairs(cluster_offsets(blocks), days, max_delta)
+    i, j = np.triu_indices(len(days), k=1)
+    keep = (blocks[i] == blocks[j]) & (np.abs(days[i] - days[j]) <= max_delta)
+    assert set(zip(left.tolist(), right.tolist())) == set(zip(i[keep].tolist(), j[keep].tolist()))
+    assert truncated == 0
+
+
+def test_adjacent_pairs_give_the_same_groups_as_all_pairs():
+    blocks, days = sorted_blocks(300, seed=2)
+    offsets = cluster_offsets(blocks)
+    left, right, _ = sorted_neighbor_pairs(offsets, days, 4)
+    adjacent_left, adjacent_right, truncated = sorted_neighbor_pairs(offsets, days, 4,
+                                                                     max_neighbors=1)
+    assert len(adjacent_left) < len(left)
+    assert np.all(adjacent_right - adjacent_left == 1)
+    expected = components(len(days), left, right)
+    labels = components(len(days), adjacent_left, adjacent_right)
+    pairs = np.unique(np.stack([labels, expected], axis=1), axis=0)
+    assert len(pairs) == len(np.unique(labels)) == len(np.unique(expected))
+    assert truncated > 0
+
+
+def test_neighbor_cap_bounds_the_pairs_per_row():
+    blocks, days = sorted_blocks(300, seed=3)
+    left, _, truncated = sorted_neighbor_pairs(cluster_offsets(blocks), days, 30, max_neighbors=5)
+    assert np.bincount(left).max() == 5
+    assert truncated > 0
+
+
+@pytest.mark.skipif(not HAVE_NUMBA, reason='numba is not installed')
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_gap_windows_numba_matches_numpy(seed):
+    days, offsets, max_delta, is_human = clusters(2000, seed)
+    compiled = gap_windows(days, offsets, max_delta, is_human, use_numba=True)
+    vectorized = gap_windows(days, offsets, max_delta, is_human, use_numba=False)
+    for a, b in zip(compiled, vectorized):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_gap_windows_split_on_gaps_larger_than_the_cluster_delta():
+    days = np.array([0, 5, 20, 21, 0, 100], dtype=np.int64)
+    offsets = np.array([0, 4, 6], dtype=np.int64)
+    is_human = np.array([True, False, True, True, False, True])
+    window_ids, window_offsets, window_cluster, window_humans = gap_windows(
+        days, offsets, np.array([10, 200]), is_human, use_numba=False)
+    assert window_ids.tolist() == [0, 0, 1, 1, 2, 2]
+    assert window_offsets.tolist() == [0, 2, 4, 6]
+    assert window_cluster.tolist() == [0, 0, 1]
+    assert window_humans.tolist() == [1, 2, 1]
+
+
+def test_sliding_windows_are_the_maximal_date_windows():
+    days, offsets, max_delta, is_human = clusters(500, seed=4)
+    starts, ends, window_cluster, humans = sliding_windows(days, offsets, max_delta, is_human)
+    expected = set()
+    for c in range(len(offsets) - 1):
+        spans = [(i, int(np.searchsorted(days[offsets[c]:offsets[c + 1]], days[i] + max_delta[c],
+                                         side='right')) + offsets[c])
+                 for i in range(offsets[c], offsets[c + 1])]
+        # a window is maximal unless the window of the previous row ends at the same row
+        expected |= {spans[k] for k in range(len(spans)) if k == 0 or spans[k][1] > spans[k - 1][1]}
+    assert set(zip(starts.tolist(), ends.tolist())) == expected
+    assert humans.tolist() == [int(is_human[s:e].sum()) for s, e in zip(starts, ends)]
+    assert np.all(offsets[window_cluster] <= starts) and np.all(ends <= offsets[window_cluster + 1])
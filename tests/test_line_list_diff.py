@@ -0,0 +1,66 @@
+import gzip
+
+import pandas as pd
+
+from src.clusterbeacon.line_list_diff import diff_line_lists, load_snapshot, save_snapshot
+
+
+def write(path, rows, columns=('sample_id', 'collection_date', 'age')):
+    pd.DataFrame(rows, columns=list(columns)).to_csv(path, sep='\t', index=False)
+    return path
+
+
+def test_added_removed_and_modified_samples(tmp_path):
+    old = write(tmp_path / 'old.tsv', [('S1', '2024-01-01', '3'), ('S2', '2024-01-02', '4'),
+                                       ('S3', '2024-01-03', '5'), ('S3', '2024-01-04', '6')])
+    new = write(tmp_path / 'new.tsv', [('S1', '2024-01-01', '3'), ('S2', '2024-01-09', '7'),
+                                       ('S3', '2024-01-03', '5'), ('S4', '2024-01-05', '8')])
+    column_map = {'collection_date': 'date'}
+    samples, columns, counts = diff_line_lists(load_snapshot(old, column_map),
+                                               load_snapshot(new, column_map))
+    changes = samples.set_index('sample_id')
+    assert changes.loc['S4', 'change'] == 'added'
+    assert changes.loc['S3', 'change'] == 'removed'  # its second occurrence
+    assert changes.loc['S2', 'change'] == 'modified'
+    assert changes.loc['S2', 'changed_columns'] == 'date,age'
+    assert counts['unchanged'] == 2
+    assert (counts['added'], counts['removed'], counts['modified']) == (1, 1, 1)
+    modified = columns.set_index('column')['modified_samples'].to_dict()
+    assert modified == {'sample_id': 0, 'date': 1, 'age': 1}
+
+
+def test_snapshot_diffs_like_the_line_list(tmp_path):
+    old = write(tmp_path / 'old.tsv', [('S1', '2024-01-01', '3'), ('S2', '2024-01-02', '4')])
+    new = write(tmp_path / 'new.tsv', [('S1', '2024-01-01', '30'), ('S2', '2024-01-02', '4')],
+                columns=('sample_id', 'collection_date', 'age'))
+    save_snapshot(load_snapshot(old, {}), tmp_path / 'old.parquet')
+    from_snapshot = diff_line_lists(load_snapshot(tmp_path / 'old.parquet', {}),
+                                    load_snapshot(new, {}))
+    from_text = diff_line_lists(load_snapshot(old, {}), load_snapshot(new, {}))
+    pd.testing.assert_frame_equal(from_snapshot[0], from_text[0])
+    assert from_snapshot[2] == from_text[2]
+
+
+def test_added_columns_compare_shared_columns_only(tmp_path):
+    old = write(tmp_path / 'old.tsv', [('S1', '2024-01-01', '3')])
+    new = write(tmp_path / 'new.tsv', [('S1', '2024-01-01', '3', 'ON')],
+                columns=('sample_id', 'collection_date', 'age', 'province'))
+    samples, columns, counts = diff_line_lists(load_snapshot(old, {}), load_snapshot(new, {}))
+    assert len(samples) == 0
+    assert counts['columns_added'] == 1
+    assert columns.set_index('column').loc['province', 'status'] == 'added'
+
+
+def test_csv_and_compressed_partitions_read_like_one_file(tmp_path):
+    rows = [('S1', '2024-01-01', '3'), ('S2', '2024-01-02', '4')]
+    single = write(tmp_path / 'single.tsv', rows)
+    partitions = tmp_path / 'partitions'
+    partitions.mkdir()
+    pd.DataFrame(rows[:1], columns=['sample_id', 'collection_date', 'age']).to_csv(
+        partitions / 'a.csv', index=False)
+    with gzip.open(partitions / 'b.tsv.gz', 'wt') as f:
+        pd.DataFrame(rows[1:], columns=['sample_id', 'collection_date', 'age']).to_csv(
+            f, sep='\t', index=False)
+    samples, _, counts = diff_line_lists(load_snapshot(single, {}), load_snapshot(partitions, {}))
+    assert len(samples) == 0
+    assert counts['unchanged'] == 2
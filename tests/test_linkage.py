@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+
+from src.clusterbeacon.linkage import classify_churn, link_outbreaks, outbreak_memberships
+
+
+def memberships(groups):
+    return pd.DataFrame([(code, s) for code, samples in groups.items() for s in samples],
+                        columns=['outbreak_code', 'sample_id'])
+
+
+def test_links_score_overlap_by_jaccard():
+    current = memberships({'A': ['S1', 'S2', 'S3'], 'B': ['S4']})
+    previous = memberships({'X': ['S1', 'S2'], 'Y': ['S3', 'S9']})
+    links = link_outbreaks(current, previous)
+    assert links[['outbreak_code', 'previous_outbreak_code', 'overlap']].values.tolist() == [
+        ['A', 'X', 2], ['A', 'Y', 1]]
+    assert links['jaccard'].round(3).tolist() == [0.667, 0.25]
+
+
+def test_churn_events():
+    current = memberships({
+        'same': ['S1', 'S2'],
+        'grown': ['S3', 'S4', 'S5'],
+        'merged': ['S6', 'S7'],
+        'split_a': ['S8'], 'split_b': ['S9'],
+        'fresh': ['S20'],
+    })
+    previous = memberships({
+        'P_same': ['S1', 'S2'],
+        'P_grown': ['S3', 'S4'],
+        'P_m1': ['S6'], 'P_m2': ['S7'],
+        'P_split': ['S8', 'S9'],
+        'P_gone': ['S30'],
+    })
+    churn = classify_churn(current, previous, link_outbreaks(current, previous))
+    events = dict(zip(churn['outbreak_code'], churn['event']))
+    assert events == {'fresh': 'new', 'grown': 'growth', 'merged': 'merge', 'same': 'unchanged',
+                      'split_a': 'split', 'split_b': 'split', '': 'dissolved'}
+    dissolved = churn.loc[churn['event'] == 'dissolved', 'previous_outbreak_codes']
+    assert dissolved.tolist() == ['P_gone']
+    assert churn.set_index('outbreak_code').loc['grown', 'new_samples'] == 1
+
+
+def test_outbreak_memberships_from_records():
+    records = {'OB1': {'sample_ids': 'S1,S2'}, 'OB2': {'sample_ids': ''}}
+    assert outbreak_memberships(records).values.tolist() == [['OB1', 'S1'], ['OB1', 'S2']]
+
+
+@pytest.mark.filterwarnings('error')
+def test_churn_without_links_keeps_column_types():
+    current = memberships({'A': ['S1']})
+    previous = memberships({'X': ['S9']})
+    churn = classify_churn(current, previous, link_outbreaks(current, previous))
+    assert churn['event'].tolist() == ['new', 'dissolved']
+    assert churn['size'].dtype == 'int64' and churn['best_jaccard'].dtype == 'float64'
+    gone = classify_churn(current.iloc[0:0], previous, link_outbreaks(current.iloc[0:0], previous))
+    assert gone['event'].tolist() == ['dissolved']
+    assert gone['previous_size'].dtype == 'int64'
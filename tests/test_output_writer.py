@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+
+from src.clusterbeacon.classes.OutputWriter import OutputWriter, StreamWriter
+
+
+class Unprintable:
+    def __str__(self):
+        raise ValueError('cannot format')
+
+
+def test_rows_are_written_as_utf8(tmp_path):
+    writer = StreamWriter(tmp_path / 'out.tsv', ['sample_id', 'city'])
+    writer.put([['S1', 'São Paulo'], ['S2', None]])
+    writer.close()
+    text = (tmp_path / 'out.tsv').read_bytes().decode('utf-8')
+    assert text == 'sample_id\tcity\nS1\tSão Paulo\nS2\t\n'
+
+
+def test_failed_writer_keeps_draining_and_raises_on_close(tmp_path):
+    writer = StreamWriter(tmp_path / 'out.tsv', max_queue=2, batch_size=1)
+    writer.put([[Unprintable()]])
+
+    def produce():
+        # a producer that ignores errors must still never block on the full queue
+        for i in range(200):
+            try:
+                writer.put([[i]])
+            except ValueError:
+                writer.queue.put([[i]])
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    producer.join(timeout=10)
+    assert not producer.is_alive()
+    with pytest.raises(ValueError, match='cannot format'):
+        writer.close()
+    assert not (tmp_path / 'out.tsv').exists()
+    assert not writer.tmp_path.exists()
+
+
+def test_output_writer_closes_every_stream_before_raising(tmp_path):
+    writer = OutputWriter(tmp_path, ['size'])
+    writer.write_outbreak('OB1', {'size': Unprintable(), 'sample_ids': 'S1,S2'})
+    with pytest.raises(ValueError):
+        writer.close()
+    memberships = (tmp_path / 'memberships.tsv').read_text()
+    assert memberships == 'outbreak_code\tsample_id\nOB1\tS1\nOB1\tS2\n'
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+from src.clusterbeacon.classes.Detector import Detector
+from src.clusterbeacon.classes.ProfileStore import ProfileStore
+
+
+def write_profiles(path, sample_ids, num_loci=40, seed=1):
+    rng = np.random.default_rng(seed)
+    # a few founders with small mutations, so samples fall into tight groups
+    founders = rng.integers(1, 6, (5, num_loci))
+    alleles = founders[rng.integers(0, len(founders), len(sample_ids))]
+    alleles = np.where(rng.random(alleles.shape) < 0.05, rng.integers(1, 6, alleles.shape), alleles)
+    df = pd.DataFrame(alleles.astype(str), columns=[f'locus{j}' for j in range(num_loci)])
+    df.loc[rng.random(len(df)) < 0.1, 'locus0'] = '-'
+    df.insert(0, 'sample_id', list(sample_ids))
+    df.to_csv(path, sep='\t', index=False)
+    return path
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = write_profiles(tmp_path / 'profiles.tsv', [f'S{i}' for i in range(200)])
+    return ProfileStore.open_or_build(path, tmp_path / 'profiles.store')
+
+
+@pytest.mark.parametrize('threshold', [0, 2, 5, 40])
+@pytest.mark.parametrize('with_missing', [False, True])
+def test_blocked_split_gives_complete_linkage_groups(store, threshold, with_missing):
+    store.block_elements = 40 * 200 * 7  # seven rows per block
+    sample_ids = [f'S{i}' for i in range(0, 200, 2)] + (['absent'] if with_missing else [])
+    rows = store.lookup_rows(sample_ids)
+    groups, max_dists = store.split_rows_by_threshold(rows, threshold)
+    dists = store.distance_matrix_by_row(rows)
+
+    positions = np.concatenate(groups)
+    assert sorted(positions.tolist()) == list(range(len(rows)))
+    assert [g[0] for g in groups] == sorted(g[0] for g in groups)
+    assert max_dists == [int(dists[np.ix_(g, g)].max()) for g in groups]
+    assert max(max_dists) <= threshold
+    assert store.max_distance(sample_ids[:100]) == int(dists[:100, :100].max())
+
+
+@pytest.mark.parametrize('threshold', [0, 3, 8])
+def test_threshold_components_match_dense_graph(store, threshold):
+    store.block_elements = 40 * 200 * 3
+    profiles = store.get_profiles_by_row(np.arange(200))
+    labels, max_dist = store.threshold_components(profiles, threshold)
+    dists = store.distance_matrix_by_row(np.arange(200))
+    _, expected = connected_components(csr_matrix(dists <= threshold), directed=False)
+    assert max_dist == int(dists.max())
+    assert pd.crosstab(labels, expected).astype(bool).sum(axis=1).eq(1).all()
+    assert len(np.unique(labels)) == len(np.unique(expected))
+
+
+def test_open_or_build_without_profile_file_needs_a_store(tmp_path):
+    with pytest.raises(ValueError):
+        ProfileStore.open_or_build(None, tmp_path / 'missing.store')
+
+
+def test_samples_without_profiles_are_reported(config, tmp_path):
+    line_list = pd.read_csv(config['line_list_path'], sep='\t', dtype=str)
+    profiled = line_list['sample_id'].iloc[:500]
+    config['allele_profiles_path'] = str(write_profiles(tmp_path / 'profiles.tsv', profiled))
+    detector = Detector(config)
+    assert detector.status, detector.messages
+    assert detector.profile_report['samples'] == len(line_list)
+    assert detector.profile_report['missing_profiles'] == len(line_list) - 500
+    assert any('have no allele profile' in m for m in detector.messages)
+    unprofiled = set(line_list['sample_id'].iloc[500:])
+    members = set(','.join(detector.outbreak_df['sample_ids']).split(','))
+    assert not members & unprofiled
+    assert (detector.outbreak_df['profile_missing'] > 0).any()
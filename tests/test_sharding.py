@@ -0,0 +1,33 @@
+import pandas as pd
+
+from src.clusterbeacon.main import run_outbreak_detector
+from src.clusterbeacon.sharding import merge_shard_outputs, shard_line_list, top_level_key
+
+
+def read_tsv(path, header=0):
+    return pd.read_csv(path, sep='\t', header=header, dtype=str, keep_default_na=False)
+
+
+def test_top_level_key_groups_by_taxon_and_first_level():
+    keys = top_level_key(pd.Series(['Sal|1.2.3', 'Sal|1', 'Lis|2.4', 'Sal|12.1']))
+    assert keys.tolist() == ['Sal|1', 'Sal|1', 'Lis|2', 'Sal|12']
+
+
+def test_merged_shards_match_a_single_run(config, tmp_path):
+    single = tmp_path / 'single'
+    run_outbreak_detector(dict(config, outdir=str(single)))
+
+    paths = shard_line_list(config['line_list_path'], tmp_path / 'shards', 3, config['column_map'])
+    shard_dirs = []
+    for i, path in enumerate(paths):
+        shard_dirs.append(tmp_path / f'shard_{i}')
+        run_outbreak_detector(dict(config, line_list_path=path, outdir=str(shard_dirs[-1])))
+    counts = merge_shard_outputs(shard_dirs, tmp_path / 'merged')
+
+    for name in ('outbreak_summary.tsv', 'memberships.tsv', 'line_list.tsv', 'cluster_status.tsv'):
+        merged = read_tsv(tmp_path / 'merged' / name)
+        pd.testing.assert_frame_equal(merged, read_tsv(single / name), obj=name)
+    merged_dups = read_tsv(tmp_path / 'merged' / 'duplicates.tsv', header=None)
+    single_dups = read_tsv(single / 'duplicates.tsv', header=None)
+    assert counts['duplicates'] == len(single_dups)
+    assert sorted(map(tuple, merged_dups.to_numpy())) == sorted(map(tuple, single_dups.to_numpy()))
@@ -0,0 +1,21 @@
+from src.clusterbeacon.classes.Tracer import Tracer
+
+
+def test_disabled_spans_keep_no_attributes():
+    tracer = Tracer(enabled=False)
+    with tracer.span('format_df') as attrs:
+        attrs['rows'] = 10
+        attrs.update(windows=3)
+    with tracer.span('process') as attrs:
+        assert attrs == {}
+    assert tracer.events == []
+
+
+def test_enabled_spans_record_their_own_attributes():
+    tracer = Tracer(enabled=True)
+    with tracer.span('cluster', cluster_id='Sal|1.2') as attrs:
+        attrs['windows'] = 3
+    with tracer.span('cluster', cluster_id='Sal|1.3'):
+        pass
+    assert [event[4] for event in tracer.events] == [{'cluster_id': 'Sal|1.2', 'windows': 3},
+                                                     {'cluster_id': 'Sal|1.3'}]